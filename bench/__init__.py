@@ -0,0 +1,7 @@
+"""
+Throughput and scaling benchmarks for bazaarbot.
+
+Run from the repository root with the sources on the path, for example:
+    
+    PYTHONPATH=src python -m bench --agents 100,1000 --commodities 2,8 --rounds 50 --output bench.json
+"""
@@ -0,0 +1,72 @@
+import argparse
+import itertools
+import json
+import sys
+from bench.micro import run_micro
+from bench.runner import Scenario, run_scenario, run_isolated, write_results, compare, market_classes, MIXES, RESOLVERS
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+    
+
+def str_list(value):
+    return value.split(",")
+    
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="bazaarbot throughput benchmarks")
+    parser.add_argument("--agents", type=int_list, default=[100, 1000])
+    parser.add_argument("--commodities", type=int_list, default=[2, 8])
+    parser.add_argument("--mix", type=str_list, default=["uniform"], help=", ".join(sorted(MIXES)))
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--market", type=str_list, default=["Market"], help=", ".join(sorted(market_classes())))
+    parser.add_argument("--resolver", type=str_list, default=["default"], help=", ".join(sorted(RESOLVERS)))
+    parser.add_argument("--history-retention", type=int, default=None)
+    parser.add_argument("--trace-memory", action="store_true", help="also record tracemalloc peaks (slow)")
+    parser.add_argument("--in-process", action="store_true", help="do not run every scenario in a fresh process")
+    parser.add_argument("--no-micro", action="store_true", help="skip resolver and history micro benchmarks")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", default=None, help="baseline results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+    
+    results = []
+    
+    for market, resolver, agents, commodities, mix in itertools.product(args.market, args.resolver, args.agents,
+                                                                       args.commodities, args.mix):
+        scenario = Scenario(agents, commodities, mix, args.rounds, args.seed, market, resolver,
+                            args.history_retention)
+        
+        if args.in_process:
+            result = run_scenario(scenario, args.trace_memory)
+        else:
+            result = run_isolated(scenario, args.trace_memory)
+        
+        results.append(result)
+        print("%-70s %9.1f rounds/s %11.0f offers/s %10.0f trades/s" % (
+            result["name"], result["rounds_per_second"], result["offers_per_second"], result["trades_per_second"]))
+    
+    micro = [] if args.no_micro else run_micro()
+    
+    for m in micro:
+        print("%-70s %9.4f s" % (m["name"], m["seconds"]))
+    
+    write_results(args.output, results, micro)
+    
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        
+        for name in regressions:
+            print("REGRESSION: " + name)
+        
+        if len(regressions) > 0:
+            return 1
+    
+    return 0
+    
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import random
+from bazaarbot import Economy
+from bazaarbot.agent import IAgentFactory
+from bazaarbot.agents import AgentSimulation, DefaultAgent
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.history import History
+from bazaarbot.inventory import InventoryData
+from bazaarbot.market import MarketData, MarketInitConfig, Market, DefaultOfferResolver, DefaultOfferExecutor
+
+
+class ProducerAgentSimulator(AgentSimulation):
+    """
+    Generalisation of the farmer / woodcutter pair from test/simple.py: consumes one unit of its input good
+    to produce a batch of its output good whenever it runs low.
+    """
+    
+    def __init__(self, name, output, inputs, batch, rng):
+        AgentSimulation.__init__(self, name, rng)
+        self._output = output
+        self._inputs = inputs
+        self._batch = batch
+    
+    def perform(self, agent, market):
+        if agent.query_inventory(self._output) >= 2 * self._batch:
+            return
+        
+        if agent.query_inventory(self._inputs) >= 1:
+            self.consume(agent, self._inputs, 1)
+            self.produce(agent, self._output, self._batch)
+        else:
+            self.is_idle(agent, market)
+    
+    def perform_population(self, population, slots, market):
+        slots = slots[population.query_inventory(slots, self._output) < 2 * self._batch]
+        has_inputs = population.query_inventory(slots, self._inputs) >= 1
+        working = slots[has_inputs]
+        
+        self.consume_population(population, working, self._inputs, 1)
+        self.produce_population(population, working, self._output, self._batch)
+        self.is_idle_population(population, slots[~has_inputs], market)
+    
+    def get_population_key(self):
+        return (self._output, self._inputs, self._batch)
+    
+
+class ProducerAgentFactory(IAgentFactory):
+    
+    def __init__(self, name, output, inputs, rng, batch=4, money=100.0, max_size=20):
+        self._name = name
+        self._output = output
+        self._inputs = inputs
+        self._rng = rng
+        self._batch = batch
+        self._money = money
+        self._max_size = max_size
+    
+    def get_name(self):
+        return self._name
+    
+    def create(self):
+        ideal = {}
+        start = {}
+        
+        ideal[self._output] = 0.0
+        ideal[self._inputs] = 3.0
+        start[self._output] = 1.0
+        start[self._inputs] = 0.0
+        
+        inv = InventoryData(self._max_size, ideal, start)
+        return DefaultAgent(self._name, ProducerAgentSimulator(self._name, self._output, self._inputs,
+                                                               self._batch, self._rng), inv, self._money)
+    
+
+class BenchEconomy(Economy):
+    """
+    Single market economy with `commodities` goods and one producer class per good; class k turns good k + 1
+    into good k. `mix` weights how the `agents` are split between the classes. Bankrupt agents are replaced by
+    a fresh agent of the same class so the mix stays constant.
+    """
+    
+    def __init__(self, agents=100, commodities=2, mix=None, seed=1, market_class=Market,
+                 resolver_class=DefaultOfferResolver, executor=None, history_retention=None):
+        Economy.__init__(self)
+        
+        rng = random.Random(seed)
+        
+        if mix is None:
+            mix = [1.0] * commodities
+        
+        self.rng = rng
+        self.bankruptcies = 0
+        self.goods = [SimpleCommodity("good%d" % i, 1.0 + (i % 3) * 0.5) for i in range(commodities)]
+        self.factories = [ProducerAgentFactory("producer%d" % i, self.goods[i], self.goods[(i + 1) % commodities], rng)
+                          for i in range(commodities)]
+        self._factory_of = {}
+        
+        agent_list = []
+        weights = [mix[i % len(mix)] for i in range(commodities)]
+        total = float(sum(weights))
+        
+        for i in range(commodities):
+            count = int(round(agents * weights[i] / total)) if i < commodities - 1 else agents - len(agent_list)
+            
+            for _ in range(max(count, 0)):
+                agent_list.append(self.factories[i].create())
+        
+        for factory in self.factories:
+            self._factory_of[factory.get_name()] = factory
+        
+        if executor is None:
+            executor = DefaultOfferExecutor()
+        
+        market = market_class("bench", MarketData(self.goods, agent_list), self, resolver_class(rng), executor,
+                              MarketInitConfig(), rng, History(retention=history_retention))
+        self.add_market(market)
+    
+    def signal_bankrupt(self, market, agent):
+        self.bankruptcies += 1
+        market.replace_agent(agent, self._factory_of[agent.get_agent_name()].create())
@@ -0,0 +1,61 @@
+import random
+import time
+from bazaarbot.history import HistoryLog, RingHistoryLog
+from bazaarbot.market import Offer, OfferExecutionStatistics, DefaultOfferResolver, OrderBookOfferResolver
+
+
+class NullOfferExecutor(object):
+    
+    def execute(self, buyer, seller):
+        units = min(buyer.get_units(), seller.get_units())
+        return OfferExecutionStatistics(units, units * seller.get_unit_price())
+    
+    def reject_bid(self, offer, unit_price):
+        pass
+    
+    def reject_ask(self, offer, unit_price):
+        pass
+    
+
+def bench_resolver(resolver_class, offers, seed=1):
+    rng = random.Random(seed)
+    bids = [Offer(None, "good", float(rng.randint(1, 5)), rng.random() * 10) for _ in range(offers)]
+    asks = [Offer(None, "good", float(rng.randint(1, 5)), rng.random() * 10) for _ in range(offers)]
+    
+    start = time.perf_counter()
+    resolver_class(random.Random(seed)).resolve(NullOfferExecutor(), {"good": bids}, {"good": asks})
+    return time.perf_counter() - start
+    
+
+def bench_history(log, rounds, subjects=8, windows=(1, 10, 15)):
+    for s in range(subjects):
+        log.register(s)
+    
+    start = time.perf_counter()
+    
+    for i in range(rounds):
+        for s in range(subjects):
+            log.add(s, float(i % 7))
+            
+            for r in windows:
+                log.average(s, r)
+    
+    return time.perf_counter() - start
+    
+
+def run_micro(offers=(1000, 10000), history_rounds=(1000, 10000)):
+    results = []
+    
+    for n in offers:
+        for name, cls in (("default", DefaultOfferResolver), ("orderbook", OrderBookOfferResolver)):
+            seconds = bench_resolver(cls, n)
+            results.append({"name": "resolver/%s/offers=%d" % (name, n), "seconds": seconds,
+                            "offers_per_second": 2 * n / seconds if seconds > 0 else 0.0})
+    
+    for n in history_rounds:
+        for name, log in (("list", HistoryLog("bench")), ("ring", RingHistoryLog("bench", retention=256))):
+            seconds = bench_history(log, n)
+            results.append({"name": "history/%s/rounds=%d" % (name, n), "seconds": seconds,
+                            "rounds_per_second": n / seconds if seconds > 0 else 0.0})
+    
+    return results
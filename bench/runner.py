@@ -0,0 +1,143 @@
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from bench.economy import BenchEconomy
+from bazaarbot.market import Market, DefaultOfferResolver, OrderBookOfferResolver
+
+try:
+    import resource
+except ImportError:
+    resource = None
+    
+
+MIXES = {
+    "uniform": None,
+    "skewed": [2.0 ** -i for i in range(16)],
+}
+
+RESOLVERS = {
+    "default": DefaultOfferResolver,
+    "orderbook": OrderBookOfferResolver,
+}
+
+
+def market_classes():
+    result = {"Market": Market}
+    
+    try:
+        from bazaarbot.vectorized import VectorizedMarket, np
+        if np is not None:
+            result["VectorizedMarket"] = VectorizedMarket
+    except ImportError:
+        pass
+    
+    return result
+    
+
+class Scenario(object):
+    
+    def __init__(self, agents, commodities, mix, rounds, seed, market, resolver, history_retention=None):
+        self.agents = agents
+        self.commodities = commodities
+        self.mix = mix
+        self.rounds = rounds
+        self.seed = seed
+        self.market = market
+        self.resolver = resolver
+        self.history_retention = history_retention
+    
+    def get_name(self):
+        return "%s/%s/agents=%d/goods=%d/mix=%s/history=%s" % (self.market, self.resolver, self.agents,
+                                                               self.commodities, self.mix, self.history_retention)
+    
+    def to_dict(self):
+        return dict(self.__dict__)
+    
+
+def run_scenario(scenario, trace_memory=False):
+    gc.collect()
+    
+    if trace_memory:
+        tracemalloc.start()
+    
+    economy = BenchEconomy(scenario.agents, scenario.commodities, MIXES[scenario.mix], scenario.seed,
+                           market_classes()[scenario.market], RESOLVERS[scenario.resolver],
+                           history_retention=scenario.history_retention)
+    market = economy.get_market("bench")
+    profiler = market.enable_profiling()
+    clock = time.perf_counter
+    
+    start = clock()
+    market.simulate(scenario.rounds)
+    wall = clock() - start
+    
+    counters = profiler.get_counters()
+    offers = counters["offers_created"]
+    trades = counters["offers_matched"]
+    
+    result = scenario.to_dict()
+    result.update({
+        "name": scenario.get_name(),
+        "wall_seconds": wall,
+        "rounds_per_second": scenario.rounds / wall if wall > 0 else 0.0,
+        "offers": offers,
+        "offers_per_second": offers / wall if wall > 0 else 0.0,
+        "trades": trades,
+        "trades_per_second": trades / wall if wall > 0 else 0.0,
+        "units_traded": counters["units_traded"],
+        "bankruptcies": economy.bankruptcies,
+        "phase_seconds": dict(profiler.get_timings()),
+    })
+    
+    if trace_memory:
+        result["peak_traced_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    
+    if resource is not None:
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        result["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    
+    return result
+    
+
+def run_isolated(scenario, trace_memory=False):
+    # a fresh process per scenario keeps peak memory figures independent of the scenarios run before
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(run_scenario, scenario, trace_memory).result()
+    
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    
+
+def compare(results, baseline, tolerance):
+    """
+    Returns the names of the scenarios whose rounds per second dropped by more than `tolerance` (a fraction)
+    relative to the baseline results.
+    """
+    reference = dict((r["name"], r) for r in baseline["results"])
+    regressions = []
+    
+    for r in results:
+        old = reference.get(r["name"])
+        
+        if old is not None and r["rounds_per_second"] < old["rounds_per_second"] * (1.0 - tolerance):
+            regressions.append(r["name"])
+    
+    return regressions
+    
+
+def write_results(path, results, micro):
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "results": results, "micro": micro}, f, indent=2, sort_keys=True)
@@ -1,10 +1,13 @@
-from bazaarbot._base import ISignalBankrupt
+from bazaarbot._base import ISignalBankrupt, COMMODITIES
 from random import Random
+import time
 
 
 class MoneyItems(object):
     MONEY_AVAILABLE = "MONEY_AVAILABLE"
     MONEY = "MONEY"
+    MONEY_AVAILABLE_ID = COMMODITIES.get_id(MONEY_AVAILABLE)
+    MONEY_ID = COMMODITIES.get_id(MONEY)
     
 
 class BazaarBotStaticImports(object):
@@ -13,12 +16,105 @@ class BazaarBotStaticImports(object):
 
 class Economy(ISignalBankrupt):
     
-    def __init__(self):
+    def __init__(self, processes=None, block_rounds=None):
         self._markets = []
+        self._processes = processes
+        self._block_rounds = block_rounds
+        self._profiling = False
+        self._profiling_sink = None
+        self._export_sink = None
+        self._round_num = 0
+        self._round_events = None
+        self._stepping = 0
+        self._random_streams = None
+        
+    def set_parallel(self, processes, block_rounds=None):
+        """
+        Simulates markets in a pool of `processes` worker processes (None for serial), shipping them in blocks
+        of at most `block_rounds` rounds. See bazaarbot.parallel.ParallelSimulator.
+        """
+        self._processes = processes
+        self._block_rounds = block_rounds
         
     def add_market(self, market):
         if market not in self._markets:
             self._markets.append(market)
+            
+            if self._profiling:
+                market.enable_profiling(self._profiling_sink)
+                
+            if self._export_sink is not None:
+                market.enable_export(self._export_sink)
+                
+            if self._random_streams is not None:
+                market.set_random_streams(self._random_streams)
+                
+    def set_random_streams(self, streams):
+        """
+        Hands `streams` (a bazaarbot.streams.RandomStreams) to every market, including markets added later; each
+        market derives its own streams from it by name.
+        """
+        self._random_streams = streams
+        
+        for market in self._markets:
+            market.set_random_streams(streams)
+            
+    def enable_profiling(self, sink=None):
+        """
+        Attaches a MarketProfiler reporting to `sink` to every market, including markets added later.
+        """
+        self._profiling = True
+        self._profiling_sink = sink
+        
+        for market in self._markets:
+            market.enable_profiling(sink)
+            
+    def disable_profiling(self):
+        self._profiling = False
+        self._profiling_sink = None
+        
+        for market in self._markets:
+            market.disable_profiling()
+            
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_export_sink"] = None
+        state["_round_events"] = None
+        return state
+        
+    def enable_export(self, sink):
+        """
+        Exports the rounds of every market, including markets added later, to `sink`; see bazaarbot.export.
+        """
+        self._export_sink = sink
+        
+        for market in self._markets:
+            market.enable_export(sink)
+            
+    def disable_export(self):
+        self._export_sink = None
+        
+        for market in self._markets:
+            market.disable_export()
+            
+    def get_profilers(self):
+        result = {}
+        
+        for market in self._markets:
+            if market.get_profiler() is not None:
+                result[market.get_name()] = market.get_profiler()
+                
+        return result
+    
+    def save_checkpoint(self, path):
+        """
+        Saves the economy with all of its markets to `path`; see bazaarbot.checkpoint.load_checkpoint.
+        """
+        from bazaarbot.checkpoint import save_checkpoint
+        save_checkpoint(self, path)
+        
+    def get_markets(self):
+        return self._markets
     
     def get_market(self, name):
         for market in self._markets:
@@ -26,9 +122,92 @@ class Economy(ISignalBankrupt):
                 return market
         return None
     
+    def get_round_num(self):
+        return self._round_num
+    
     def simulate(self, n_rounds):
-        for market in self._markets:
-            market.simulate(n_rounds)
+        if self._processes is not None:
+            from bazaarbot.parallel import ParallelSimulator
+            ParallelSimulator(self._processes, self._block_rounds).simulate(self._markets, n_rounds)
+        else:
+            for market in self._markets:
+                market.simulate(n_rounds)
+                
+        self._end_rounds(n_rounds)
+        
+    def _end_rounds(self, n_rounds):
+        self._round_num += n_rounds
+        
+        if self._round_events is not None:
+            self._round_events.complete(self._round_num)
+            
+    def simulate_for(self, budget, chunk_size=1000, max_rounds=None, clock=time.perf_counter):
+        """
+        Market.simulate_for for the whole economy: steps the markets' rounds one market after the other, in
+        registration order, until `budget` seconds are used up or `max_rounds` economy rounds are complete,
+        and continues there on the next call. Returns a SliceReport counting complete economy rounds.
+        """
+        from bazaarbot.market import SliceReport
+        
+        start = clock()
+        deadline = start + budget
+        rounds = 0
+        steps = 0
+        progress = None
+        
+        while len(self._markets) > 0 and (max_rounds is None or rounds < max_rounds):
+            market = self._markets[self._stepping % len(self._markets)]
+            progress = market.step_round(chunk_size)
+            steps += 1
+            
+            if progress is None:
+                self._stepping += 1
+                
+                if self._stepping >= len(self._markets):
+                    self._stepping = 0
+                    self._end_rounds(1)
+                    rounds += 1
+                    
+            if clock() >= deadline:
+                break
+            
+        return SliceReport(rounds, steps, clock() - start, progress)
+    
+    async def step(self, chunk_size=1000, executor=None):
+        """
+        Runs one round of every market, in registration order, yielding to the event loop between phases and
+        agent chunks; see Market.step. Returns the number of completed rounds.
+        """
+        from bazaarbot.events import run_steps
+        
+        for market in list(self._markets):
+            await run_steps(market.iter_round_steps(chunk_size), executor, ("resolve_offers",))
+            
+        self._end_rounds(1)
+        return self._round_num
+    
+    async def simulate_async(self, n_rounds, chunk_size=1000, executor=None):
+        for _ in range(n_rounds):
+            await self.step(chunk_size, executor)
+            
+        return self._round_num
+    
+    def wait_round(self, round_num=None):
+        """
+        Awaitable resolving to get_round_num() once `round_num` economy rounds are complete; by default once
+        the next round completes. Call it from a running event loop.
+        """
+        from bazaarbot.events import RoundEvents
+        
+        if self._round_events is None:
+            self._round_events = RoundEvents()
+            
+        if round_num is None:
+            round_num = self._round_num + 1
+            
+        future = self._round_events.wait(round_num)
+        self._round_events.complete(self._round_num)
+        return future
     
     def signal_bankrupt(self, agent, market):
         pass
@@ -39,25 +218,88 @@ class Tradebook(object):
     def __init__(self):
         self._bids = {}
         self._asks = {}
+        self._spare = []
         
     def register(self, commodity):
-        self._bids[commodity] = []
-        self._asks[commodity] = []
+        COMMODITIES.intern(commodity)
+        self._bids[commodity] = self._spare.pop() if len(self._spare) > 0 else []
+        self._asks[commodity] = self._spare.pop() if len(self._spare) > 0 else []
         
     def bid(self, offer):
-        if offer.get_good() not in self._bids:
-            self.register(offer.get_good())
+        good = offer.get_good()
+        offers = self._bids.get(good)
         
-        self._bids[offer.get_good()].append(offer)
+        if offers is None:
+            self.register(good)
+            offers = self._bids[good]
+        
+        offers.append(offer)
     
     def ask(self, offer):
-        if offer.get_good() not in self._bids:
-            self.register(offer.get_good())
+        good = offer.get_good()
+        offers = self._asks.get(good)
+        
+        if offers is None:
+            self.register(good)
+            offers = self._asks[good]
         
-        self._asks[offer.get_good()].append(offer)
+        offers.append(offer)
+        
+    def submit(self, asks=(), bids=()):
+        for side, offers in ((self._asks, asks), (self._bids, bids)):
+            good = None
+            current = None
+            
+            for offer in offers:
+                if offer.get_good() is not good:
+                    good = offer.get_good()
+                    current = side.get(good)
+                    
+                    if current is None:
+                        self.register(good)
+                        current = side[good]
+                
+                current.append(offer)
+                
+    def extend(self, commodity, asks, bids):
+        """
+        Adds offers that are already grouped by commodity.
+        """
+        if commodity not in self._bids:
+            self.register(commodity)
+            
+        self._asks[commodity].extend(asks)
+        self._bids[commodity].extend(bids)
+        
+    def reset(self):
+        """
+        Empties the book for the next round, keeping the offer lists for reuse. Resolvers must not hold on to
+        the lists they were handed once resolve() returns.
+        """
+        for offers in self._bids.values():
+            del offers[:]
+            self._spare.append(offers)
+            
+        for offers in self._asks.values():
+            del offers[:]
+            self._spare.append(offers)
+            
+        self._bids.clear()
+        self._asks.clear()
         
     def get_bids(self):
         return self._bids
     
     def get_asks(self):
         return self._asks
+    
+    def count_offers(self):
+        count = 0
+        
+        for offers in self._bids.values():
+            count += len(offers)
+            
+        for offers in self._asks.values():
+            count += len(offers)
+            
+        return count
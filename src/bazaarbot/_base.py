@@ -1,3 +1,4 @@
+import threading
 
 
 class ISignalBankrupt(object):
@@ -5,6 +6,55 @@ class ISignalBankrupt(object):
     def signal_bankrupt(self, agent, market):
         raise NotImplementedError()
     
+    def signal_bankrupt_batch(self, market, agents):
+        """
+        Called once per round with every agent that went bankrupt in `market`, in market order. Override to
+        replace them in bulk (Market.replace_agents, IAgentFactory.create_many); by default every agent is
+        passed to signal_bankrupt on its own.
+        """
+        for agent in agents:
+            self.signal_bankrupt(market, agent)
+    
+
+class CommodityRegistry(object):
+    """
+    Interns commodity names to small, stable integer ids. Commodities cache their id on first use, so hashing
+    and comparing them no longer goes through get_name(). Ids are only meaningful inside one process.
+    """
+    
+    def __init__(self):
+        self._ids = {}
+        self._names = []
+        self._lock = threading.Lock()
+        
+    def __len__(self):
+        return len(self._names)
+    
+    def get_id(self, name):
+        cid = self._ids.get(name)
+        
+        if cid is None:
+            with self._lock:
+                cid = self._ids.get(name)
+                
+                if cid is None:
+                    cid = len(self._names)
+                    self._names.append(name)
+                    self._ids[name] = cid
+                    
+        return cid
+    
+    def get_name(self, cid):
+        return self._names[cid]
+    
+    def intern(self, commodity):
+        cid = self.get_id(commodity.get_name())
+        commodity._commodity_id = cid
+        return cid
+    
+
+COMMODITIES = CommodityRegistry()
+
 
 class ICommodity(object):
     
@@ -14,11 +64,25 @@ class ICommodity(object):
     def get_space(self):
         raise NotImplementedError()
     
+    def get_commodity_id(self):
+        try:
+            return self._commodity_id
+        except AttributeError:
+            return COMMODITIES.intern(self)
+    
     def __eq__(self, other):
-        return self.get_name() == other.get_name()
+        if self is other:
+            return True
+        return self.get_commodity_id() == other.get_commodity_id()
     
     def __hash__(self):
-        return hash(self.get_name())
+        return self.get_commodity_id()
+    
+    def __getstate__(self):
+        # ids are per process, the receiving side interns again
+        state = self.__dict__.copy()
+        state.pop("_commodity_id", None)
+        return state
 
 
 class SimpleCommodity(ICommodity):
@@ -33,6 +33,12 @@ class IAgent(object):
     def change_inventory(self, commodity, amount, unit_cost):
         raise NotImplementedError()
     
+    def change_expecting(self, commodity, delta, unit_cost):
+        """
+        Changes the amount of `commodity` the agent expects to receive, see Inventory.change_expecting.
+        """
+        raise NotImplementedError()
+    
     def get_snapshot(self):
         raise NotImplementedError()
     
@@ -51,6 +57,56 @@ class IAgent(object):
     def set_money_available(self, value):
         raise NotImplementedError()
     
+    def bind_commodity_slots(self, slots):
+        """
+        Called by a market with its CommoditySlots layout when the agent joins it; optional.
+        """
+        pass
+    
+    def bind_snapshot_clock(self, clock):
+        """
+        Called by a market that hands out copy-on-write snapshots. Agents that support them call
+        clock.touch(self) before every change of their money or inventory and return True; for all others the
+        market copies their state whenever a snapshot is taken.
+        """
+        return False
+    
+    def bind_bankruptcy_watch(self, watch):
+        """
+        Called by a market with a set the agent adds itself to whenever its money drops to zero or below (and
+        with None when it leaves the market). Agents that do so return True; the market checks the money of
+        all others every round.
+        """
+        return False
+    
+    def bind_offer_cache(self, enabled):
+        """
+        Called by a market with lazy offers (Market.enable_lazy_offers). Agents that can tell when their
+        offers would come out the same as last round reuse them instead of working them out again, and return
+        True.
+        """
+        return False
+    
+    def get_offer_interests(self, market):
+        """
+        The goods of `market` this agent makes offers for when the market skips irrelevant goods; all of them
+        by default.
+        """
+        return market.get_good_types()
+    
+    def bind_random(self, rnd):
+        """
+        Called by a market that uses RandomStreams with the generator the agent's simulation should draw from;
+        optional.
+        """
+        pass
+    
+    def get_random(self):
+        """
+        The generator bound through bind_random, or None to let the simulation use its own.
+        """
+        return None
+    
 
 class IAgentClass(object):
     
@@ -66,9 +122,17 @@ class IAgentFactory(object):
     def create(self):
         raise NotImplementedError()
     
+    def create_many(self, count):
+        """
+        `count` new agents; override where building them together is cheaper.
+        """
+        return [self.create() for _ in range(count)]
+    
     
 class CommodityPricingRange(object):
     
+    __slots__ = ("_commodity", "_min", "_max")
+    
     def __init__(self, commodity, minv, maxv):
         self._commodity = commodity
         self._min = minv
@@ -102,42 +166,55 @@ class CommodityPricingRange(object):
     
 
 class CommodityPricingHistory(object):
+    """
+    Price observations of a single commodity. Only the first `capacity` observations are kept, which is all
+    that min/max/observe look at; their running minimum and maximum are kept alongside so observe is O(1).
+    """
+    
+    DEFAULT_CAPACITY = 64
     
-    def __init__(self, commodity, *prices):
+    def __init__(self, commodity, *prices, **kwargs):
         self._commodity = commodity
+        self._capacity = kwargs.get("capacity", CommodityPricingHistory.DEFAULT_CAPACITY)
         
         if len(prices) == 0:
             prices = (2.0, 6.0)
         
-        self._observed = list(prices)
+        self._observed = []
+        self._prefix_min = []
+        self._prefix_max = []
+        
+        for price in prices:
+            self.add_transaction(price)
         
     def _limit(self, window):
         return len(self._observed) if window > len(self._observed) else window
+    
+    def get_capacity(self):
+        return self._capacity
         
     def min(self, window):
         window = self._limit(window)
-        
-        minv = None
-        
-        for i in range(window):
-            minv = self._observed[i] if minv is None else min(minv, self._observed[i])
-        
-        return minv if minv is not None else 0.0 
+        return self._prefix_min[window - 1] if window > 0 else 0.0
     
     def max(self, window):
         window = self._limit(window)
-        
-        maxv = None
-        
-        for i in range(window):
-            maxv = self._observed[i] if maxv is None else max(maxv, self._observed[i])
-        
-        return maxv if maxv is not None else 0.0 
+        return self._prefix_max[window - 1] if window > 0 else 0.0
 
     def observe(self, window):
         return CommodityPricingRange(self._commodity, self.min(window), self.max(window))
     
     def add_transaction(self, unit_price):
+        if len(self._observed) >= self._capacity:
+            return
+        
+        if len(self._observed) == 0:
+            self._prefix_min.append(unit_price)
+            self._prefix_max.append(unit_price)
+        else:
+            self._prefix_min.append(min(self._prefix_min[-1], unit_price))
+            self._prefix_max.append(max(self._prefix_max[-1], unit_price))
+            
         self._observed.append(unit_price)
         
     def get_commodity(self):
@@ -146,6 +223,8 @@ class CommodityPricingHistory(object):
     
 class AgentSnapshot(object):
     
+    __slots__ = ("_money", "_inventory", "_class_name")
+    
     def __init__(self, class_name, money, inv):
         self._money = money
         self._inventory = inv
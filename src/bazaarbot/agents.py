@@ -17,8 +17,15 @@ class DefaultAgent(IAgent):
         self._inventory.from_data(inventory_data)
         self._agent_simulation = agent_simulation
         self._money_spent = 0.0
-        self._commodity_pricing_histories = []
+        self._commodity_pricing_histories = {}
         self._money_last_simulation = 0.0
+        self._snapshot_clock = None
+        self._snapshot_epoch = 0
+        self._random = None
+        self._bankruptcy_watch = None
+        self._offer_cache = None
+        self._price_version = 0
+        self._interests = None
         
     def determine_sale_quantity(self, observe_window, average_historical_price, commodity):
         if average_historical_price <= 0:
@@ -49,11 +56,8 @@ class DefaultAgent(IAgent):
         return amount_to_buy
     
     def observe_trading_range(self, commodity, window):
-        for cph in self._commodity_pricing_histories:
-            if cph.get_commodity() == commodity:
-                return cph.observe(window)
-            
-        return None
+        cph = self._commodity_pricing_histories.get(commodity)
+        return cph.observe(window) if cph is not None else None
     
     def simulate(self, market):
         self._money_last_simulation = self._money_available
@@ -82,11 +86,44 @@ class DefaultAgent(IAgent):
         return None
     
     def generate_offers(self, market, commodity):
+        cache = self._offer_cache
+        
+        if cache is None:
+            self._generate_offers(market, commodity)
+            return
+        
+        # offers only depend on the inventory, the pricing histories and the market's average price; create_bid and
+        # create_ask ask the market for that average again, which its query cache answers
+        average = market.get_average_historical_price(commodity, DefaultAgent.DEFAULT_LOOKBACK)
+        version = self._inventory._version
+        entry = cache.get(commodity)
+        
+        if entry is not None and entry[0] == version and entry[1] == self._price_version and entry[2] == average:
+            if entry[3] is not None:
+                offer = Offer(self, commodity, entry[4], entry[5])
+                
+                if entry[3]:
+                    market.ask(offer)
+                else:
+                    market.bid(offer)
+            return
+        
+        is_ask, offer = self._generate_offers(market, commodity)
+        
+        if offer is None:
+            cache[commodity] = (version, self._price_version, average, None, 0.0, 0.0)
+        else:
+            cache[commodity] = (version, self._price_version, average, is_ask, offer.get_units(),
+                                offer.get_unit_price())
+    
+    def _generate_offers(self, market, commodity):
         surplus = self._inventory.surplus(commodity)
         
         if surplus >= 1:
             offer = self.create_ask(market, commodity, 1)
-            market.ask(offer)
+            if offer is not None:
+                market.ask(offer)
+            return True, offer
         else:
             shortage = self._inventory.shortage(commodity)
             space = self._inventory.get_empty_space()
@@ -96,22 +133,32 @@ class DefaultAgent(IAgent):
             else:
                 offer = self.create_bid(market, commodity, space)
             
-            market.bid(offer)
+            if offer is not None:
+                market.bid(offer)
+            return False, offer
             
     def update_price_model(self, act, commodity, success, unit_price):
-        if success:
-            for cph in self._commodity_pricing_histories:
-                if cph.get_commodity() == commodity:
-                    cph.add_transaction(unit_price)
+        if success and commodity in self._commodity_pricing_histories:
+            self._commodity_pricing_histories[commodity].add_transaction(unit_price)
+            self._price_version += 1
     
     def add_inventory_item(self, good, amount):
-        self._commodity_pricing_histories.append(CommodityPricingHistory(good))
+        if self._snapshot_clock is not None:
+            self._snapshot_clock.touch(self)
+            
+        if good not in self._commodity_pricing_histories:
+            self._commodity_pricing_histories[good] = CommodityPricingHistory(good, capacity=DefaultAgent.OBSERVE_WINDOW)
+            self._price_version += 1
+            
         self._inventory.add(good, amount, (self._money_spent if self._money_spent >= 1 else 1.0) / amount)
     
     def query_inventory(self, commodity):
         return self._inventory.query_amount(commodity)
     
     def produce_inventory(self, good, delta):
+        if self._snapshot_clock is not None:
+            self._snapshot_clock.touch(self)
+            
         if self._money_spent < 1:
             self._money_spent = 1.0
             
@@ -119,21 +166,39 @@ class DefaultAgent(IAgent):
         self._money_spent = 0.0
         
     def consume_inventory_item(self, commodity, amount):
-        if commodity.get_name() == MoneyItems.MONEY_AVAILABLE:
+        if self._snapshot_clock is not None:
+            self._snapshot_clock.touch(self)
+            
+        if commodity.get_commodity_id() == MoneyItems.MONEY_AVAILABLE_ID:
             self._money_available += amount
             if amount < 0:
                 self._money_spent += -amount
+                
+            if self._money_available <= 0 and self._bankruptcy_watch is not None:
+                self._bankruptcy_watch.add(self)
         else:
             price = self._inventory.change(commodity, amount, 0.0)
             if amount < 0:
                 self._money_spent += (-amount) * price
     
     def change_inventory(self, commodity, amount, unit_cost):
-        if commodity.get_name() == MoneyItems.MONEY:
+        if self._snapshot_clock is not None:
+            self._snapshot_clock.touch(self)
+            
+        if commodity.get_commodity_id() == MoneyItems.MONEY_ID:
             self._money_available += amount
+            
+            if self._money_available <= 0 and self._bankruptcy_watch is not None:
+                self._bankruptcy_watch.add(self)
         else:
             self._inventory.change(commodity, amount, unit_cost)
             
+    def change_expecting(self, commodity, delta, unit_cost):
+        if self._snapshot_clock is not None:
+            self._snapshot_clock.touch(self)
+            
+        return self._inventory.change_expecting(commodity, delta, unit_cost)
+            
     def get_snapshot(self):
         return AgentSnapshot(self.get_agent_name(), self.get_money_available(), Inventory(self._inventory))
         
@@ -147,8 +212,63 @@ class DefaultAgent(IAgent):
         return self._money_available
     
     def set_money_available(self, value):
+        if self._snapshot_clock is not None:
+            self._snapshot_clock.touch(self)
+            
         self._money_available = value
         
+        if value <= 0 and self._bankruptcy_watch is not None:
+            self._bankruptcy_watch.add(self)
+        
+    def bind_commodity_slots(self, slots):
+        self._inventory.rebind(slots)
+        
+    def bind_snapshot_clock(self, clock):
+        self._snapshot_clock = clock
+        self._snapshot_epoch = clock.get_epoch()
+        return True
+    
+    def bind_bankruptcy_watch(self, watch):
+        self._bankruptcy_watch = watch
+        return True
+    
+    def bind_offer_cache(self, enabled):
+        agent = type(self)
+        
+        # the cached offers are only right while making them reads nothing but the inventory, the pricing
+        # histories and the market's average price; a subclass changing how offers are made may read anything
+        if (agent._generate_offers is not DefaultAgent._generate_offers or
+                agent.create_bid is not DefaultAgent.create_bid or agent.create_ask is not DefaultAgent.create_ask or
+                agent.determine_purchase_quantity is not DefaultAgent.determine_purchase_quantity or
+                agent.determine_sale_quantity is not DefaultAgent.determine_sale_quantity or
+                agent.observe_trading_range is not DefaultAgent.observe_trading_range):
+            self._offer_cache = None
+            return False
+        
+        self._offer_cache = {} if enabled else None
+        return True
+    
+    def get_offer_interests(self, market):
+        goods = market.get_good_types()
+        
+        if self._inventory.get_commodity_slots() is not market.get_commodity_slots():
+            return goods
+        
+        # the market lays out inventories in the order of its goods
+        known = self._inventory.get_known_slots()
+        
+        if self._interests is None or self._interests[0] is not known:
+            count = len(goods)
+            self._interests = (known, [goods[slot] for slot in known if slot < count])
+        
+        return self._interests[1]
+    
+    def bind_random(self, rnd):
+        self._random = rnd
+        
+    def get_random(self):
+        return self._random
+        
     def __str__(self):
         return self._agent_name
     
@@ -168,13 +288,35 @@ class AgentSimulation(object):
     def perform(self, agent, market):
         raise NotImplementedError()
     
+    def perform_population(self, population, slots, market):
+        """
+        Optional bulk perform for the agents in `slots` (an index array) of an AgentPopulation, used by
+        VectorizedMarket for every group of agents whose simulations share a get_population_key. It must leave
+        every agent as perform would, without touching other agents or drawing random numbers.
+        """
+        raise NotImplementedError()
+    
+    def get_population_key(self):
+        """
+        Simulations with equal keys run together through one perform_population call; None runs perform agent
+        by agent.
+        """
+        return None
+    
     def produce(self, agent, commodity, amount, chance=1.0):
-        if chance >= 1.0 or self._rnd.random():
+        if chance >= 1.0 or self.get_random(agent).random():
             agent.add_inventory_item(commodity, amount)
     
     def consume(self, agent, commodity, amount, chance=1.0):
-        if chance >= 1.0 or self._rnd.random():
+        if chance >= 1.0 or self.get_random(agent).random():
             agent.consume_inventory_item(commodity, -amount)
+            
+    def get_random(self, agent):
+        """
+        The generator to use for `agent`: its own stream when the market binds one, this simulation's otherwise.
+        """
+        rnd = agent.get_random()
+        return rnd if rnd is not None else self._rnd
     
     def get_name(self):
         return self._name
@@ -185,6 +327,17 @@ class AgentSimulation(object):
         if money < 0:
             money = 0.0
         agent.set_money_available(money)
+    
+    def produce_population(self, population, slots, commodity, amount):
+        population.add_inventory_item(slots, commodity, amount)
+    
+    def consume_population(self, population, slots, commodity, amount):
+        population.consume_inventory_item(slots, commodity, -amount)
+    
+    def is_idle_population(self, population, slots, market):
+        money = population.get_money_available(slots) - 2
+        money[money < 0] = 0.0
+        population.set_money_available(slots, money)
 
 """
 author: Nick Gritsenko 
@@ -204,12 +357,16 @@ class AgentSimulator2(object):
         raise NotImplementedError()
     
     def produce(self, commodity, amount, chance=1.0):
-        if chance >= 1.0 or self._rnd.random():
+        if chance >= 1.0 or self.get_random().random():
             self._agent.add_inventory_item(commodity, amount)
     
     def consume(self, commodity, amount, chance=1.0):
-        if chance >= 1.0 or self._rnd.random():
+        if chance >= 1.0 or self.get_random().random():
             self._agent.consume_inventory_item(commodity, -amount)
+            
+    def get_random(self):
+        rnd = self._agent.get_random()
+        return rnd if rnd is not None else self._rnd
     
     def get_name(self):
         return self._agent.get_agent_name()
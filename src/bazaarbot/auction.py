@@ -0,0 +1,125 @@
+from bazaarbot.market import DefaultOfferResolver, OfferExecutionStatistics, OfferResolutionStatistics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    
+
+class CallAuctionStatistics(OfferResolutionStatistics):
+    """
+    OfferResolutionStatistics of one commodity cleared by CallAuctionOfferResolver, from the units of every
+    matched pair; the per pair OfferExecutionStatistics are only made when asked for.
+    """
+    
+    __slots__ = ("_pair_units", "_unit_price")
+    
+    def __init__(self, pair_units, unit_price):
+        self._pair_units = pair_units
+        self._unit_price = unit_price
+        self._offers_resolved = len(pair_units)
+        self._resolved_offers = None
+        self._units_traded = float(pair_units.sum())
+        self._money_traded = float((pair_units * unit_price).sum())
+        
+    def get_unit_price(self):
+        return self._unit_price
+    
+    def get_resolved_offers(self):
+        if self._resolved_offers is None:
+            price = self._unit_price
+            self._resolved_offers = [OfferExecutionStatistics(u, u * price) for u in self._pair_units.tolist()]
+        
+        return self._resolved_offers
+    
+
+class CallAuctionOfferResolver(DefaultOfferResolver):
+    """
+    Clears every commodity as a call auction at a single price, in bulk with numpy.
+    
+    Bids are ranked by falling and asks by rising unit price, ties in random order. The clearing price is the one
+    that trades the most units (and among those leaves the smallest imbalance, taking the middle of any remaining
+    range); the best priced offers are filled up to that volume, all at that price. Fills and rejections of a
+    commodity go to the executor in one IOfferExecutor.execute_fills call.
+    
+    Unlike DefaultOfferResolver, which matches every bid with the cheapest ask whatever the bid offers, only bids
+    at or above the clearing price trade, so the two give different results. Requires numpy.
+    """
+    
+    def __init__(self, rnd=None):
+        if np is None:
+            raise ImportError("CallAuctionOfferResolver requires numpy")
+        
+        DefaultOfferResolver.__init__(self, rnd)
+    
+    def resolve_offer_set(self, executor, bids, asks, rng=None):
+        if rng is None:
+            rng = self._rng
+        
+        if len(bids) == 0 or len(asks) == 0:
+            for offer in bids:
+                executor.reject_bid(offer, offer.get_unit_price())
+            
+            for offer in asks:
+                executor.reject_ask(offer, offer.get_unit_price())
+            
+            return OfferResolutionStatistics([])
+        
+        good = bids[0].get_good()
+        generator = np.random.default_rng(rng.getrandbits(64))
+        bid_order, bid_prices, bid_units = CallAuctionOfferResolver.rank(bids, generator, True)
+        ask_order, ask_prices, ask_units = CallAuctionOfferResolver.rank(asks, generator, False)
+        
+        bid_total = np.cumsum(bid_units)
+        ask_total = np.cumsum(ask_units)
+        unit_price, volume = CallAuctionOfferResolver.find_clearing_price(bid_prices, bid_total, ask_prices, ask_total)
+        
+        bid_fills = np.clip(volume - (bid_total - bid_units), 0.0, bid_units)
+        ask_fills = np.clip(volume - (ask_total - ask_units), 0.0, ask_units)
+        
+        executor.execute_fills(good, [bids[i] for i in bid_order.tolist()], bid_fills.tolist(),
+                               [asks[i] for i in ask_order.tolist()], ask_fills.tolist(), unit_price)
+        
+        if volume <= 0:
+            return OfferResolutionStatistics([])
+        
+        # one resolved offer per bid and ask pair the fills match up, as the pairwise resolvers count them
+        ends = np.union1d(bid_total[bid_total < volume], ask_total[ask_total < volume])
+        return CallAuctionStatistics(np.diff(np.concatenate(([0.0], ends[ends > 0], [volume]))), unit_price)
+    
+    @staticmethod
+    def rank(offers, generator, descending):
+        """
+        Order of `offers` by unit price, falling if `descending`, ties shuffled; returns the order and the unit
+        prices and units in that order.
+        """
+        count = len(offers)
+        prices = np.fromiter((o.get_unit_price() for o in offers), np.float64, count)
+        units = np.fromiter((o.get_units() for o in offers), np.float64, count)
+        
+        shuffled = generator.permutation(count)
+        order = shuffled[np.argsort(-prices[shuffled] if descending else prices[shuffled], kind="stable")]
+        return order, prices[order], np.maximum(units[order], 0.0)
+    
+    @staticmethod
+    def find_clearing_price(bid_prices, bid_total, ask_prices, ask_total):
+        """
+        Clearing price and volume of ranked bids and asks with cumulative units `bid_total` and `ask_total`.
+        Without any crossing offers the volume is 0 and the price the middle of the best bid and ask.
+        """
+        prices = np.union1d(bid_prices, ask_prices)
+        
+        # units demanded at or above and supplied at or below every candidate price
+        demand = np.concatenate(([0.0], bid_total))[np.searchsorted(-bid_prices, -prices, side="right")]
+        supply = np.concatenate(([0.0], ask_total))[np.searchsorted(ask_prices, prices, side="right")]
+        traded = np.minimum(demand, supply)
+        volume = traded.max()
+        
+        if volume <= 0:
+            return float(bid_prices[0] + ask_prices[0]) / 2.0, 0.0
+        
+        best = np.flatnonzero(traded == volume)
+        imbalance = np.abs(demand[best] - supply[best])
+        best = best[imbalance == imbalance.min()]
+        return float(prices[best[0]] + prices[best[-1]]) / 2.0, float(volume)
+
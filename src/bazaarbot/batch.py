@@ -0,0 +1,329 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from bazaarbot._base import ISignalBankrupt
+from bazaarbot.agents import DefaultAgent
+
+
+# parameters the runner sets on DefaultAgent for the duration of a run; everything else is up to the scenario
+AGENT_PARAMETERS = ("ASK_PRICE_INFLATION", "OBSERVE_WINDOW", "DEFAULT_LOOKBACK")
+
+
+class IScenario(object):
+    """
+    Builds the economy of one run. Has to be picklable (a module level class) to run in worker processes.
+    """
+    
+    def build(self, seed, params):
+        """
+        A new Economy for `seed` and the parameter point `params` (a dict). Starting inventories, starting
+        trades and any other scenario parameters are read from `params` here; the AGENT_PARAMETERS are already
+        applied to DefaultAgent when this is called.
+        """
+        raise NotImplementedError()
+    
+
+def parameter_grid(**axes):
+    """
+    Every combination of the given parameter values, as dicts: parameter_grid(A=[1, 2], B=[3]) gives
+    {"A": 1, "B": 3} and {"A": 2, "B": 3}.
+    """
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*[axes[name] for name in names])]
+    
+
+def point_key(params):
+    return tuple(sorted(params.items()))
+    
+
+def percentile(values, q):
+    """
+    Linearly interpolated q-th percentile (0..100) of a sorted list.
+    """
+    if len(values) == 0:
+        return 0.0
+    
+    position = (len(values) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+    
+
+class BankruptcyCounter(ISignalBankrupt):
+    """
+    Counts the bankruptcies of one market and passes them on to the market's original ISignalBankrupt.
+    """
+    
+    def __init__(self, target):
+        self._target = target
+        self._count = 0
+    
+    def signal_bankrupt(self, market, agent):
+        self._count += 1
+        self._target.signal_bankrupt(market, agent)
+        
+    def signal_bankrupt_batch(self, market, agents):
+        self._count += len(agents)
+        self._target.signal_bankrupt_batch(market, agents)
+    
+    def take(self):
+        count = self._count
+        self._count = 0
+        return count
+    
+
+class RunSummary(object):
+    """
+    What a batch keeps of one run, sampled every `sample_every` rounds: per market the last price of every good,
+    the bankruptcies since the previous sample and the number of agents of every class.
+    """
+    
+    def __init__(self, params, seed, samples, prices, bankruptcies, class_counts, agents):
+        self._params = params
+        self._seed = seed
+        self._samples = samples
+        self._prices = prices
+        self._bankruptcies = bankruptcies
+        self._class_counts = class_counts
+        self._agents = agents
+    
+    def get_params(self):
+        return self._params
+    
+    def get_seed(self):
+        return self._seed
+    
+    def get_samples(self):
+        return self._samples
+    
+    def get_prices(self, market, good):
+        return self._prices[market][good]
+    
+    def get_bankruptcies(self, market):
+        return self._bankruptcies[market]
+    
+    def get_class_counts(self, market):
+        return self._class_counts[market]
+    
+    def get_agent_count(self, market):
+        return self._agents[market]
+    
+    def get_market_names(self):
+        return list(self._prices)
+    
+    def get_goods(self, market):
+        return list(self._prices[market])
+    
+
+def _apply_parameters(params):
+    previous = {}
+    
+    for name in AGENT_PARAMETERS:
+        if name in params:
+            previous[name] = getattr(DefaultAgent, name)
+            setattr(DefaultAgent, name, params[name])
+    
+    return previous
+    
+
+def run_scenario(scenario, seed, params, rounds, sample_every=1):
+    """
+    Runs one scenario in this process and returns its RunSummary.
+    """
+    previous = _apply_parameters(params)
+    
+    try:
+        economy = scenario.build(seed, params)
+        markets = economy.get_markets()
+        counters = []
+        
+        for market in markets:
+            counter = BankruptcyCounter(market._signal_bankrupt)
+            market._signal_bankrupt = counter
+            counters.append(counter)
+        
+        samples = []
+        prices = dict((m.get_name(), dict((g.get_name(), []) for g in m.get_good_types())) for m in markets)
+        bankruptcies = dict((m.get_name(), []) for m in markets)
+        class_counts = dict((m.get_name(), {}) for m in markets)
+        done = 0
+        
+        while done < rounds:
+            step = min(sample_every, rounds - done)
+            economy.simulate(step)
+            done += step
+            samples.append(done)
+            
+            for market, counter in zip(markets, counters):
+                name = market.get_name()
+                
+                for good in market.get_good_types():
+                    prices[name][good.get_name()].append(market.get_average_historical_price(good, 1))
+                
+                bankruptcies[name].append(counter.take())
+                counts = class_counts[name]
+                
+                for class_name in market.get_agent_class_names():
+                    if class_name not in counts:
+                        counts[class_name] = [0] * (len(samples) - 1)
+                
+                for class_name, series in counts.items():
+                    series.append(market.get_agent_class_count(class_name))
+        
+        for market, counter in zip(markets, counters):
+            market._signal_bankrupt = counter._target
+        
+        agents = dict((m.get_name(), len(m.get_agents())) for m in markets)
+        return RunSummary(params, seed, samples, prices, bankruptcies, class_counts, agents)
+    finally:
+        for name, value in previous.items():
+            setattr(DefaultAgent, name, value)
+    
+
+def run_shard(scenario, seeds, params, rounds, sample_every):
+    """
+    Worker entry point: the runs of a few seeds of one parameter point.
+    """
+    return [run_scenario(scenario, seed, params, rounds, sample_every) for seed in seeds]
+    
+
+class PointStatistics(object):
+    """
+    The runs of one parameter point, aggregated over seeds.
+    """
+    
+    def __init__(self, params):
+        self._params = params
+        self._runs = []
+    
+    def add(self, summary):
+        self._runs.append(summary)
+    
+    def get_params(self):
+        return self._params
+    
+    def get_runs(self):
+        return self._runs
+    
+    def get_samples(self):
+        return self._runs[0].get_samples() if len(self._runs) > 0 else []
+    
+    def _columns(self, series):
+        # one sorted list of run values per sample
+        return [sorted(values) for values in zip(*series)]
+    
+    def price_path(self, market, good, percentiles=(5, 50, 95)):
+        """
+        Mean price of `good` at every sample, and the given percentiles over the runs, as
+        {"mean": [...], 5: [...], 50: [...], 95: [...]}.
+        """
+        columns = self._columns([run.get_prices(market, good) for run in self._runs])
+        result = {"mean": [sum(c) / len(c) for c in columns]}
+        
+        for q in percentiles:
+            result[q] = [percentile(c, q) for c in columns]
+        
+        return result
+    
+    def bankruptcy_rate(self, market):
+        """
+        Bankruptcies per agent and round, over all runs.
+        """
+        bankrupt = 0
+        agent_rounds = 0
+        
+        for run in self._runs:
+            bankrupt += sum(run.get_bankruptcies(market))
+            agent_rounds += run.get_agent_count(market) * run.get_samples()[-1]
+        
+        return float(bankrupt) / agent_rounds if agent_rounds > 0 else 0.0
+    
+    def bankruptcy_path(self, market):
+        """
+        Mean bankruptcies between consecutive samples.
+        """
+        columns = self._columns([run.get_bankruptcies(market) for run in self._runs])
+        return [float(sum(c)) / len(c) for c in columns]
+    
+    def class_mix(self, market):
+        """
+        Mean share of the market's agents in every class at every sample, as {class name: [...]}.
+        """
+        names = set()
+        
+        for run in self._runs:
+            names.update(run.get_class_counts(market))
+        
+        result = {}
+        
+        for name in sorted(names):
+            shares = []
+            
+            for run in self._runs:
+                counts = run.get_class_counts(market).get(name, [0] * len(run.get_samples()))
+                shares.append([float(c) / run.get_agent_count(market) for c in counts])
+            
+            result[name] = [sum(c) / len(c) for c in zip(*shares)]
+        
+        return result
+    
+
+class BatchRunner(object):
+    """
+    Runs a scenario for every seed at every parameter point, `shard_size` seeds per job, in a pool of
+    `processes` worker processes (in this process if None). Workers only send back RunSummary objects.
+    """
+    
+    def __init__(self, scenario, rounds, processes=None, shard_size=1, sample_every=1):
+        self._scenario = scenario
+        self._rounds = rounds
+        self._processes = processes
+        self._shard_size = shard_size
+        self._sample_every = sample_every
+    
+    def _shards(self, seeds, points):
+        seeds = list(seeds)
+        
+        for params in points:
+            for start in range(0, len(seeds), self._shard_size):
+                yield params, seeds[start:start + self._shard_size]
+    
+    def iter_runs(self, seeds, points=None):
+        """
+        Yields the RunSummary of every (parameter point, seed) as soon as its shard is done, in completion
+        order. `points` is a list of parameter dicts, see parameter_grid; by default a single empty point.
+        """
+        if points is None:
+            points = [{}]
+        
+        if self._processes is None:
+            for params, shard in self._shards(seeds, points):
+                for summary in run_shard(self._scenario, shard, params, self._rounds, self._sample_every):
+                    yield summary
+            return
+        
+        with ProcessPoolExecutor(max_workers=self._processes) as pool:
+            jobs = [pool.submit(run_shard, self._scenario, shard, params, self._rounds, self._sample_every)
+                    for params, shard in self._shards(seeds, points)]
+            
+            for job in as_completed(jobs):
+                for summary in job.result():
+                    yield summary
+    
+    def run(self, seeds, points=None):
+        """
+        Runs everything and returns {point_key(params): PointStatistics}, runs sorted by seed.
+        """
+        result = {}
+        
+        for summary in self.iter_runs(seeds, points):
+            key = point_key(summary.get_params())
+            
+            if key not in result:
+                result[key] = PointStatistics(summary.get_params())
+            
+            result[key].add(summary)
+        
+        for statistics in result.values():
+            statistics.get_runs().sort(key=lambda run: run.get_seed())
+        
+        return result
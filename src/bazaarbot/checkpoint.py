@@ -0,0 +1,132 @@
+import gc
+import mmap
+import os
+import pickle
+import struct
+
+
+MAGIC = b"BZBCKPT\0"
+VERSION = 1
+ALIGNMENT = 64
+
+_HEADER = struct.Struct("<8sIIQ")
+_BUFFER_ENTRY = struct.Struct("<QQ")
+
+_MARKET = 0
+_OTHER = 1
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+    
+
+def _without_gc(fn, *args, **kwargs):
+    # pickling hundreds of thousands of agents triggers a collection every few hundred objects otherwise
+    enabled = gc.isenabled()
+    gc.disable()
+    
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        if enabled:
+            gc.enable()
+    
+
+def save_checkpoint(target, path):
+    """
+    Writes a Market, an Economy or any other picklable simulation object to `path`.
+    
+    The file is a small header, a pickle (protocol 5) of the object graph and then every large contiguous
+    numeric buffer (the columns of a VectorizedMarket population, for example) written out-of-band, each one
+    aligned so load_checkpoint can map it straight from the file. A market is saved without its
+    ISignalBankrupt, load_checkpoint attaches a new one; an economy is saved together with its markets.
+    The file is replaced atomically.
+    """
+    from bazaarbot.market import Market
+    
+    buffers = []
+    
+    if isinstance(target, Market):
+        signal_bankrupt = target._signal_bankrupt
+        target._signal_bankrupt = None
+        
+        try:
+            payload = _without_gc(pickle.dumps, (_MARKET, target), 5, buffer_callback=buffers.append)
+        finally:
+            target._signal_bankrupt = signal_bankrupt
+    else:
+        payload = _without_gc(pickle.dumps, (_OTHER, target), 5, buffer_callback=buffers.append)
+    
+    views = [buf.raw() for buf in buffers]
+    
+    entries = []
+    offset = _align(_HEADER.size + _BUFFER_ENTRY.size * len(views) + len(payload))
+    
+    for view in views:
+        entries.append((offset, view.nbytes))
+        offset = _align(offset + view.nbytes)
+    
+    tmp_path = path + ".tmp"
+    
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(views), len(payload)))
+        
+        for entry in entries:
+            f.write(_BUFFER_ENTRY.pack(*entry))
+        
+        f.write(payload)
+        
+        for (start, length), view in zip(entries, views):
+            f.write(bytes(start - f.tell()))
+            f.write(view)
+        
+        f.flush()
+        os.fsync(f.fileno())
+    
+    os.replace(tmp_path, path)
+    
+
+def load_checkpoint(path, isb=None, use_mmap=False):
+    """
+    Restores the object saved by save_checkpoint. A restored market reports bankruptcies to `isb`.
+    
+    With `use_mmap` the out-of-band buffers are not read up front: the file is mapped copy-on-write and the
+    restored arrays are views into the mapping, paged in as they are touched. Changes never reach the file.
+    
+    The object graph is a pickle, and unpickling can run arbitrary code: only load checkpoints you wrote
+    yourself or otherwise trust.
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        else:
+            data = bytearray(os.fstat(f.fileno()).st_size)
+            f.readinto(data)
+    
+    view = memoryview(data)
+    
+    if len(view) < _HEADER.size:
+        raise ValueError("%s is not a bazaarbot checkpoint" % path)
+    
+    magic, version, count, length = _HEADER.unpack_from(view, 0)
+    
+    if magic != MAGIC:
+        raise ValueError("%s is not a bazaarbot checkpoint" % path)
+    
+    if version != VERSION:
+        raise ValueError("unsupported checkpoint version %d" % version)
+    
+    position = _HEADER.size
+    buffers = []
+    
+    for _ in range(count):
+        start, size = _BUFFER_ENTRY.unpack_from(view, position)
+        buffers.append(view[start:start + size])
+        position += _BUFFER_ENTRY.size
+    
+    kind, target = _without_gc(pickle.loads, view[position:position + length], buffers=buffers)
+    
+    if kind == _MARKET:
+        target._signal_bankrupt = isb
+    
+    return target
@@ -0,0 +1,368 @@
+import heapq
+import threading
+from bazaarbot.market import Offer, OfferResolutionStatistics
+
+
+class RestingOrder(object):
+    """
+    An offer in a ContinuousTradebook. Its offer's units are what is left to fill; `expires` is the last round
+    the order takes part in (None until cancelled).
+    """
+    
+    __slots__ = ("_order_id", "_offer", "_is_ask", "_expires", "_alive")
+    
+    def __init__(self, order_id, offer, is_ask, expires):
+        self._order_id = order_id
+        self._offer = offer
+        self._is_ask = is_ask
+        self._expires = expires
+        self._alive = True
+    
+    def get_order_id(self):
+        return self._order_id
+    
+    def get_offer(self):
+        return self._offer
+    
+    def is_ask(self):
+        return self._is_ask
+    
+    def get_expires(self):
+        return self._expires
+    
+    def is_alive(self):
+        return self._alive
+    
+    def __getstate__(self):
+        return self._order_id, self._offer, self._is_ask, self._expires, self._alive
+    
+    def __setstate__(self, state):
+        self._order_id, self._offer, self._is_ask, self._expires, self._alive = state
+    
+
+class ContinuousBook(object):
+    """
+    Resting orders of one commodity in two heaps, best price first and earliest time stamp first among equal
+    prices. Filled, cancelled and expired orders are only marked dead and dropped once they reach the top, or
+    all at once when they outnumber the live ones.
+    """
+    
+    def __init__(self, commodity, orders=None, agent_orders=None):
+        self._commodity = commodity
+        self._orders = {} if orders is None else orders
+        self._agent_orders = {} if agent_orders is None else agent_orders
+        self._bids = []
+        self._asks = []
+        self._expiry = []
+        self._live = 0
+        self._dead = 0
+    
+    def get_commodity(self):
+        return self._commodity
+    
+    def get_order_count(self):
+        return self._live
+    
+    def best_bid(self):
+        return self._top(self._bids)
+    
+    def best_ask(self):
+        return self._top(self._asks)
+    
+    def _top(self, heap):
+        while len(heap) > 0:
+            order = heap[0][2]
+            
+            if order._alive:
+                return order
+            
+            heapq.heappop(heap)
+            self._dead -= 1
+        
+        return None
+    
+    def match(self, executor, order, fills):
+        """
+        Trades `order` against the opposite side for as long as the prices cross, each fill at the price of the
+        resting order; appends the OfferExecutionStatistics of every fill to `fills`.
+        """
+        offer = order._offer
+        good = self._commodity
+        price = offer.get_unit_price()
+        
+        while offer.get_units() > 0:
+            # fills may compact the heaps, so the best order is looked up afresh every time
+            resting = self.best_bid() if order._is_ask else self.best_ask()
+            
+            if resting is None:
+                break
+            
+            other = resting._offer
+            resting_price = other.get_unit_price()
+            
+            if (resting_price < price) if order._is_ask else (resting_price > price):
+                break
+            
+            units = min(offer.get_units(), other.get_units())
+            
+            if order._is_ask:
+                r = executor.execute(Offer(other.get_agent(), good, units, resting_price),
+                                     Offer(offer.get_agent(), good, units, resting_price))
+            else:
+                r = executor.execute(Offer(offer.get_agent(), good, units, resting_price),
+                                     Offer(other.get_agent(), good, units, resting_price))
+            
+            if r.get_units_traded() <= 0:
+                break
+            
+            fills.append(r)
+            offer.set_units(offer.get_units() - r.get_units_traded())
+            other.set_units(other.get_units() - r.get_units_traded())
+            
+            if other.get_units() <= 0:
+                self.remove(resting)
+    
+    def rest(self, order):
+        offer = order._offer
+        
+        if order._is_ask:
+            heapq.heappush(self._asks, (offer.get_unit_price(), offer.get_time_put(), order))
+        else:
+            heapq.heappush(self._bids, (-offer.get_unit_price(), offer.get_time_put(), order))
+        
+        if order._expires is not None:
+            heapq.heappush(self._expiry, (order._expires, offer.get_time_put(), order))
+        
+        self._orders[order._order_id] = order
+        self._live += 1
+        
+        agent = offer.get_agent()
+        orders = self._agent_orders.get(agent)
+        
+        if orders is None:
+            orders = {}
+            self._agent_orders[agent] = orders
+        
+        orders[order._order_id] = order
+    
+    def remove(self, order):
+        del self._orders[order._order_id]
+        
+        agent = order._offer.get_agent()
+        orders = self._agent_orders[agent]
+        del orders[order._order_id]
+        
+        if len(orders) == 0:
+            del self._agent_orders[agent]
+        
+        order._alive = False
+        self._live -= 1
+        self._dead += 1
+        
+        if self._dead > self._live + 64:
+            self._compact()
+    
+    def _compact(self):
+        self._bids = [entry for entry in self._bids if entry[2]._alive]
+        self._asks = [entry for entry in self._asks if entry[2]._alive]
+        self._expiry = [entry for entry in self._expiry if entry[2]._alive]
+        
+        heapq.heapify(self._bids)
+        heapq.heapify(self._asks)
+        heapq.heapify(self._expiry)
+        self._dead = 0
+    
+    def expire(self, round_num):
+        """
+        Removes and returns the live orders whose last round is `round_num` or earlier, in time stamp order.
+        """
+        expired = []
+        heap = self._expiry
+        
+        while len(heap) > 0 and heap[0][0] <= round_num:
+            order = heapq.heappop(heap)[2]
+            
+            if order._alive:
+                self.remove(order)
+                expired.append(order)
+        
+        return expired
+    
+    def get_orders(self, is_ask):
+        """
+        Live orders of one side in priority order.
+        """
+        heap = self._asks if is_ask else self._bids
+        return [entry[2] for entry in sorted(entry for entry in heap if entry[2]._alive)]
+    
+
+class ContinuousTradebook(object):
+    """
+    Continuous double auction behind Market.enable_continuous: every order is matched against the resting
+    orders of its commodity the moment it arrives, with price-time priority, and whatever is left of it rests
+    in the book until it is filled, cancelled or expires. Orders are time stamped (Offer.get_time_put) with an
+    arrival counter, so matching is deterministic. Placing an order costs O(log n) plus O(log n) per fill.
+    
+    The market closes the book at the end of every round: orders due expire and are rejected, and the fills
+    and posted volumes since the previous close become that round's history.
+    """
+    
+    def __init__(self):
+        self._books = {}
+        self._orders = {}
+        self._agent_orders = {}
+        self._time = 0
+        self._fills = {}
+        self._posted = {}
+        self._lock = threading.RLock()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+    
+    def get_book(self, commodity):
+        book = self._books.get(commodity)
+        
+        if book is None:
+            book = ContinuousBook(commodity, self._orders, self._agent_orders)
+            self._books[commodity] = book
+        
+        return book
+    
+    def get_order(self, order_id):
+        """
+        The live RestingOrder with `order_id`, or None once it is filled, cancelled or expired.
+        """
+        return self._orders.get(order_id)
+    
+    def get_order_count(self):
+        return len(self._orders)
+    
+    def get_agent_orders(self, agent):
+        """
+        The live RestingOrders of `agent`, oldest first.
+        """
+        return sorted(self._agent_orders.get(agent, {}).values(), key=RestingOrder.get_order_id)
+    
+    def place(self, executor, offer, is_ask, expires=None):
+        """
+        Matches `offer` and rests what is left of it until the end of round `expires` (None: until cancelled).
+        Returns the order id; get_order(order_id) is None if the offer was filled right away.
+        """
+        with self._lock:
+            good = offer.get_good()
+            posted = self._posted.get(good)
+            
+            if posted is None:
+                posted = [0, 0.0, 0, 0.0]
+                self._posted[good] = posted
+            
+            side = 0 if is_ask else 2
+            posted[side] += 1
+            posted[side + 1] += offer.get_units()
+            
+            self._time += 1
+            offer.set_time_put(self._time)
+            order = RestingOrder(self._time, offer, is_ask, expires)
+            book = self.get_book(good)
+            fills = self._fills.get(good)
+            
+            if fills is None:
+                fills = []
+                self._fills[good] = fills
+            
+            book.match(executor, order, fills)
+            
+            if offer.get_units() > 0:
+                book.rest(order)
+            
+            return order._order_id
+    
+    def cancel(self, order_id):
+        """
+        Takes a resting order out of the book; False if it is no longer there.
+        """
+        with self._lock:
+            order = self._orders.get(order_id)
+            
+            if order is None:
+                return False
+            
+            self._books[order._offer.get_good()].remove(order)
+            return True
+    
+    def cancel_agent(self, executor, agent):
+        """
+        Takes every resting order of `agent` out of the book, oldest first, rejecting them through `executor`;
+        for agents leaving the market. Returns the number of orders cancelled.
+        """
+        with self._lock:
+            orders = self.get_agent_orders(agent)
+            
+            for order in orders:
+                offer = order._offer
+                self._books[offer.get_good()].remove(order)
+                
+                if order._is_ask:
+                    executor.reject_ask(offer, offer.get_unit_price())
+                else:
+                    executor.reject_bid(offer, offer.get_unit_price())
+            
+            return len(orders)
+    
+    def get_posted(self):
+        """
+        [ask count, ask units, bid count, bid units] per commodity of the orders placed since the last close.
+        """
+        return self._posted
+    
+    def close_round(self, executor, round_num):
+        """
+        Expires the orders whose last round is `round_num`, rejecting them through `executor`, and returns
+        {commodity: OfferResolutionStatistics} of the fills since the last close, for every commodity that had
+        orders placed or filled.
+        """
+        with self._lock:
+            for book in self._books.values():
+                for order in book.expire(round_num):
+                    offer = order._offer
+                    
+                    if order._is_ask:
+                        executor.reject_ask(offer, offer.get_unit_price())
+                    else:
+                        executor.reject_bid(offer, offer.get_unit_price())
+            
+            result = {}
+            
+            for good in self._posted:
+                result[good] = OfferResolutionStatistics(self._fills.pop(good, []))
+            
+            for good, fills in self._fills.items():
+                if len(fills) > 0:
+                    result[good] = OfferResolutionStatistics(fills)
+            
+            self._fills = {}
+            self._posted = {}
+            return result
+    
+    def clear(self, executor):
+        """
+        Rejects and removes every resting order.
+        """
+        with self._lock:
+            for order in sorted(self._orders.values(), key=RestingOrder.get_order_id):
+                offer = order._offer
+                
+                if order._is_ask:
+                    executor.reject_ask(offer, offer.get_unit_price())
+                else:
+                    executor.reject_bid(offer, offer.get_unit_price())
+            
+            self._books = {}
+            self._orders = {}
+            self._agent_orders = {}
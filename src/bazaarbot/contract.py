@@ -1,3 +1,6 @@
+import math
+from bazaarbot import BazaarBotStaticImports
+from bazaarbot.market import IOfferExecutor, DefaultOfferExecutor
 
 
 class IContract(object):
@@ -57,3 +60,184 @@ class DefaultContractResolver(IContractResolver):
         
     def get_quote(self, source, dest, space):
         return ContractQuote(0.0, 0.0, 0.0)
+    
+
+class DeliveryContract(IContract):
+    """
+    Goods on their way from `provider` to `receiver`, due in round `due`. The provider gave them up when the
+    contract was made and the receiver expects them until the contract completes or is abandoned.
+    """
+    
+    def __init__(self, provider, receiver, good, units, unit_price, due, risk=0.0):
+        self._provider = provider
+        self._receiver = receiver
+        self._good = good
+        self._units = units
+        self._unit_price = unit_price
+        self._due = due
+        self._risk = risk
+        self._open = True
+        
+    def get_provider(self):
+        return self._provider
+    
+    def get_receiver(self):
+        return self._receiver
+    
+    def get_good(self):
+        return self._good
+    
+    def get_units(self):
+        return self._units
+    
+    def get_unit_price(self):
+        return self._unit_price
+    
+    def get_due(self):
+        return self._due
+    
+    def get_risk(self):
+        return self._risk
+    
+    def is_open(self):
+        return self._open
+    
+    def complete(self):
+        """
+        Delivers the goods.
+        """
+        if not self._open:
+            return
+        
+        self._open = False
+        self._receiver.change_expecting(self._good, -self._units, 0.0)
+        self._receiver.change_inventory(self._good, self._units, self._unit_price)
+        
+    def abandon(self):
+        """
+        The goods never arrive; the receiver stops expecting them.
+        """
+        if not self._open:
+            return
+        
+        self._open = False
+        self._receiver.change_expecting(self._good, -self._units, 0.0)
+        
+
+class ContractScheduler(IContractResolver):
+    """
+    IContractResolver for deliveries that take time: goods leave the provider when a contract is made and
+    arrive get_quote(...).get_delivery_time() rounds later (rounded up; instantly if 0). Until then they are
+    expected by the receiver (Inventory expecting). A contract is lost on the way with the quote's risk.
+    
+    Contracts wait in a timing wheel, one bucket per due round, so settling a round only touches the contracts
+    due in it. A market the scheduler is attached to (Market.set_contract_scheduler) settles it at the end of
+    every round; trades go through contracts with a ContractOfferExecutor.
+    """
+    
+    def __init__(self, delivery_time=1, risk=0.0, cost=0.0, rnd=None):
+        if rnd is None:
+            rnd = BazaarBotStaticImports.RANDOM_FACTORY()
+        
+        self._delivery_time = delivery_time
+        self._risk = risk
+        self._cost = cost
+        self._rng = rnd
+        self._round_num = 0
+        self._wheel = {}
+        self._pending = 0
+        
+    def get_quote(self, source, dest, space):
+        return ContractQuote(self._cost, self._risk, self._delivery_time)
+    
+    def get_round_num(self):
+        return self._round_num
+    
+    def set_round_num(self, round_num):
+        """
+        Moves a scheduler without pending contracts to `round_num`; settle() advances one that has some.
+        """
+        if self._pending > 0 and round_num != self._round_num:
+            raise ValueError("%d contracts are pending at round %d, settle them instead of moving to round %d"
+                             % (self._pending, self._round_num, round_num))
+        
+        self._round_num = round_num
+        
+    def get_pending(self):
+        """
+        Number of contracts scheduled and not settled yet, including ones completed or abandoned early.
+        """
+        return self._pending
+    
+    def get_due(self, round_num):
+        return list(self._wheel.get(round_num, ()))
+    
+    def new_contract(self, provider, receiver, good, units, clearing_price):
+        quote = self.get_quote(provider, receiver, units * good.get_space())
+        rounds = int(math.ceil(quote.get_delivery_time()))
+        
+        if rounds <= 0:
+            provider.change_inventory(good, -units, 0.0)
+            receiver.change_inventory(good, units, clearing_price)
+            return None
+        
+        contract = DeliveryContract(provider, receiver, good, units, clearing_price, self._round_num + rounds,
+                                    quote.get_risk())
+        provider.change_inventory(good, -units, 0.0)
+        receiver.change_expecting(good, units, clearing_price)
+        
+        bucket = self._wheel.get(contract.get_due())
+        
+        if bucket is None:
+            bucket = []
+            self._wheel[contract.get_due()] = bucket
+            
+        bucket.append(contract)
+        self._pending += 1
+        return contract
+    
+    def settle(self, round_num, agents=None):
+        """
+        Advances to `round_num` and settles every contract due by then, in the order they were made; returns
+        the number of contracts settled. With `agents` (a container of the agents still around), contracts of
+        receivers that are gone are dropped without touching them.
+        """
+        due = []
+        
+        while self._round_num < round_num:
+            self._round_num += 1
+            bucket = self._wheel.pop(self._round_num, None)
+            
+            if bucket is not None:
+                due.extend(bucket)
+                
+        self._pending -= len(due)
+        
+        for contract in due:
+            if agents is not None and contract.get_receiver() not in agents:
+                contract._open = False
+            elif contract.get_risk() > 0 and self._rng.random() < contract.get_risk():
+                contract.abandon()
+            else:
+                contract.complete()
+                
+        return len(due)
+    
+
+class ContractOfferExecutor(DefaultOfferExecutor):
+    """
+    DefaultOfferExecutor that delivers the goods of every trade through an IContractResolver; the money
+    changes hands right away.
+    """
+    
+    def __init__(self, contract_resolver):
+        self._contract_resolver = contract_resolver
+        
+    def get_contract_resolver(self):
+        return self._contract_resolver
+    
+    def transfer_good(self, good, units, seller, buyer, clearing_price):
+        self._contract_resolver.new_contract(seller, buyer, good, units, clearing_price)
+        
+    # batch fills settle per pair, so every trade gets its own contract
+    execute_fills = IOfferExecutor.execute_fills
@@ -0,0 +1,65 @@
+import asyncio
+import threading
+
+
+def _resolve(future, round_num):
+    if not future.done():
+        future.set_result(round_num)
+    
+
+class RoundEvents(object):
+    """
+    Awaitable round completion, behind Market.wait_round and Economy.wait_round.
+    
+    Rounds may complete on any thread; every waiter is resolved on the event loop it is waiting in.
+    """
+    
+    def __init__(self):
+        self._waiters = []
+        self._lock = threading.Lock()
+    
+    def wait(self, round_num):
+        """
+        Future that resolves to the round count once complete() reports at least `round_num` rounds; to be
+        called from the event loop that awaits it.
+        """
+        future = asyncio.get_running_loop().create_future()
+        
+        with self._lock:
+            self._waiters.append((round_num, future))
+        
+        return future
+    
+    def complete(self, round_num):
+        if len(self._waiters) == 0:
+            return
+        
+        with self._lock:
+            due = [(target, future) for target, future in self._waiters if target <= round_num]
+            self._waiters = [(target, future) for target, future in self._waiters if target > round_num]
+        
+        for _, future in due:
+            try:
+                future.get_loop().call_soon_threadsafe(_resolve, future, round_num)
+            except RuntimeError:
+                # the loop that was waiting is closed
+                pass
+    
+    def get_waiting(self):
+        return len(self._waiters)
+    
+
+async def run_steps(steps, executor=None, offload=()):
+    """
+    Runs (phase, work) steps from Market.iter_round_steps, giving the event loop a turn after every step.
+    Steps of the phases in `offload` run in `executor` instead of on the loop.
+    """
+    loop = asyncio.get_running_loop()
+    
+    for phase, work in steps:
+        if executor is not None and phase in offload:
+            await loop.run_in_executor(executor, work)
+        else:
+            work()
+        
+        await asyncio.sleep(0)
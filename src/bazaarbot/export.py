@@ -0,0 +1,408 @@
+import csv
+import os
+import queue
+import threading
+from bazaarbot.market import IOfferExecutor, pair_fills
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    
+
+TRADE = "trade"
+REJECTED = "rejected"
+BANKRUPTCY = "bankruptcy"
+ROUND = "round"
+
+# record layouts: every record is a plain tuple with these fields, in this order
+FIELDS = {
+    TRADE: (("market", str), ("round", int), ("good", str), ("buyer", str), ("seller", str), ("units", float),
+            ("money", float)),
+    REJECTED: (("market", str), ("round", int), ("good", str), ("side", str), ("agent", str), ("units", float),
+               ("unit_price", float)),
+    BANKRUPTCY: (("market", str), ("round", int), ("agent", str), ("money", float)),
+    ROUND: (("market", str), ("round", int), ("good", str), ("asks", int), ("bids", int), ("ask_units", float),
+            ("bid_units", float), ("offers_resolved", int), ("units_traded", float), ("money_traded", float)),
+}
+
+
+def field_names(kind):
+    return tuple(name for name, _ in FIELDS[kind])
+    
+
+class IExportSink(object):
+    
+    def emit(self, kind, record):
+        raise NotImplementedError()
+    
+
+class RecordingOfferExecutor(IOfferExecutor):
+    """
+    Forwards to another IOfferExecutor and emits a record for every trade and every rejected offer.
+    """
+    
+    def __init__(self, executor, sink, market_name, round_num):
+        self._executor = executor
+        self._sink = sink
+        self._market_name = market_name
+        self._round_num = round_num
+    
+    def execute(self, bid, ask):
+        r = self._executor.execute(bid, ask)
+        
+        if r.get_units_traded() > 0:
+            self._sink.emit(TRADE, (self._market_name, self._round_num, bid.get_good().get_name(),
+                                    bid.get_agent().get_agent_name(), ask.get_agent().get_agent_name(),
+                                    r.get_units_traded(), r.get_money_traded()))
+        return r
+    
+    def reject_bid(self, offer, unit_price):
+        self._executor.reject_bid(offer, unit_price)
+        self._sink.emit(REJECTED, (self._market_name, self._round_num, offer.get_good().get_name(), "bid",
+                                   offer.get_agent().get_agent_name(), offer.get_units(), unit_price))
+    
+    def reject_ask(self, offer, unit_price):
+        self._executor.reject_ask(offer, unit_price)
+        self._sink.emit(REJECTED, (self._market_name, self._round_num, offer.get_good().get_name(), "ask",
+                                   offer.get_agent().get_agent_name(), offer.get_units(), unit_price))
+    
+    def execute_fills(self, good, bids, bid_fills, asks, ask_fills, unit_price):
+        self._executor.execute_fills(good, bids, bid_fills, asks, ask_fills, unit_price)
+        name = good.get_name()
+        
+        for b, a, units in pair_fills(bid_fills, ask_fills):
+            self._sink.emit(TRADE, (self._market_name, self._round_num, name, bids[b].get_agent().get_agent_name(),
+                                    asks[a].get_agent().get_agent_name(), units, units * unit_price))
+        
+        for side, offers, fills in (("bid", bids, bid_fills), ("ask", asks, ask_fills)):
+            for offer, fill in zip(offers, fills):
+                if fill < offer.get_units():
+                    self._sink.emit(REJECTED, (self._market_name, self._round_num, name, side,
+                                               offer.get_agent().get_agent_name(), offer.get_units() - fill,
+                                               offer.get_unit_price()))
+    
+    def __getattr__(self, name):
+        # transfer_good, transfer_money and whatever else the wrapped executor offers
+        return getattr(self._executor, name)
+    
+
+class MarketExporter(object):
+    """
+    Turns one market's rounds into records for an IExportSink: trades and rejected offers while the offers
+    are cleared, one aggregate per traded good afterwards, and bankruptcies.
+    
+    Attached through Market.enable_export; a market without an exporter clears its offers untouched.
+    """
+    
+    def __init__(self, sink):
+        self._sink = sink
+        self._posted = None
+    
+    def get_sink(self):
+        return self._sink
+    
+    def begin_clearing(self, market, executor):
+        continuous = market.get_continuous_book()
+        
+        if continuous is not None:
+            self._posted = [(good, p[0], p[1], p[2], p[3]) for good, p in continuous.get_posted().items()]
+            return self.wrap_executor(market, executor)
+        
+        # the resolver consumes the offer lists, so the posted volumes are taken up front
+        book = market._trade_book
+        asks = book.get_asks()
+        posted = []
+        
+        for good, bids in book.get_bids().items():
+            good_asks = asks.get(good, ())
+            posted.append((good, len(good_asks), sum(o.get_units() for o in good_asks), len(bids),
+                           sum(o.get_units() for o in bids)))
+        
+        self._posted = posted
+        return self.wrap_executor(market, executor)
+    
+    def wrap_executor(self, market, executor):
+        return RecordingOfferExecutor(executor, self._sink, market.get_name(), market.get_round_num())
+    
+    def end_clearing(self, market, r):
+        if self._posted is None:
+            # attached while the offers were being cleared
+            return
+        
+        name = market.get_name()
+        round_num = market.get_round_num()
+        
+        for good, ask_count, ask_units, bid_count, bid_units in self._posted:
+            stats = r.get(good)
+            
+            if stats is None:
+                resolved, units, money = 0, 0.0, 0.0
+            else:
+                resolved, units, money = stats.get_offers_resolved(), stats.get_units_traded(), stats.get_money_traded()
+            
+            self._sink.emit(ROUND, (name, round_num, good.get_name(), ask_count, bid_count, ask_units, bid_units,
+                                    resolved, units, money))
+        
+        self._posted = None
+    
+    def bankrupt(self, market, agent):
+        self._sink.emit(BANKRUPTCY, (market.get_name(), market.get_round_num(), agent.get_agent_name(),
+                                     agent.get_money_available()))
+    
+
+class RecordBuffer(IExportSink):
+    """
+    Keeps (kind, record) pairs in memory, in emission order.
+    """
+    
+    def __init__(self):
+        self._records = []
+    
+    def emit(self, kind, record):
+        self._records.append((kind, record))
+    
+    def get_records(self):
+        return self._records
+    
+    def drain(self):
+        """
+        Yields and forgets the records collected so far.
+        """
+        records = self._records
+        self._records = []
+        
+        for item in records:
+            yield item
+    
+
+class IChunkWriter(object):
+    
+    def write(self, kind, records):
+        raise NotImplementedError()
+    
+    def close(self):
+        pass
+    
+
+def chunk_index(name, kind, extension):
+    """
+    The n of a chunk file named <kind>-<n><extension>, None for any other name.
+    """
+    prefix = kind + "-"
+    
+    if not name.startswith(prefix) or not name.endswith(extension):
+        return None
+    
+    digits = name[len(prefix):len(name) - len(extension)]
+    return int(digits) if digits.isdigit() else None
+    
+
+def list_chunks(directory, kind, extension):
+    """
+    The chunk files of one kind and extension in `directory`, as (n, name) pairs ordered by n.
+    """
+    chunks = []
+    
+    for name in os.listdir(directory):
+        n = chunk_index(name, kind, extension)
+        
+        if n is not None:
+            chunks.append((n, name))
+    
+    chunks.sort()
+    return chunks
+    
+
+class FileChunkWriter(IChunkWriter):
+    """
+    Base for writers that put every batch into its own file, <directory>/<kind>-<n><EXTENSION>.
+    
+    Numbering continues after the chunks already in the directory, so a second or restored run writing to the
+    same directory appends to what is there instead of overwriting it.
+    """
+    
+    EXTENSION = None
+    
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        
+        self._directory = directory
+        self._chunks = {}
+        
+        for kind in FIELDS:
+            chunks = list_chunks(directory, kind, self.EXTENSION)
+            self._chunks[kind] = chunks[-1][0] + 1 if len(chunks) > 0 else 0
+    
+    def _next_path(self, kind):
+        n = self._chunks.get(kind, 0)
+        self._chunks[kind] = n + 1
+        return os.path.join(self._directory, "%s-%06d%s" % (kind, n, self.EXTENSION))
+    
+
+class CsvChunkWriter(FileChunkWriter):
+    """
+    Writes every batch to <directory>/<kind>-<n>.csv, with a header row.
+    """
+    
+    EXTENSION = ".csv"
+    
+    def write(self, kind, records):
+        with open(self._next_path(kind), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(field_names(kind))
+            writer.writerows(records)
+    
+
+class NpyChunkWriter(FileChunkWriter):
+    """
+    Writes every batch as a structured array to <directory>/<kind>-<n>.npy. Requires numpy.
+    """
+    
+    EXTENSION = ".npy"
+    
+    def __init__(self, directory):
+        if np is None:
+            raise ImportError("NpyChunkWriter requires numpy")
+        
+        FileChunkWriter.__init__(self, directory)
+    
+    def write(self, kind, records):
+        columns = []
+        
+        for i, (_, kind_type) in enumerate(FIELDS[kind]):
+            column = [record[i] for record in records]
+            
+            if kind_type is str:
+                columns.append(np.array(column, dtype=str))
+            elif kind_type is int:
+                columns.append(np.array(column, dtype=np.int64))
+            else:
+                columns.append(np.array(column, dtype=np.float64))
+        
+        np.save(self._next_path(kind), np.rec.fromarrays(columns, names=field_names(kind)), allow_pickle=False)
+    
+
+class ChunkedExportSink(IExportSink):
+    """
+    Collects records into per-kind batches of `batch_size` and hands full batches to an IChunkWriter running
+    on a background thread, so the simulation only pays for appending a tuple to a list.
+    
+    At most `max_pending` batches wait for the writer. When that limit is hit, emit blocks until the writer
+    catches up, or, with block=False, drops the batch and counts it in get_dropped(). Call close() (or use the
+    sink as a context manager) to write the remaining partial batches and stop the thread.
+    """
+    
+    def __init__(self, writer, batch_size=4096, max_pending=16, block=True):
+        self._writer = writer
+        self._batch_size = batch_size
+        self._block = block
+        self._batches = dict((kind, []) for kind in FIELDS)
+        self._queue = queue.Queue(max_pending)
+        self._dropped = 0
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="bazaarbot-export")
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def get_dropped(self):
+        return self._dropped
+    
+    def emit(self, kind, record):
+        batch = self._batches[kind]
+        batch.append(record)
+        
+        if len(batch) >= self._batch_size:
+            self._submit(kind)
+    
+    def _submit(self, kind):
+        if self._error is not None:
+            raise self._error
+        
+        batch = self._batches[kind]
+        self._batches[kind] = []
+        
+        try:
+            self._queue.put((kind, batch), self._block)
+        except queue.Full:
+            self._dropped += 1
+    
+    def flush(self):
+        """
+        Hands all partial batches to the writer and waits until everything is written.
+        """
+        for kind in FIELDS:
+            if len(self._batches[kind]) > 0:
+                self._submit(kind)
+        
+        self._queue.join()
+        
+        if self._error is not None:
+            raise self._error
+    
+    def close(self):
+        if self._closed:
+            return
+        
+        try:
+            self.flush()
+        finally:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+            self._writer.close()
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            
+            try:
+                if item is None:
+                    return
+                
+                if self._error is None:
+                    self._writer.write(*item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+    
+
+def read_chunks(directory, kind, extension=None):
+    """
+    Yields the records of one kind written by CsvChunkWriter or NpyChunkWriter, in the order they were
+    emitted, converted back to their field types. `extension` (".csv" or ".npy") picks the writer's files; it
+    can be left out when the directory only holds chunks of one of them.
+    """
+    if extension is None:
+        found = [ext for ext in (CsvChunkWriter.EXTENSION, NpyChunkWriter.EXTENSION)
+                 if len(list_chunks(directory, kind, ext)) > 0]
+        
+        if len(found) > 1:
+            raise ValueError("%s holds both csv and npy chunks of %s, pass the extension to read" % (directory, kind))
+        
+        extension = found[0] if len(found) > 0 else CsvChunkWriter.EXTENSION
+    
+    types = [kind_type for _, kind_type in FIELDS[kind]]
+    
+    for _, name in list_chunks(directory, kind, extension):
+        path = os.path.join(directory, name)
+        
+        if extension == NpyChunkWriter.EXTENSION:
+            for row in np.load(path, allow_pickle=False).tolist():
+                yield tuple(t(v) for t, v in zip(types, row))
+        else:
+            with open(path, newline="") as f:
+                reader = csv.reader(f)
+                next(reader)
+                
+                for row in reader:
+                    yield tuple(t(v) for t, v in zip(types, row))
@@ -1,4 +1,13 @@
 from builtins import range
+from array import array
+from bazaarbot._base import ICommodity
+import mmap
+import os
+import struct
+try:
+    from urllib.parse import quote, unquote
+except ImportError:
+    from urllib import quote, unquote
 
 
 class EcoNoun(object):
@@ -24,8 +33,8 @@ class HistoryLog(object):
             self._type = source._type
             self._log = {}
             
-            for key in source._log:
-                self._log[key] = source._log[key] + []
+            for key, values in source.get_subjects():
+                self._log[key] = list(values)
                 
     def add(self, name, amount):
         if name in self._log:
@@ -56,22 +65,521 @@ class HistoryLog(object):
     def get_subjects(self):
         return list(self._log.items())
     
+    def freeze(self):
+        """
+        Read-only view of the log as it is now. Logs only ever grow, so the view shares the lists and stops at
+        their current lengths.
+        """
+        return FrozenHistoryLog(self)
+    
+    def copy(self):
+        return self.__class__(source=self)
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        pass
+    
 
-class History(object):
+class FrozenHistoryLog(HistoryLog):
+    
+    def __init__(self, source):
+        self._type = source._type
+        self._log = source._log
+        
+        if isinstance(source, FrozenHistoryLog):
+            self._lengths = dict(source._lengths)
+        else:
+            self._lengths = dict((key, len(values)) for key, values in source._log.items())
+        
+    def add(self, name, amount):
+        raise TypeError("history snapshots are read-only")
+    
+    def register(self, name):
+        raise TypeError("history snapshots are read-only")
+    
+    def average(self, name, r):
+        length = self._lengths.get(name)
+        
+        if length is None:
+            return 0.0
+        
+        l = self._log[name]
+        amount = 0.0
+        
+        if length < r:
+            r = length
+            
+        for i in range(r):
+            amount += l[length - 1 - i]
+            
+        if r <= 0:
+            return -1.0
+        
+        return amount / r
+    
+    def get_subjects(self):
+        return [(key, self._log[key][:length]) for key, length in self._lengths.items()]
+    
+    def freeze(self):
+        return self
+    
+    def copy(self):
+        return self
+    
+
+class RingBuffer(object):
+    """
+    Fixed capacity ring of doubles that keeps running sums for the windows it has been asked about, so the
+    sum over the last r values costs O(1) once r is tracked.
+    """
+    
+    MAX_TRACKED_WINDOWS = 8
+    
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        
+        self._capacity = capacity
+        self._values = array('d', bytes(8 * capacity))
+        self._count = 0
+        self._sums = {}
+        self._shared = False
+        
+    def __len__(self):
+        return self._count if self._count < self._capacity else self._capacity
+    
+    def get_capacity(self):
+        return self._capacity
+    
+    def append(self, value):
+        if self._shared:
+            self._values = array('d', self._values)
+            self._shared = False
+            
+        values = self._values
+        capacity = self._capacity
+        count = self._count
+        sums = self._sums
+        
+        for window in sums:
+            if count >= window:
+                sums[window] += value - values[(count - window) % capacity]
+            else:
+                sums[window] += value
+            
+        values[count % capacity] = value
+        count += 1
+        self._count = count
+        
+        # re-sum once per lap so rounding errors of the running sums cannot accumulate
+        if count % capacity == 0:
+            for window in sums:
+                sums[window] = self._sum(window)
+                
+    def _sum(self, r):
+        values = self._values
+        capacity = self._capacity
+        count = self._count
+        total = 0.0
+        
+        for i in range(min(r, count, capacity)):
+            total += values[(count - 1 - i) % capacity]
+            
+        return total
+    
+    def sum(self, r):
+        """
+        Sum of the last r values (of all values while fewer than r were appended).
+        """
+        if r > self._capacity:
+            r = self._capacity
+            
+        sums = self._sums
+        
+        if r in sums:
+            return sums[r]
+        
+        total = self._sum(r)
+        
+        if len(sums) < RingBuffer.MAX_TRACKED_WINDOWS:
+            sums[r] = total
+            
+        return total
+    
+    def last(self):
+        return self._values[(self._count - 1) % self._capacity]
+    
+    def values(self):
+        length = len(self)
+        start = self._count - length
+        return [self._values[(start + i) % self._capacity] for i in range(length)]
+    
+    def share(self):
+        """
+        Returns a copy that shares the value storage with this ring; whichever of the two is appended to first
+        copies the storage before writing.
+        """
+        copy = RingBuffer.__new__(RingBuffer)
+        copy._capacity = self._capacity
+        copy._values = self._values
+        copy._count = self._count
+        copy._sums = dict(self._sums)
+        copy._shared = True
+        
+        self._shared = True
+        return copy
+    
 
-    def __init__(self, src=None):
-        self._prices = HistoryLog(EcoNoun.PRICE)
-        self._asks = HistoryLog(EcoNoun.ASK)
-        self._bids = HistoryLog(EcoNoun.BID)
-        self._trades = HistoryLog(EcoNoun.TRADE)
-        self._profit = HistoryLog(EcoNoun.PROFIT)
+class RingHistoryLog(HistoryLog):
+    """
+    HistoryLog that only retains the last `retention` entries per subject, in compact array ring buffers.
+    """
+    
+    DEFAULT_RETENTION = 1024
+    
+    def __init__(self, t=None, source=None, retention=None):
+        if t is None and source is None:
+            raise TypeError("needs type or source")
+        
+        if retention is None:
+            retention = source._retention if isinstance(source, RingHistoryLog) else RingHistoryLog.DEFAULT_RETENTION
+        
+        self._type = t
+        self._retention = retention
+        self._log = {}
         
+        if source is not None:
+            self._type = source._type
+            
+            for key, values in source.get_subjects():
+                self._log[key] = RingBuffer(retention)
+                for value in values:
+                    self._log[key].append(value)
+                    
+    def get_retention(self):
+        return self._retention
+    
+    def add(self, name, amount):
+        if name in self._log:
+            self._log[name].append(amount)
+            
+    def register(self, name):
+        if name not in self._log:
+            self._log[name] = RingBuffer(self._retention)
+            
+    def average(self, name, r):
+        buf = self._log.get(name)
+        
+        if buf is None:
+            return 0.0
+        
+        count = buf._count
+        length = count if count < buf._capacity else buf._capacity
+        
+        if length < r:
+            if length <= 0:
+                return -1.0
+            
+            # track the requested window, not the warm-up length
+            return buf.sum(r) / length
+        
+        if r <= 0:
+            return -1.0
+        
+        return buf.sum(r) / r
+    
+    def get_subjects(self):
+        return [(key, self._log[key].values()) for key in self._log]
+    
+    def freeze(self):
+        return FrozenRingHistoryLog(self)
+    
+
+class FrozenRingHistoryLog(RingHistoryLog):
+    
+    def __init__(self, source):
+        self._type = source._type
+        self._retention = source._retention
+        self._log = dict((key, buf.share()) for key, buf in source._log.items())
+        
+    def add(self, name, amount):
+        raise TypeError("history snapshots are read-only")
+    
+    def register(self, name):
+        raise TypeError("history snapshots are read-only")
+    
+    def freeze(self):
+        return self
+    
+    def copy(self):
+        return self
+    
+
+class MappedSeries(object):
+    """
+    Append-only series of doubles in a memory-mapped file: a 16 byte header (magic and sample count) followed
+    by the samples. The file grows in chunks; only the pages being touched need to stay in memory.
+    """
+    
+    MAGIC = b"BZBHLOG\0"
+    HEADER = struct.Struct("<8sQ")
+    INITIAL_CAPACITY = 4096
+    MAX_GROWTH = 1 << 20
+    
+    def __init__(self, path):
+        self._path = path
+        self._map = None
+        self._values = None
+        
+        if os.path.exists(path):
+            self._open()
+            magic, count = MappedSeries.HEADER.unpack_from(self._map, 0)
+            
+            if magic != MappedSeries.MAGIC:
+                self.close()
+                raise ValueError("%s is not a history series" % path)
+            
+            self._count = count
+        else:
+            with open(path, "wb") as f:
+                f.write(MappedSeries.HEADER.pack(MappedSeries.MAGIC, 0))
+                f.truncate(MappedSeries.HEADER.size + 8 * MappedSeries.INITIAL_CAPACITY)
+            
+            self._open()
+            self._count = 0
+            
+    def _open(self):
+        with open(self._path, "r+b") as f:
+            self._map = mmap.mmap(f.fileno(), 0)
+        
+        self._capacity = (len(self._map) - MappedSeries.HEADER.size) // 8
+        self._values = memoryview(self._map)[MappedSeries.HEADER.size:MappedSeries.HEADER.size + 8 * self._capacity].cast('d')
+        
+    def _grow(self):
+        capacity = self._capacity + min(max(self._capacity, MappedSeries.INITIAL_CAPACITY), MappedSeries.MAX_GROWTH)
+        self.close()
+        
+        with open(self._path, "r+b") as f:
+            f.truncate(MappedSeries.HEADER.size + 8 * capacity)
+            
+        self._open()
+        
+    def __len__(self):
+        return self._count
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._values[j] for j in range(*i.indices(self._count))]
+        
+        if i < 0:
+            i += self._count
+            
+        if i < 0 or i >= self._count:
+            raise IndexError("series index out of range")
+        
+        return self._values[i]
+    
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._values[i]
+    
+    def get_path(self):
+        return self._path
+    
+    def append(self, value):
+        if self._count >= self._capacity:
+            self._grow()
+            
+        self._values[self._count] = value
+        self._count += 1
+        MappedSeries.HEADER.pack_into(self._map, 0, MappedSeries.MAGIC, self._count)
+        
+    def sum_last(self, r):
+        # newest first, in the same order HistoryLog.average adds them up
+        values = self._values
+        count = self._count
+        amount = 0.0
+        
+        for i in range(r):
+            amount += values[count - 1 - i]
+            
+        return amount
+    
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+    
+    def close(self):
+        if self._map is not None:
+            self._values.release()
+            self._map.close()
+            self._values = None
+            self._map = None
+            
+    def __getstate__(self):
+        return {"_path": self._path, "_count": self._count}
+    
+    def __setstate__(self, state):
+        # reattach to the file, which other series may share; only the state it was left in can be taken up again
+        self._path = state["_path"]
+        self._map = None
+        self._values = None
+        self._open()
+        self._count = state["_count"]
+        magic, count = MappedSeries.HEADER.unpack_from(self._map, 0)
+        
+        if magic != MappedSeries.MAGIC or count != self._count:
+            self.close()
+            raise ValueError("%s holds %d samples, the saved state %d; restore from a copy of the history "
+                             "directory taken with the state" % (self._path, count, self._count))
+        
+
+class MappedHistoryLog(HistoryLog):
+    """
+    HistoryLog that keeps every sample on disk, one MappedSeries file per subject in <directory>/<type>/.
+    
+    Series already in the directory are reopened and stay keyed by subject name until the subject is
+    registered again, so finished runs can be read back (average, get_subjects) without replaying them.
+    """
+    
+    EXTENSION = ".f64"
+    
+    def __init__(self, t=None, directory=None):
+        if t is None or directory is None:
+            raise TypeError("needs type and directory")
+        
+        self._type = t
+        self._directory = os.path.join(directory, t.lower())
+        self._log = {}
+        
+        if not os.path.isdir(self._directory):
+            os.makedirs(self._directory)
+        
+        for filename in sorted(os.listdir(self._directory)):
+            if filename.endswith(MappedHistoryLog.EXTENSION):
+                name = unquote(filename[:-len(MappedHistoryLog.EXTENSION)])
+                self._log[name] = MappedSeries(os.path.join(self._directory, filename))
+                
+    @staticmethod
+    def subject_name(name):
+        return name.get_name() if isinstance(name, ICommodity) else str(name)
+    
+    def get_directory(self):
+        return self._directory
+    
+    def add(self, name, amount):
+        series = self._log.get(name)
+        
+        if series is not None:
+            series.append(amount)
+            
+    def register(self, name):
+        if name in self._log:
+            return
+        
+        subject = MappedHistoryLog.subject_name(name)
+        series = self._log.pop(subject, None)
+        
+        if series is None:
+            series = MappedSeries(os.path.join(self._directory, quote(subject, safe="") + MappedHistoryLog.EXTENSION))
+            
+        self._log[name] = series
+        
+    def average(self, name, r):
+        series = self._log.get(name)
+        
+        if series is None:
+            return 0.0
+        
+        length = len(series)
+        
+        if length < r:
+            r = length
+            
+        if r <= 0:
+            return -1.0
+        
+        return series.sum_last(r) / r
+    
+    def freeze(self):
+        frozen = FrozenHistoryLog(self)
+        # register() re-keys reopened series, the view keeps the keys it was taken with
+        frozen._log = dict(self._log)
+        return frozen
+    
+    def copy(self):
+        # copying millions of samples into memory defeats the purpose; snapshots get a read-only view
+        return self.freeze()
+    
+    def flush(self):
+        for series in self._log.values():
+            series.flush()
+            
+    def close(self):
+        for series in self._log.values():
+            series.close()
+    
+
+class History(object):
+
+    def __init__(self, src=None, retention=None, directory=None):
+        """
+        Logs keep everything in memory by default, only the last `retention` entries with a retention, or
+        everything in memory-mapped files under `directory` (which also reopens the logs of an earlier run).
+        """
         if src is not None:
-            self._prices = HistoryLog(src._prices)
-            self._asks = HistoryLog(src._asks)
-            self._bids = HistoryLog(src._bids)
-            self._trades = HistoryLog(src._trades)
-            self._profit = HistoryLog(src._profit)
+            self._retention = src._retention
+            self._directory = src._directory
+            self._prices = src._prices.copy()
+            self._asks = src._asks.copy()
+            self._bids = src._bids.copy()
+            self._trades = src._trades.copy()
+            self._profit = src._profit.copy()
+        else:
+            self._retention = retention
+            self._directory = directory
+            self._prices = self._new_log(EcoNoun.PRICE)
+            self._asks = self._new_log(EcoNoun.ASK)
+            self._bids = self._new_log(EcoNoun.BID)
+            self._trades = self._new_log(EcoNoun.TRADE)
+            self._profit = self._new_log(EcoNoun.PROFIT)
+            
+    def _new_log(self, t):
+        if self._directory is not None:
+            return MappedHistoryLog(t, self._directory)
+        if self._retention is None:
+            return HistoryLog(t)
+        return RingHistoryLog(t, retention=self._retention)
+    
+    def get_directory(self):
+        return self._directory
+    
+    def flush(self):
+        for log in (self._prices, self._asks, self._bids, self._trades, self._profit):
+            log.flush()
+            
+    def close(self):
+        for log in (self._prices, self._asks, self._bids, self._trades, self._profit):
+            log.close()
+    
+    def get_retention(self):
+        return self._retention
+    
+    def freeze(self):
+        """
+        Read-only History as it is now, sharing storage with this one; see HistoryLog.freeze.
+        """
+        frozen = History.__new__(History)
+        frozen._retention = self._retention
+        frozen._directory = self._directory
+        frozen._prices = self._prices.freeze()
+        frozen._asks = self._asks.freeze()
+        frozen._bids = self._bids.freeze()
+        frozen._trades = self._trades.freeze()
+        frozen._profit = self._profit.freeze()
+        return frozen
             
     def register_commodity(self, good):
         self._prices.register(good)
@@ -1,96 +1,342 @@
 from builtins import range
+from array import array
 
 
 class InventoryData(object):
-
+    
     def __init__(self, max_size, ideal, start):
         self._max_size = max_size
         self._ideal = ideal
         self._start = start
-        
+    
     def get_max_size(self):
         return self._max_size
     
     def set_max_size(self, max_size):
         self._max_size = max_size
-        
+    
     def get_ideal(self):
         return self._ideal
     
     def set_ideal(self, ideal):
         self._ideal = ideal
-        
+    
     def get_start(self):
         return self._start
     
     def set_start(self, start):
         self._start = start
+    
 
+class CommoditySlots(object):
+    """
+    Assigns commodities to fixed, dense slot numbers. A market lays out the inventories of its agents with one
+    shared CommoditySlots, so inventories can keep their values in flat arrays indexed by slot.
+    """
+    
+    def __init__(self, goods=()):
+        self._slots = {}
+        self._goods = []
+        self._space = array('d')
+        
+        for good in goods:
+            self.slot(good)
+    
+    def __len__(self):
+        return len(self._goods)
+    
+    def find(self, good):
+        return self._slots.get(good, -1)
+    
+    def slot(self, good):
+        slot = self._slots.get(good)
+        
+        if slot is None:
+            slot = len(self._goods)
+            self._slots[good] = slot
+            self._goods.append(good)
+            self._space.append(good.get_space())
+        
+        return slot
+    
+    def get_good(self, slot):
+        return self._goods[slot]
+    
+    def get_goods(self):
+        return self._goods
+    
+    def get_space(self, slot):
+        return self._space[slot]
+    
 
 class Inventory(object):
     
     class InventoryEntry(object):
         
+        __slots__ = ("_amount", "_original_price")
+        
         def __init__(self, amount, original_price):
             self._amount = amount
             self._original_price = original_price
-            
+        
         def get_amount(self):
             return self._amount
         
         def get_original_price(self):
             return self._original_price
     
-    def __init__(self, other_inventory=None):
-        self._stuff = {}
-        self._ideal = {}
-        self._expecting = {}
+    HELD = 1
+    IDEAL = 2
+    EXPECTING = 4
+    
+    def __init__(self, other_inventory=None, slots=None):
+        if slots is None:
+            slots = other_inventory._slots if other_inventory is not None else CommoditySlots()
+        
+        self._slots = slots
+        self._flags = bytearray()
+        self._amount = array('d')
+        self._cost = array('d')
+        self._ideal = array('d')
+        self._expecting = array('d')
+        self._expecting_cost = array('d')
+        self._used_space = 0.0
+        self._used_error = 0.0
+        self._used_slots = 0
         self._max_size = 0
+        self._version = 0
+        self._known = None
         
         if other_inventory is not None:
-            self._stuff = other_inventory._stuff.copy()
-            self._ideal = other_inventory._ideal.copy()
-            self._expecting = other_inventory._expecting.copy()
-            self._max_size = other_inventory._max_size.copy()
+            if other_inventory._slots is slots:
+                self._flags = bytearray(other_inventory._flags)
+                self._amount = array('d', other_inventory._amount)
+                self._cost = array('d', other_inventory._cost)
+                self._ideal = array('d', other_inventory._ideal)
+                self._expecting = array('d', other_inventory._expecting)
+                self._expecting_cost = array('d', other_inventory._expecting_cost)
+                self._used_space = other_inventory._used_space
+                self._used_error = other_inventory._used_error
+                self._used_slots = other_inventory._used_slots
+            else:
+                self._copy_from(other_inventory)
             
-    def from_data(self, data):
-        sizes = []
-        amountsp = []
+            self._max_size = other_inventory._max_size
+    
+    def __getstate__(self):
+        # all columns in one flat buffer: far cheaper to pickle than five small arrays
+        columns = self._amount + self._cost + self._ideal + self._expecting + self._expecting_cost
+        return (self._slots, bytes(self._flags), columns.tobytes(), self._used_space, self._max_size, self._version,
+                self._used_error, self._used_slots)
+    
+    def __setstate__(self, state):
+        self._slots, flags, columns, self._used_space, self._max_size = state[:5]
+        n = len(flags)
+        data = array('d')
+        data.frombytes(columns)
         
-        for key in data.get_start():
-            sizes.append(key)
-            amountsp.append(Inventory.InventoryEntry(data.get_start()[key], 0))
+        self._flags = bytearray(flags)
+        self._amount = data[0:n]
+        self._cost = data[n:2 * n]
+        self._ideal = data[2 * n:3 * n]
+        self._expecting = data[3 * n:4 * n]
+        self._expecting_cost = data[4 * n:5 * n]
+        self._version = state[5] if len(state) > 5 else 0
+        self._known = None
         
-        for i in range(len(sizes)):
-            self._stuff[sizes[i]] = amountsp[i]
+        if len(state) > 7:
+            # the running total as it was, rounding error included, rather than a fresh sum
+            self._used_error, self._used_slots = state[6:8]
+        else:
+            self._sum_used_space()
+    
+    def _reserve(self, slot):
+        missing = slot + 1 - len(self._flags)
         
-        sizes = []
-        amounts = []
+        if missing > 0:
+            zeros = array('d', bytes(8 * missing))
+            self._flags.extend(bytes(missing))
+            self._amount.extend(zeros)
+            self._cost.extend(zeros)
+            self._ideal.extend(zeros)
+            self._expecting.extend(zeros)
+            self._expecting_cost.extend(zeros)
+    
+    def _find(self, good):
+        slot = self._slots.find(good)
+        return slot if slot < len(self._flags) else -1
+    
+    def _slot(self, good):
+        slot = self._slots.slot(good)
+        self._reserve(slot)
+        return slot
+    
+    def _copy_from(self, other):
+        goods = other._slots.get_goods()
         
-        for key in data.get_ideal():
-            sizes.append(key)
-            amounts.append(data.get_ideal()[key])
+        for i in range(len(other._flags)):
+            flags = other._flags[i]
+            
+            if flags == 0:
+                continue
             
-        for i in range(len(sizes)):
-            self._ideal[sizes[i]] = amounts[i]
+            slot = self._slot(goods[i])
+            self._flags[slot] = flags
+            self._known = None
+            self._amount[slot] = other._amount[i]
+            self._cost[slot] = other._cost[i]
+            self._ideal[slot] = other._ideal[i]
+            self._expecting[slot] = other._expecting[i]
+            self._expecting_cost[slot] = other._expecting_cost[i]
+        
+        self._sum_used_space()
+    
+    def get_commodity_slots(self):
+        return self._slots
+    
+    def rebind(self, slots):
+        """
+        Moves the contents of this inventory onto another slot layout.
+        """
+        if slots is self._slots:
+            return
+        
+        old = Inventory(self)
+        
+        self._slots = slots
+        self._flags = bytearray()
+        self._amount = array('d')
+        self._cost = array('d')
+        self._ideal = array('d')
+        self._expecting = array('d')
+        self._expecting_cost = array('d')
+        self._known = None
+        self._version += 1
+        self._reserve(len(slots) - 1)
+        self._copy_from(old)
+    
+    def from_data(self, data):
+        for key in data.get_start():
+            self._set_amount(self._slot(key), data.get_start()[key], 0)
+        
+        for key in data.get_ideal():
+            self.set_ideal(key, data.get_ideal()[key])
         
         self._max_size = data.get_max_size()
     
+    def _set_amount(self, slot, amount, unit_cost):
+        if self._flags[slot] & Inventory.HELD:
+            old = self._amount[slot]
+        else:
+            if self._flags[slot] == 0:
+                self._known = None
+            
+            self._flags[slot] |= Inventory.HELD
+            old = 0.0
+        
+        if old != amount:
+            self._used_slots += (amount != 0) - (old != 0)
+            
+            if self._used_slots == 0:
+                # whatever rounding is left over, nothing held takes up nothing
+                self._used_space = 0.0
+                self._used_error = 0.0
+            else:
+                space = self._slots.get_space(slot)
+                self._add_used_space(-old * space)
+                self._add_used_space(amount * space)
+        
+        self._amount[slot] = amount
+        self._cost[slot] = unit_cost
+        self._version += 1
+    
+    def get_max_size(self):
+        return self._max_size
+    
+    def set_max_size(self, max_size):
+        self._max_size = max_size
+        self._version += 1
+    
+    def set_ideal(self, good, amount):
+        slot = self._slot(good)
+        
+        if self._flags[slot] == 0:
+            self._known = None
+        
+        self._flags[slot] |= Inventory.IDEAL
+        self._ideal[slot] = amount
+        self._version += 1
+    
+    def set_expecting(self, good, amount, unit_cost):
+        slot = self._slot(good)
+        
+        if self._flags[slot] == 0:
+            self._known = None
+        
+        self._flags[slot] |= Inventory.EXPECTING
+        self._expecting[slot] = amount
+        self._expecting_cost[slot] = unit_cost
+        self._version += 1
+    
+    def get_version(self):
+        """
+        Counter that changes whenever anything in the inventory does.
+        """
+        return self._version
+    
+    def get_known_slots(self):
+        """
+        Slots of the goods this inventory holds, has an ideal amount of or expects, in slot order.
+        """
+        if self._known is None:
+            flags = self._flags
+            self._known = [slot for slot in range(len(flags)) if flags[slot]]
+        
+        return self._known
+    
+    def _entries(self, flag, first, second=None):
+        result = {}
+        goods = self._slots.get_goods()
+        
+        for slot in range(len(self._flags)):
+            if self._flags[slot] & flag:
+                if second is None:
+                    result[goods[slot]] = first[slot]
+                else:
+                    result[goods[slot]] = Inventory.InventoryEntry(first[slot], second[slot])
+        
+        return result
+    
+    def get_stuff(self):
+        return self._entries(Inventory.HELD, self._amount, self._cost)
+    
+    def get_ideal(self):
+        return self._entries(Inventory.IDEAL, self._ideal)
+    
+    def get_expecting(self):
+        return self._entries(Inventory.EXPECTING, self._expecting, self._expecting_cost)
+    
     def query_amount(self, good):
-        if good in self._stuff:
-            return self._stuff[good].get_amount()
+        slot = self._find(good)
+        
+        if slot >= 0 and self._flags[slot] & Inventory.HELD:
+            return self._amount[slot]
         
         return 0.0
     
     def query_expecting(self, good):
-        if good in self._expecting:
-            return self._expecting[good].get_amount()
+        slot = self._find(good)
+        
+        if slot >= 0 and self._flags[slot] & Inventory.EXPECTING:
+            return self._expecting[slot]
         
         return 0.0
     
     def query_cost(self, good):
-        if good in self._expecting:
-            return self._expecting[good].get_original_price()
+        slot = self._find(good)
+        
+        if slot >= 0 and self._flags[slot] & Inventory.EXPECTING:
+            return self._expecting_cost[slot]
         
         return 0.0
     
@@ -98,59 +344,82 @@ class Inventory(object):
         return self._max_size - self.get_used_space()
     
     def get_used_space(self):
-        space_used = 0.0
+        return self._used_space + self._used_error
+    
+    def _add_used_space(self, value):
+        # Neumaier summation: the running total carries its rounding error along instead of drifting away
+        total = self._used_space
+        result = total + value
         
-        for key in self._stuff:
-            space_used += self._stuff[key].get_amount() * key.get_space()
+        if abs(total) >= abs(value):
+            self._used_error += (total - result) + value
+        else:
+            self._used_error += (value - result) + total
+        
+        self._used_space = result
+    
+    def _sum_used_space(self):
+        flags = self._flags
+        amount = self._amount
+        space = self._slots.get_space
+        used = 0.0
+        held = 0
         
-        return space_used
+        for slot in range(len(flags)):
+            if flags[slot] & Inventory.HELD and amount[slot] != 0:
+                used += amount[slot] * space(slot)
+                held += 1
+        
+        self._used_space = used
+        self._used_error = 0.0
+        self._used_slots = held
     
     def add(self, good, amount, unit_cost):
         if amount < 0 or good is None:
             return
         
-        self._stuff[good] = Inventory.InventoryEntry(amount, unit_cost)
+        self._set_amount(self._slot(good), amount, unit_cost)
     
     def change(self, good, amount, unit_cost):
-        if good not in self._stuff:
-            return 0.0
+        slot = self._find(good)
         
-        result_amount = 0.0
-        result_price = 0.0
+        if slot < 0 or not self._flags[slot] & Inventory.HELD:
+            return 0.0
         
-        current = self._stuff[good]
+        current_amount = self._amount[slot]
+        current_price = self._cost[slot]
         
         if unit_cost > 0:
-            if current.get_amount() <= 0:
+            if current_amount <= 0:
                 result_amount = amount
                 result_price = unit_cost
             else:
-                result_amount = current.get_amount() + amount
-                result_price = (current.get_amount() * current.get_original_price() + amount * unit_cost) / (current.get_amount() + amount)
+                result_amount = current_amount + amount
+                result_price = (current_amount * current_price + amount * unit_cost) / (current_amount + amount)
         else:
-            result_amount = current.get_amount() + amount
-            result_price = current.get_original_price()
-            
-        self._stuff[good] = Inventory.InventoryEntry(result_amount, result_price)
+            result_amount = current_amount + amount
+            result_price = current_price
+        
+        self._set_amount(slot, result_amount, result_price)
         return result_price
     
     def change_expecting(self, good, delta, unit_cost):
-        result_amount = 0.0
-        result_price = 0.0
+        slot = self._slot(good)
         
-        if good in self._expecting:
-            current = self._expecting[good]
+        if self._flags[slot] & Inventory.EXPECTING:
+            current_amount = self._expecting[slot]
+            current_price = self._expecting_cost[slot]
             
             if unit_cost > 0:
-                if current.get_amount() <= 0:
+                if current_amount <= 0:
                     result_amount = delta
                     result_price = unit_cost
                 else:
-                    result_amount = current.get_amount() + delta
-                    result_price = (current.get_amount() * current.get_original_price() + delta * unit_cost) / (current.get_amount() + delta)
+                    result_amount = current_amount + delta
+                    result_price = (current_amount * current_price + delta * unit_cost) / (current_amount + delta)
             else:
-                result_amount = current.get_amount() + delta
-                result_price = current.get_original_price()
+                result_amount = current_amount + delta
+                result_price = current_price
         else:
             result_amount = delta
             result_price = unit_cost
@@ -158,16 +427,18 @@ class Inventory(object):
         if result_amount < 0:
             result_amount = 0.0
             result_price = 0.0
-            
-        self._expecting[good] = Inventory.InventoryEntry(result_amount, result_price)
-        return result_price
         
+        self.set_expecting(good, result_amount, result_price)
+        return result_price
+    
     def surplus(self, good):
-        amount = self.query_amount(good)
-        ideal = 0.0
+        slot = self._find(good)
         
-        if good in self._ideal:
-            ideal = self._ideal[good]
+        if slot < 0:
+            return 0.0
+        
+        amount = self._amount[slot] if self._flags[slot] & Inventory.HELD else 0.0
+        ideal = self._ideal[slot]
         
         if amount > ideal:
             return amount - ideal
@@ -175,18 +446,16 @@ class Inventory(object):
         return 0.0
     
     def shortage(self, good):
-        if good not in self._stuff:
+        slot = self._find(good)
+        
+        if slot < 0 or not self._flags[slot] & Inventory.HELD:
             return 0.0
         
-        amount = self.query_amount(good) + self.query_expecting(good)
-        ideal = 0.0
+        flags = self._flags[slot]
+        amount = self._amount[slot] + (self._expecting[slot] if flags & Inventory.EXPECTING else 0.0)
+        ideal = self._ideal[slot]
         
-        if good in self._ideal:
-            ideal = self._ideal[good]
-            
         if amount < ideal:
             return ideal - amount
         
         return 0.0
-        
-            
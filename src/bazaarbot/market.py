@@ -1,6 +1,10 @@
 from builtins import range, staticmethod
+from collections import OrderedDict
+from functools import partial
+import time
 from bazaarbot import BazaarBotStaticImports, Tradebook
 from bazaarbot.history import History
+from bazaarbot.inventory import CommoditySlots
 from bazaarbot.agent import IAgent
 
 
@@ -9,6 +13,35 @@ class MarketOperations(object):
     SELL = "SELL"
     
 
+def pair_fills(bid_fills, ask_fills):
+    """
+    Yields (bid index, ask index, units) for the trades that fill two ranked sides with `bid_fills` and
+    `ask_fills` units, matching them up in order.
+    """
+    b = 0
+    a = 0
+    bid_left = 0.0
+    ask_left = 0.0
+    
+    while True:
+        while bid_left <= 0 and b < len(bid_fills):
+            bid_left = bid_fills[b]
+            b += 1
+            
+        while ask_left <= 0 and a < len(ask_fills):
+            ask_left = ask_fills[a]
+            a += 1
+            
+        if bid_left <= 0 or ask_left <= 0:
+            return
+        
+        units = min(bid_left, ask_left)
+        yield b - 1, a - 1, units
+        
+        bid_left -= units
+        ask_left -= units
+        
+
 class IOfferExecutor(object):
     
     def execute(self, bid, ask):
@@ -19,6 +52,25 @@ class IOfferExecutor(object):
     
     def reject_ask(self, offer, unit_price):
         raise NotImplementedError()
+    
+    def execute_fills(self, good, bids, bid_fills, asks, ask_fills, unit_price):
+        """
+        Settles a whole commodity cleared at one price (see bazaarbot.auction): offer bids[i] buys bid_fills[i]
+        and asks[i] sells ask_fills[i] units at `unit_price`, both sides in rank order and with the same total.
+        Offers that are not completely filled are rejected. This default executes every pair of pair_fills
+        as a separate trade.
+        """
+        for b, a, units in pair_fills(bid_fills, ask_fills):
+            self.execute(Offer(bids[b].get_agent(), good, units, unit_price),
+                         Offer(asks[a].get_agent(), good, units, unit_price))
+            
+        for offer, fill in zip(bids, bid_fills):
+            if fill < offer.get_units():
+                self.reject_bid(offer, offer.get_unit_price())
+                
+        for offer, fill in zip(asks, ask_fills):
+            if fill < offer.get_units():
+                self.reject_ask(offer, offer.get_unit_price())
 
 
 class IOfferResolver(object):
@@ -26,9 +78,18 @@ class IOfferResolver(object):
     def resolve(self, executor, bids, asks):
         raise NotImplementedError()
     
+    def bind_random_streams(self, streams):
+        """
+        Called by a market that uses RandomStreams with its MarketStreams. Resolvers that support them draw
+        from streams.resolution(commodity) and return True.
+        """
+        return False
+    
 
 class OfferExecutionStatistics(object):
     
+    __slots__ = ("_units_traded", "_money_traded")
+    
     def __init__(self, units_traded, money_traded):
         self._units_traded = units_traded
         self._money_traded = money_traded
@@ -65,6 +126,37 @@ class DefaultOfferExecutor(IOfferExecutor):
     def reject_ask(self, seller, unit_price):
         seller.get_agent().update_price_model(MarketOperations.SELL, seller.get_good(), False, unit_price)
 
+    def execute_fills(self, good, bids, bid_fills, asks, ask_fills, unit_price):
+        executor = type(self)
+        
+        if (executor.execute is not DefaultOfferExecutor.execute
+                or executor.transfer_good is not DefaultOfferExecutor.transfer_good
+                or executor.transfer_money is not DefaultOfferExecutor.transfer_money):
+            # subclasses hooking into the trades still see every pair go through execute and the transfers
+            IOfferExecutor.execute_fills(self, good, bids, bid_fills, asks, ask_fills, unit_price)
+            return
+        
+        # every agent is settled once for its whole fill instead of once per counterparty
+        for offer, fill in zip(asks, ask_fills):
+            if fill > 0:
+                agent = offer.get_agent()
+                agent.change_inventory(good, -fill, 0.0)
+                agent.set_money_available(agent.get_money_available() + fill * unit_price)
+                agent.update_price_model(MarketOperations.SELL, good, True, unit_price)
+                
+            if fill < offer.get_units():
+                self.reject_ask(offer, offer.get_unit_price())
+        
+        for offer, fill in zip(bids, bid_fills):
+            if fill > 0:
+                agent = offer.get_agent()
+                agent.change_inventory(good, fill, unit_price)
+                agent.set_money_available(agent.get_money_available() - fill * unit_price)
+                agent.update_price_model(MarketOperations.BUY, good, True, unit_price)
+                
+            if fill < offer.get_units():
+                self.reject_bid(offer, offer.get_unit_price())
+        
     def transfer_good(self, good, units, seller, buyer, clearing_price):
         seller.change_inventory(good, -units, 0.0)
         buyer.change_inventory(good, units, clearing_price)
@@ -76,6 +168,8 @@ class DefaultOfferExecutor(IOfferExecutor):
 
 class Offer(object):
     
+    __slots__ = ("_agent", "_commodity", "_units", "_unit_price", "_time_put")
+    
     def __init__(self, agent, commodity, units, unit_price):
         self._agent = agent
         self._commodity = commodity
@@ -110,12 +204,17 @@ class Offer(object):
     def get_time_put(self):
         return self._time_put
     
+    def set_time_put(self, value):
+        self._time_put = value
+    
     def __str__(self):
         return "(" + str(self._agent) + "): " + str(self._commodity) + "x " + str(self._units) + "@ " + str(self._unit_price)
     
     
 class OfferResolutionStatistics(object):
     
+    __slots__ = ("_offers_resolved", "_resolved_offers", "_units_traded", "_money_traded")
+    
     def __init__(self, resolved_offers):
         self._offers_resolved = len(resolved_offers)
         self._resolved_offers = resolved_offers
@@ -150,11 +249,16 @@ class DefaultOfferResolver(IOfferResolver):
             rnd = BazaarBotStaticImports.RANDOM_FACTORY()
             
         self._rng = rnd
+        self._streams = None
         
     @staticmethod
     def sort_offers(offers):
         offers.sort(key=lambda x: x.get_unit_price())
         
+    def bind_random_streams(self, streams):
+        self._streams = streams
+        return True
+        
     def resolve(self, executor, bids, asks):
         result = {}
         
@@ -162,14 +266,21 @@ class DefaultOfferResolver(IOfferResolver):
             if c not in asks:
                 continue
             
-            r = self.resolve_offer_set(executor, bids[c], asks[c])
+            if self._streams is None:
+                r = self.resolve_offer_set(executor, bids[c], asks[c])
+            else:
+                r = self.resolve_offer_set(executor, bids[c], asks[c], self._streams.resolution(c))
+                
             result[c] = r
         
         return result
     
-    def resolve_offer_set(self, executor, bids, asks):
-        self._rng.shuffle(bids)
-        self._rng.shuffle(asks)
+    def resolve_offer_set(self, executor, bids, asks, rng=None):
+        if rng is None:
+            rng = self._rng
+            
+        rng.shuffle(bids)
+        rng.shuffle(asks)
         
         DefaultOfferResolver.sort_offers(asks)
         
@@ -201,6 +312,95 @@ class DefaultOfferResolver(IOfferResolver):
         return OfferResolutionStatistics(resolved_offers)
             
 
+class OrderBook(object):
+    """
+    Offers of a single commodity for one round. Bids keep their (shuffled) arrival order and asks are sorted by
+    unit price; both sides are consumed through cursors instead of being popped from the front.
+    """
+    
+    def __init__(self, commodity, bids, asks):
+        self._commodity = commodity
+        self._bids = bids
+        self._asks = asks
+        self._bid_cursor = 0
+        self._ask_cursor = 0
+        
+    def get_commodity(self):
+        return self._commodity
+        
+    def prepare(self, rng):
+        rng.shuffle(self._bids)
+        rng.shuffle(self._asks)
+        
+        DefaultOfferResolver.sort_offers(self._asks)
+        
+    def best_bid(self):
+        return self._bids[self._bid_cursor] if self._bid_cursor < len(self._bids) else None
+    
+    def best_ask(self):
+        return self._asks[self._ask_cursor] if self._ask_cursor < len(self._asks) else None
+    
+    def match(self, executor):
+        bids = self._bids
+        asks = self._asks
+        bid_count = len(bids)
+        ask_count = len(asks)
+        b = self._bid_cursor
+        a = self._ask_cursor
+        
+        resolved_offers = []
+        
+        while b < bid_count and a < ask_count:
+            buyer = bids[b]
+            seller = asks[a]
+            
+            r = executor.execute(buyer, seller)
+            
+            if r.get_units_traded() > 0:
+                resolved_offers.append(r)
+                seller.set_units(seller.get_units() - r.get_units_traded())
+                buyer.set_units(buyer.get_units() + r.get_units_traded())
+                
+            if seller.get_units() == 0:
+                a += 1
+                
+            if buyer.get_units() == 0:
+                b += 1
+                
+        self._bid_cursor = b
+        self._ask_cursor = a
+        return resolved_offers
+    
+    def reject_remaining(self, executor):
+        for i in range(self._bid_cursor, len(self._bids)):
+            offer = self._bids[i]
+            executor.reject_bid(offer, offer.get_unit_price())
+            
+        for i in range(self._ask_cursor, len(self._asks)):
+            offer = self._asks[i]
+            executor.reject_ask(offer, offer.get_unit_price())
+            
+        self._bid_cursor = len(self._bids)
+        self._ask_cursor = len(self._asks)
+        
+
+class OrderBookOfferResolver(DefaultOfferResolver):
+    """
+    Drop-in replacement for DefaultOfferResolver that clears every commodity through an OrderBook, O(n log n)
+    per commodity instead of O(n^2). Uses the random generator exactly like DefaultOfferResolver, so both
+    produce the same trades for the same seed.
+    """
+    
+    def resolve_offer_set(self, executor, bids, asks, rng=None):
+        book = OrderBook(None if len(bids) == 0 else bids[0].get_good(), bids, asks)
+        book.prepare(self._rng if rng is None else rng)
+        
+        resolved_offers = book.match(executor)
+        book.reject_remaining(executor)
+        
+        return OfferResolutionStatistics(resolved_offers)
+    
+    
 class MarketData(object):
     
     def __init__(self, goods, agents):
@@ -221,6 +421,136 @@ class MarketSnapshot(object):
         return self._agents
 
 
+class RoundProgress(object):
+    """
+    A round being run in steps (Market.step_round, Market.simulate_for): the phase of the next step, how much
+    of that phase is done, and the offers and results carried from one step to the next while offers are
+    cleared. Phases that have nothing to do are skipped.
+    """
+    
+    PHASES = ("simulate_agents", "generate_offers", "record_offers", "resolve_offers", "record_trades",
+              "record_profit", "handle_bankruptcies")
+    
+    def __init__(self, round_num):
+        self._round_num = round_num
+        self._phase = -1
+        self._done = 0
+        self._total = 0
+        self._bids = None
+        self._asks = None
+        self._goods = None
+        self._result = None
+        
+    def get_round_num(self):
+        return self._round_num
+    
+    def get_phase(self):
+        return RoundProgress.PHASES[self._phase]
+    
+    def get_done(self):
+        return self._done
+    
+    def get_total(self):
+        return self._total
+    
+    def get_fraction(self):
+        """
+        Rough share of the round that is done, counting every phase as an equal part.
+        """
+        phase = float(self._done) / self._total if self._total > 0 else 0.0
+        return (self._phase + phase) / len(RoundProgress.PHASES)
+    
+    def __str__(self):
+        return "round %d: %s %d/%d" % (self._round_num, self.get_phase(), self._done, self._total)
+    
+
+class SliceReport(object):
+    """
+    What one simulate_for call got done: completed rounds, steps taken, seconds spent, and the RoundProgress
+    of the round left unfinished (None if the call ended on a round boundary).
+    """
+    
+    def __init__(self, rounds, steps, elapsed, progress):
+        self._rounds = rounds
+        self._steps = steps
+        self._elapsed = elapsed
+        self._progress = progress
+        
+    def get_rounds(self):
+        return self._rounds
+    
+    def get_steps(self):
+        return self._steps
+    
+    def get_elapsed(self):
+        return self._elapsed
+    
+    def get_progress(self):
+        return self._progress
+    
+
+class QueryCache(object):
+    """
+    Results of the market queries agents ask (average prices, hottest, cheapest and dearest good, most
+    profitable class), keyed by query and arguments. The market clears it whenever its history moves on, so
+    within a round every distinct question is only computed once. Keeps at most `max_size` results, dropping
+    the least recently used; a size of 0 turns caching off.
+    """
+    
+    def __init__(self, max_size=1024):
+        self._max_size = max_size
+        self._results = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        
+    def get_max_size(self):
+        return self._max_size
+    
+    def set_max_size(self, max_size):
+        self._max_size = max_size
+        
+        while len(self._results) > max_size:
+            self._results.popitem(False)
+    
+    def get_hits(self):
+        return self._hits
+    
+    def get_misses(self):
+        return self._misses
+    
+    def get_size(self):
+        return len(self._results)
+    
+    def reset_counters(self):
+        self._hits = 0
+        self._misses = 0
+    
+    def lookup(self, key, query, *args):
+        results = self._results
+        
+        try:
+            result = results[key]
+            results.move_to_end(key)
+            self._hits += 1
+            return result
+        except KeyError:
+            pass
+        
+        self._misses += 1
+        result = query(*args)
+        
+        if self._max_size > 0:
+            results[key] = result
+            
+            if len(results) > self._max_size:
+                results.popitem(False)
+        
+        return result
+    
+    def clear(self):
+        self._results.clear()
+    
+
 class MarketInitConfig(object):
     
     def get_starting_trade(self, commodity, default=1.0):
@@ -229,12 +559,15 @@ class MarketInitConfig(object):
 
 class Market(object):
     
-    def __init__(self, name, market_data, isb, offer_resolver, executor, market_init, rng=None):
+    def __init__(self, name, market_data, isb, offer_resolver, executor, market_init, rng=None, history=None):
         if rng is None:
             rng = BazaarBotStaticImports.RANDOM_FACTORY()
             
+        if history is None:
+            history = History()
+            
         self._name = name
-        self._history = History()
+        self._history = history
         self._trade_book = Tradebook()
         self._good_types = []
         self._agents = []
@@ -243,48 +576,633 @@ class Market(object):
         self._offer_executor = executor
         self._rng = rng
         self._round_num = 0
+        self._profiler = None
+        self._exporter = None
+        self._snapshot_clock = None
+        self._unclocked_agents = set()
+        self._agents_shared = False
+        self._round_events = None
+        self._round_progress = None
+        self._random_streams = None
+        self._agent_slots = {}
+        self._bankrupt_watch = set()
+        self._unwatched_agents = set()
+        self._lazy_offers = False
+        self._sparse_offers = False
+        self._queries = QueryCache()
+        self._continuous = None
+        self._order_lifetime = 1
+        self._contracts = None
         
         self.from_data(market_data, market_init)
         
     def replace_agent(self, old_agent, new_agent):
-        self._agents[self._agents.index(old_agent)] = new_agent
+        i = self._agent_slots.pop(old_agent, None)
+        
+        if i is None:
+            raise ValueError(str(old_agent) + " is not an agent of market " + self._name)
+        
+        old_agent.bind_bankruptcy_watch(None)
+        self._unwatched_agents.discard(old_agent)
+        new_agent.bind_commodity_slots(self._commodity_slots)
+        
+        if self._continuous is not None:
+            # orders of an agent that left must not trade on its behalf
+            self._continuous.cancel_agent(self._order_executor(), old_agent)
+        
+        if self._agents_shared:
+            # a copy-on-write snapshot still holds the current list
+            self._agents = list(self._agents)
+            self._agents_shared = False
+        
+        if self._snapshot_clock is not None:
+            self._unclocked_agents.discard(old_agent)
+            self._bind_snapshot_clock(new_agent)
+            
+        if self._random_streams is not None:
+            new_agent.bind_random(self._random_streams.agent(i))
+        
+        if self._lazy_offers:
+            new_agent.bind_offer_cache(True)
+        
+        self._agents[i] = new_agent
+        self._agent_slots[new_agent] = i
+        self._watch_agent(new_agent)
+        self._assign_agent_class(i, new_agent.get_agent_name())
+        
+    def replace_agents(self, old_agents, new_agents):
+        """
+        replace_agent for every pair of `old_agents` and `new_agents`, in order.
+        """
+        for old_agent, new_agent in zip(old_agents, new_agents):
+            self.replace_agent(old_agent, new_agent)
+            
+    def get_agent_slot(self, agent):
+        """
+        Position of `agent` in get_agents(), or None if it is not part of this market.
+        """
+        return self._agent_slots.get(agent)
+    
+    def _index_agents(self):
+        self._agent_slots = dict((self._agents[i], i) for i in range(len(self._agents)))
+        self._bankrupt_watch.clear()
+        self._unwatched_agents.clear()
+        
+        for agent in self._agents:
+            self._watch_agent(agent)
+            
+    def _watch_agent(self, agent):
+        if not agent.bind_bankruptcy_watch(self._bankrupt_watch):
+            self._unwatched_agents.add(agent)
+        elif agent.get_money_available() <= 0:
+            self._bankrupt_watch.add(agent)
+        
+    def _index_agent_classes(self):
+        self._class_ids = {}
+        self._class_names = []
+        self._class_counts = []
+        self._agent_classes = [-1] * len(self._agents)
+        
+        for i in range(len(self._agents)):
+            self._assign_agent_class(i, self._agents[i].get_agent_name())
+            
+    def _assign_agent_class(self, i, class_name):
+        class_id = self._class_ids.get(class_name)
+        
+        if class_id is None:
+            class_id = len(self._class_names)
+            self._class_ids[class_name] = class_id
+            self._class_names.append(class_name)
+            self._class_counts.append(0)
+            
+        old = self._agent_classes[i]
+        
+        if old >= 0:
+            self._class_counts[old] -= 1
+            
+        self._agent_classes[i] = class_id
+        self._class_counts[class_id] += 1
+        self._queries.clear()
+        return class_id
         
     def get_name(self):
         return self._name
     
+    def get_commodity_slots(self):
+        return self._commodity_slots
+    
+    def get_good_types(self):
+        return self._good_types
+    
+    def get_agents(self):
+        return self._agents
+    
     def simulate(self, rounds):
+        if self._round_progress is not None and rounds > 0:
+            # a round started by step_round counts as the first one
+            self.finish_round()
+            rounds -= 1
         
         for _ in range(rounds):
-            for agent in self._agents:
-                agent.simulate(self)
+            if self._profiler is not None:
+                self._profiler.run_round(self)
+            else:
+                self.simulate_agents()
+                self.generate_offers()
+                self.resolve_offers()
+                self.handle_bankruptcies()
+
+            self._end_round()
+            
+    def _end_round(self):
+        self._round_num += 1
+        
+        if self._random_streams is not None:
+            self._random_streams.set_round_num(self._round_num)
+            
+        if self._contracts is not None:
+            # agents replaced since their goods were shipped do not receive them
+            self._contracts.settle(self._round_num, self._agent_slots)
+        
+        if self._round_events is not None:
+            self._round_events.complete(self._round_num)
+            
+    def iter_round_steps(self, chunk_size=None):
+        """
+        The rest of the current round (a new one if none is in progress) as (phase, work) pairs, one per
+        step_round(chunk_size) call. Each `work` has to be called before the next pair is taken; once the
+        generator is exhausted the round is complete.
+        """
+        if self._round_progress is None:
+            if self._profiler is not None:
+                yield "round", partial(self.step_round, chunk_size)
+                return
+            
+            self._begin_round()
+            
+        while self._round_progress is not None:
+            yield self._round_progress.get_phase(), partial(self.step_round, chunk_size)
+            
+    def get_round_progress(self):
+        return self._round_progress
+    
+    def step_round(self, chunk_size=None):
+        """
+        Does the next step of the current round, starting a round if none is in progress: `chunk_size` agents
+        (all of them if None) while agents are simulated or make offers, one commodity while offers are
+        cleared, a whole phase otherwise. Phases replaced by a subclass and profiled rounds are not split.
+        Returns the RoundProgress, or None when this step completed the round.
+        """
+        progress = self._round_progress
+        
+        if progress is None:
+            if self._profiler is not None:
+                self._profiler.run_round(self)
+                self._end_round()
+                return None
+            
+            progress = self._begin_round()
+            
+        phase = progress._phase
+        done = progress._done
+        
+        if phase == 0:
+            if type(self).simulate_agents is Market.simulate_agents:
+                stop = progress._total if chunk_size is None else min(done + chunk_size, progress._total)
+                self._simulate_agent_range(done, stop)
+                progress._done = stop
+            else:
+                self.simulate_agents()
+                progress._done = progress._total
+        elif phase == 1:
+            if type(self).generate_offers is Market.generate_offers:
+                stop = progress._total if chunk_size is None else min(done + chunk_size, progress._total)
+                self._generate_offer_range(done, stop)
+                progress._done = stop
+            else:
+                self.generate_offers()
+                progress._done = progress._total
+        elif phase == 2:
+            self.record_offers()
+            progress._done = 1
+        elif phase == 3:
+            if progress._goods is None:
+                self.resolve_offers()
+            else:
+                self._clear_commodity(progress, progress._goods[done])
                 
-                for commodity in self._good_types:
-                    agent.generate_offers(self, commodity)
+            progress._done = done + 1
+        elif phase == 4:
+            self.record_trades(progress._result)
+            progress._done = 1
+        elif phase == 5:
+            self.record_profit()
+            progress._done = 1
+        else:
+            self.handle_bankruptcies()
+            progress._done = 1
+            
+        if progress._done >= progress._total:
+            self._next_phase(progress)
             
-            self.resolve_offers()
+        return self._round_progress
+    
+    def finish_round(self):
+        """
+        Completes the round in progress, if any, without splitting its phases further.
+        """
+        while self._round_progress is not None:
+            self.step_round()
             
-            todel = []
+    def simulate_for(self, budget, chunk_size=1000, max_rounds=None, clock=time.perf_counter):
+        """
+        Runs steps (see step_round) until `budget` seconds are used up or `max_rounds` rounds are complete,
+        continuing the round left unfinished by the previous call. A step that starts within the budget runs
+        to its end, so the overrun is at most one step. Returns a SliceReport.
+        """
+        start = clock()
+        deadline = start + budget
+        rounds = 0
+        steps = 0
+        
+        while max_rounds is None or rounds < max_rounds:
+            if self.step_round(chunk_size) is None:
+                rounds += 1
+                
+            steps += 1
             
-            for agent in self._agents:
-                if agent.get_money_available() <= 0:
-                    todel.append(agent)
+            if clock() >= deadline:
+                break
             
-            while len(todel) > 0:
-                self._signal_bankrupt.signal_bankrupt(self, todel[0])
-                del todel[0]
-
-            self._round_num += 1
+        return SliceReport(rounds, steps, clock() - start, self._round_progress)
+    
+    def _begin_round(self):
+        progress = RoundProgress(self._round_num)
+        self._round_progress = progress
+        self._next_phase(progress)
+        return progress
+    
+    def _next_phase(self, progress):
+        # moves on to the next phase that has work to do, or ends the round
+        replaced = type(self).resolve_offers is not Market.resolve_offers
+        
+        while True:
+            progress._phase += 1
+            progress._done = 0
+            phase = progress._phase
+            
+            if phase == len(RoundProgress.PHASES):
+                self._round_progress = None
+                self._end_round()
+                return
+            
+            if phase == 0 or phase == 1:
+                total = len(self._agents)
+            elif phase == 3:
+                total = 1 if replaced else self._begin_clearing(progress)
+            elif phase == 6:
+                total = 1
+            else:
+                # a subclass that replaces resolve_offers records offers, trades and profit itself
+                total = 0 if replaced else 1
+                
+            progress._total = total
+            
+            if total > 0:
+                return
+            
+    def _begin_clearing(self, progress):
+        if self._continuous is not None:
+            # orders were matched as they came in; only closing the round is left
+            progress._result = self.clear_offers()
+            return 0
+        
+        bids = self._trade_book.get_bids().copy()
+        asks = self._trade_book.get_asks().copy()
+        
+        progress._bids = bids
+        progress._asks = asks
+        progress._goods = list(bids) + [c for c in asks if c not in bids]
+        progress._result = {}
+        
+        if self._exporter is not None:
+            self._exporter.begin_clearing(self, self._offer_executor)
+            
+        if len(progress._goods) == 0:
+            self._end_clearing(progress)
+            
+        return len(progress._goods)
+    
+    def _clear_commodity(self, progress, commodity):
+        # resolvers clear every commodity on its own, so one commodity at a time gives the same result
+        executor = self._offer_executor
+        
+        if self._exporter is not None:
+            executor = self._exporter.wrap_executor(self, executor)
+            
+        bids = {commodity: progress._bids[commodity]} if commodity in progress._bids else {}
+        asks = {commodity: progress._asks[commodity]} if commodity in progress._asks else {}
+        progress._result.update(self._offer_resolver.resolve(executor, bids, asks))
+        
+        if progress._done + 1 == progress._total:
+            self._end_clearing(progress)
+            
+    def _end_clearing(self, progress):
+        if self._exporter is not None:
+            self._exporter.end_clearing(self, progress._result)
+            
+        self._trade_book.reset()
+        progress._bids = None
+        progress._asks = None
+        
+    async def step(self, chunk_size=1000, executor=None):
+        """
+        Runs one round without blocking the event loop for longer than a chunk of `chunk_size` agents or one
+        phase. With an `executor` offer resolution runs there; nothing else may change the market meanwhile.
+        Returns the number of completed rounds.
+        """
+        from bazaarbot.events import run_steps
+        await run_steps(self.iter_round_steps(chunk_size), executor, ("resolve_offers",))
+        return self._round_num
+    
+    async def simulate_async(self, rounds, chunk_size=1000, executor=None):
+        for _ in range(rounds):
+            await self.step(chunk_size, executor)
+            
+        return self._round_num
+    
+    def wait_round(self, round_num=None):
+        """
+        Awaitable resolving to get_round_num() once `round_num` rounds are complete; by default once the next
+        round completes, however it is run. Call it from a running event loop.
+        """
+        from bazaarbot.events import RoundEvents
+        
+        if self._round_events is None:
+            self._round_events = RoundEvents()
+            
+        if round_num is None:
+            round_num = self._round_num + 1
+            
+        future = self._round_events.wait(round_num)
+        # a round may have completed on another thread before the waiter was registered
+        self._round_events.complete(self._round_num)
+        return future
+            
+    def enable_profiling(self, sink=None):
+        from bazaarbot.profiling import MarketProfiler
+        self._profiler = MarketProfiler(sink)
+        return self._profiler
+    
+    def disable_profiling(self):
+        profiler = self._profiler
+        self._profiler = None
+        return profiler
+    
+    def get_profiler(self):
+        return self._profiler
+    
+    def __getstate__(self):
+        # export sinks own threads and files; they stay with the process that attached them
+        state = self.__dict__.copy()
+        state["_exporter"] = None
+        state["_round_events"] = None
+        return state
+    
+    def enable_export(self, sink):
+        """
+        Emits trades, rejected offers, per good round aggregates and bankruptcies of every following round to
+        `sink`; see bazaarbot.export.
+        """
+        from bazaarbot.export import MarketExporter
+        self._exporter = MarketExporter(sink)
+        return self._exporter
+    
+    def disable_export(self):
+        exporter = self._exporter
+        self._exporter = None
+        return exporter
+    
+    def get_exporter(self):
+        return self._exporter
+    
+    def get_round_num(self):
+        return self._round_num
+    
+    def set_random_streams(self, streams):
+        """
+        Draws every random number of the following rounds from `streams` (a RandomStreams) instead of the
+        generators the market, its resolver and the agent simulations were built with: agent slot i uses stream
+        (name, round, "agent", i), offers of a commodity are resolved with (name, round, "resolve", commodity
+        name). Agent factories and other economy code keep their own generators.
+        """
+        market_streams = streams.for_market(self._name)
+        market_streams.set_round_num(self._round_num)
+        
+        self._random_streams = market_streams
+        self._rng = market_streams.get("market")
+        self._offer_resolver.bind_random_streams(market_streams)
+        
+        for i in range(len(self._agents)):
+            self._agents[i].bind_random(market_streams.agent(i))
+            
+        return market_streams
+    
+    def get_random_streams(self):
+        return self._random_streams
+            
+    def enable_lazy_offers(self, sparse=False):
+        """
+        Lets agents reuse last round's offer for a good when nothing it depends on changed (see
+        IAgent.bind_offer_cache); results stay the same. With `sparse`, agents also only make offers for the goods
+        of IAgent.get_offer_interests, by default the goods they hold, want or expect. Agents otherwise bid on
+        every good, so sparse offers change the results.
+        """
+        self._lazy_offers = True
+        self._sparse_offers = sparse
+        
+        for agent in self._agents:
+            agent.bind_offer_cache(True)
+    
+    def disable_lazy_offers(self):
+        self._lazy_offers = False
+        self._sparse_offers = False
+        
+        for agent in self._agents:
+            agent.bind_offer_cache(False)
+    
+    def simulate_agents(self):
+        for agent in self._agents:
+            agent.simulate(self)
+            
+    def _simulate_agent_range(self, start, stop):
+        for agent in self._agents[start:stop]:
+            agent.simulate(self)
+            
+    def generate_offers(self):
+        self._generate_offer_range(0, len(self._agents))
+                
+    def _generate_offer_range(self, start, stop):
+        if self._sparse_offers:
+            for agent in self._agents[start:stop]:
+                for commodity in agent.get_offer_interests(self):
+                    agent.generate_offers(self, commodity)
+            return
+        
+        for agent in self._agents[start:stop]:
+            for commodity in self._good_types:
+                agent.generate_offers(self, commodity)
+                
+    def handle_bankruptcies(self):
+        # agents report themselves when their money drops to zero; only those that did are checked
+        watch = self._bankrupt_watch
+        slots = self._agent_slots
+        
+        if len(watch) == 0 and len(self._unwatched_agents) == 0:
+            return 0
+        
+        todel = [agent for agent in watch if agent in slots and agent.get_money_available() <= 0]
+        todel.extend(agent for agent in self._unwatched_agents if agent.get_money_available() <= 0)
+        todel.sort(key=slots.get)
+        watch.clear()
+        
+        if len(todel) == 0:
+            return 0
+        
+        if self._exporter is not None:
+            for agent in todel:
+                self._exporter.bankrupt(self, agent)
+        
+        self._signal_bankrupt.signal_bankrupt_batch(self, todel)
+        
+        for agent in todel:
+            # still here and still broke: reported again next round, as before
+            if agent in slots and agent.get_money_available() <= 0 and agent not in self._unwatched_agents:
+                watch.add(agent)
+            
+        return len(todel)
 
     def ask(self, offer):
+        if self._continuous is not None:
+            self.place_order(offer, True, self._order_expiry())
+            return
+        
         self._trade_book.ask(offer)
     
     def bid(self, offer):
+        if self._continuous is not None:
+            self.place_order(offer, False, self._order_expiry())
+            return
+        
         self._trade_book.bid(offer)
+    
+    def submit_offers(self, asks=(), bids=()):
+        """
+        Posts many offers at once; same result as calling ask() for every offer in `asks` and then bid() for
+        every offer in `bids`.
+        """
+        if self._continuous is not None:
+            for offer in asks:
+                self.ask(offer)
+                
+            for offer in bids:
+                self.bid(offer)
+            return
+        
+        self._trade_book.submit(asks, bids)
+        
+    def enable_continuous(self, lifetime=1):
+        """
+        Switches to continuous trading (see bazaarbot.continuous.ContinuousTradebook): offers are matched as
+        they are posted instead of all at once when the round resolves, and what is left of them rests in the
+        book. Offers agents post through ask() and bid() stay for `lifetime` rounds, counting the current one
+        (None: until filled); place_order() takes an explicit last round. Fills and posted volumes since the
+        previous round go into the history when a round resolves.
+        """
+        from bazaarbot.continuous import ContinuousTradebook
+        
+        if self._continuous is None:
+            self._continuous = ContinuousTradebook()
+            
+        self._order_lifetime = lifetime
+        return self._continuous
+    
+    def disable_continuous(self):
+        """
+        Back to clearing once per round; resting orders are rejected and dropped.
+        """
+        book = self._continuous
+        
+        if book is not None:
+            book.clear(self._offer_executor)
+            self._continuous = None
+            
+        return book
+    
+    def get_continuous_book(self):
+        return self._continuous
+    
+    def set_contract_scheduler(self, scheduler):
+        """
+        Settles the contracts of a bazaarbot.contract.ContractScheduler due in every following round when the
+        round ends, before the agents of the next round act. A scheduler behind this market first settles what
+        is due up to the current round; one ahead of it with contracts pending is refused (ValueError).
+        """
+        if scheduler is not None:
+            if scheduler.get_round_num() < self._round_num:
+                # contracts due in the rounds the scheduler skips are settled now instead of never
+                scheduler.settle(self._round_num)
+            
+            scheduler.set_round_num(self._round_num)
+            
+        self._contracts = scheduler
+        
+    def get_contract_scheduler(self):
+        return self._contracts
+    
+    def _order_expiry(self):
+        return None if self._order_lifetime is None else self._round_num + self._order_lifetime - 1
+    
+    def place_order(self, offer, is_ask, expires=None):
+        """
+        Matches `offer` right away in continuous mode; what is not filled rests in the book until the end of
+        round `expires` (None: until filled or cancelled). Returns the order id for cancel_order.
+        """
+        if self._continuous is None:
+            raise ValueError("market " + self._name + " is not trading continuously")
+        
+        return self._continuous.place(self._order_executor(), offer, is_ask, expires)
+    
+    def _order_executor(self):
+        executor = self._offer_executor
+        
+        if self._exporter is not None:
+            executor = self._exporter.wrap_executor(self, executor)
+        
+        return executor
+    
+    def cancel_order(self, order_id):
+        if self._continuous is None:
+            return False
+        
+        return self._continuous.cancel(order_id)
+        
+    def get_query_cache(self):
+        return self._queries
+    
+    def invalidate_queries(self):
+        """
+        Forgets all cached query results; for code that changes the history of the market directly.
+        """
+        self._queries.clear()
         
     def get_average_historical_price(self, good, r):
-        return self._history.get_prices().average(good, r)
+        return self._queries.lookup(("average", good, r), self._history.get_prices().average, good, r)
     
     def get_hottest_good(self, minimum=1.5, r=10):
+        return self._queries.lookup(("hottest", minimum, r), self._find_hottest_good, minimum, r)
+    
+    def _find_hottest_good(self, minimum, r):
         best_market = None
         best_ratio = -float("inf")
         
@@ -305,6 +1223,10 @@ class Market(object):
         return best_market
     
     def get_cheapest_good(self, r, exclude):
+        key = ("cheapest", r, frozenset(exclude) if exclude is not None else None)
+        return self._queries.lookup(key, self._find_cheapest_good, r, exclude)
+        
+    def _find_cheapest_good(self, r, exclude):
         best_price = float("inf")
         best_good = None
         
@@ -318,6 +1240,10 @@ class Market(object):
         return best_good
         
     def get_dearest_good(self, r, exclude):
+        key = ("dearest", r, frozenset(exclude) if exclude is not None else None)
+        return self._queries.lookup(key, self._find_dearest_good, r, exclude)
+        
+    def _find_dearest_good(self, r, exclude):
         best_price = -float("inf")
         best_good = None
         
@@ -331,14 +1257,16 @@ class Market(object):
         return best_good
     
     def get_agent_class_names(self):
-        classes = set()
-        
-        for agent in self._agents:
-            classes.add(agent.get_agent_name())
-            
-        return list(classes)
+        return [self._class_names[i] for i in range(len(self._class_names)) if self._class_counts[i] > 0]
+    
+    def get_agent_class_count(self, class_name):
+        class_id = self._class_ids.get(class_name)
+        return self._class_counts[class_id] if class_id is not None else 0
     
     def get_most_profitable_agent(self, r=10):
+        return self._queries.lookup(("profitable", r), self._find_most_profitable_agent, r)
+    
+    def _find_most_profitable_agent(self, r):
         best = -float("inf")
         best_class = ""
         
@@ -350,7 +1278,15 @@ class Market(object):
         
         return best_class
     
-    def get_snapshot(self):
+    def get_snapshot(self, copy_on_write=False):
+        """
+        With `copy_on_write` the snapshot shares storage with the market instead of copying the history and
+        every agent up front; see bazaarbot.snapshot.SharedMarketSnapshot. Its cost does not grow with the
+        length of the history, and agents are only copied once they change.
+        """
+        if copy_on_write:
+            return self._get_shared_snapshot()
+        
         agent_data = []
         
         for a in self._agents:
@@ -358,6 +1294,31 @@ class Market(object):
         
         return MarketSnapshot(History(self._history), agent_data)
     
+    def _get_shared_snapshot(self):
+        from bazaarbot.snapshot import SnapshotClock, SharedMarketSnapshot
+        
+        if self._snapshot_clock is None:
+            self._snapshot_clock = SnapshotClock()
+            
+            for agent in self._agents:
+                self._bind_snapshot_clock(agent)
+        
+        kept = dict((agent, agent.get_snapshot()) for agent in self._unclocked_agents)
+        self._agents_shared = True
+        
+        return SharedMarketSnapshot(self._history.freeze(), self._agents, self._snapshot_clock, kept)
+    
+    def _bind_snapshot_clock(self, agent):
+        if not agent.bind_snapshot_clock(self._snapshot_clock):
+            self._unclocked_agents.add(agent)
+    
+    def save_checkpoint(self, path):
+        """
+        Saves the complete state of the market to `path`; see bazaarbot.checkpoint.load_checkpoint.
+        """
+        from bazaarbot.checkpoint import save_checkpoint
+        save_checkpoint(self, path)
+    
     def from_data(self, data, market_init):
         for g in data.goods:
             self._good_types.append(g)
@@ -371,8 +1332,17 @@ class Market(object):
             
             self._trade_book.register(g)
         
+        self._queries.clear()
+        self._commodity_slots = CommoditySlots(self._good_types)
+        
         self._agents = []
         self._agents += data.agents
+        self._index_agent_classes()
+        
+        for agent in self._agents:
+            agent.bind_commodity_slots(self._commodity_slots)
+            
+        self._index_agents()
         
     @staticmethod
     def list_avg(l):
@@ -385,6 +1355,24 @@ class Market(object):
         return avg
     
     def resolve_offers(self):
+        self.record_offers()
+        r = self.clear_offers()
+        self.record_trades(r)
+        self.record_profit()
+        
+    def record_offers(self):
+        self._queries.clear()
+        
+        if self._continuous is not None:
+            posted = self._continuous.get_posted()
+            
+            for key in posted:
+                self._history.get_asks().add(key, posted[key][1])
+                
+            for key in posted:
+                self._history.get_bids().add(key, posted[key][3])
+            return
+        
         for key in self._trade_book.get_asks():
             offers = self._trade_book.get_asks()[key]
             count = 0.0
@@ -403,9 +1391,25 @@ class Market(object):
             
             self._history.get_bids().add(key, count)
             
-        r = self._offer_resolver.resolve(self._offer_executor, self._trade_book.get_bids().copy(), self._trade_book.get_asks().copy())
-        self._trade_book.get_asks().clear()
-        self._trade_book.get_bids().clear()
+    def clear_offers(self):
+        executor = self._offer_executor
+        
+        if self._exporter is not None:
+            executor = self._exporter.begin_clearing(self, executor)
+            
+        if self._continuous is not None:
+            r = self._continuous.close_round(executor, self._round_num)
+        else:
+            r = self._offer_resolver.resolve(executor, self._trade_book.get_bids().copy(), self._trade_book.get_asks().copy())
+        
+        if self._exporter is not None:
+            self._exporter.end_clearing(self, r)
+            
+        self._trade_book.reset()
+        return r
+    
+    def record_trades(self, r):
+        self._queries.clear()
         
         for key in r:
             stats = r[key]
@@ -416,26 +1420,23 @@ class Market(object):
             else:
                 # special case: none were traded this round, use last round's average price
                 self._history.get_prices().add(key, self._history.get_prices().average(key, 1))
+                
+    def record_profit(self):
+        totals = [0.0] * len(self._class_names)
+        classes = self._agent_classes
+        agents = self._agents
         
-        ag = [] + self._agents
-        ag.sort(key=lambda x: x.get_agent_name())
+        for i in range(len(agents)):
+            totals[classes[i]] += agents[i].get_last_simulate_profit()
+            
+        self._add_class_profits(totals)
         
-        curr_class = ""
-        last_class = ""
-        l = None
+    def _add_class_profits(self, totals):
+        self._queries.clear()
+        profit = self._history.get_profit()
         
-        for i in range(len(ag)):
-            a = ag[i]
-            curr_class = a.get_agent_name()
-            
-            if curr_class != last_class:
-                if l is not None:
-                    self._history.get_profit().add(last_class, Market.list_avg(l))
-                
-                l = []
-                last_class = curr_class
-            
-            l.append(a.get_last_simulate_profit())
+        for class_id in range(len(self._class_names)):
+            count = self._class_counts[class_id]
             
-        if l is not None:
-            self._history.get_profit().add(last_class, Market.list_avg(l))
+            if count > 0:
+                profit.add(self._class_names[class_id], totals[class_id] / count)
@@ -0,0 +1,131 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from bazaarbot._base import ISignalBankrupt
+from bazaarbot.profiling import MarketProfiler, ProfileRecorder
+from bazaarbot.export import RecordBuffer
+
+
+class BankruptcyRecorder(ISignalBankrupt):
+    """
+    Stands in for a market's ISignalBankrupt inside a worker process and remembers who went bankrupt, in the
+    order the market reported them.
+    """
+    
+    def __init__(self):
+        self._agents = []
+    
+    def signal_bankrupt(self, market, agent):
+        self._agents.append(agent)
+        
+    def signal_bankrupt_batch(self, market, agents):
+        self._agents.extend(agents)
+    
+    def get_agents(self):
+        return self._agents
+    
+
+def advance_market(payload):
+    """
+    Worker entry point. Runs up to `rounds` rounds of a pickled market and stops early after the first round
+    that bankrupted someone, so the coordinating process can handle those agents before the next round.
+    Exported records are collected and returned for the coordinating process to pass on.
+    """
+    market, rounds, export = pickle.loads(payload)
+    recorder = BankruptcyRecorder()
+    records = RecordBuffer()
+    market._signal_bankrupt = recorder
+    
+    if export:
+        market.enable_export(records)
+    
+    done = 0
+    
+    while done < rounds:
+        market.simulate(1)
+        done += 1
+        
+        if len(recorder.get_agents()) > 0:
+            break
+    
+    market._signal_bankrupt = None
+    return pickle.dumps((market, done, recorder.get_agents(), records.get_records()), pickle.HIGHEST_PROTOCOL)
+    
+
+class ParallelSimulator(object):
+    """
+    Advances the markets of an Economy in a process pool.
+    
+    Markets are shipped to the workers in blocks of at most `block_rounds` rounds and their state is adopted
+    back in place afterwards, so references to the Market objects stay valid. Bankruptcies are reported to
+    each market's ISignalBankrupt in the coordinating process, in market registration order and in the order
+    the market found them, before that market runs its next round.
+    
+    Markets must not share mutable state (random generators, agents, factories) with each other or with
+    the economy while a block runs; under that condition the results are identical to the serial path.
+    Markets using RandomStreams (Market.set_random_streams) meet it for their random numbers.
+    """
+    
+    def __init__(self, processes=None, block_rounds=None):
+        self._processes = processes
+        self._block_rounds = block_rounds
+    
+    def simulate(self, markets, n_rounds):
+        remaining = [n_rounds for _ in markets]
+        
+        with ProcessPoolExecutor(max_workers=self._processes) as pool:
+            while any(r > 0 for r in remaining):
+                jobs = []
+                
+                for i in range(len(markets)):
+                    if remaining[i] <= 0:
+                        continue
+                    
+                    rounds = remaining[i] if self._block_rounds is None else min(remaining[i], self._block_rounds)
+                    jobs.append((i, pool.submit(advance_market, self._pack(markets[i], rounds))))
+                
+                for i, job in jobs:
+                    market = markets[i]
+                    state, done, bankrupt, records = pickle.loads(job.result())
+                    signal_bankrupt = market._signal_bankrupt
+                    profiler = market._profiler
+                    exporter = market._exporter
+                    events = market._round_events
+                    
+                    market.__dict__.update(state.__dict__)
+                    market._signal_bankrupt = signal_bankrupt
+                    market._profiler = profiler
+                    market._exporter = exporter
+                    market._round_events = events
+                    remaining[i] -= done
+                    
+                    if profiler is not None:
+                        for profile in state._profiler.get_sink().get_profiles():
+                            profiler.record(market, profile)
+                    
+                    if exporter is not None:
+                        sink = exporter.get_sink()
+                        
+                        for kind, record in records:
+                            sink.emit(kind, record)
+                    
+                    if len(bankrupt) > 0:
+                        signal_bankrupt.signal_bankrupt_batch(market, bankrupt)
+                    
+                    if events is not None:
+                        events.complete(market.get_round_num())
+    
+    @staticmethod
+    def _pack(market, rounds):
+        signal_bankrupt = market._signal_bankrupt
+        profiler = market._profiler
+        market._signal_bankrupt = None
+        
+        # workers record into a fresh profiler whose rounds are replayed into the real one afterwards
+        if profiler is not None:
+            market._profiler = MarketProfiler(ProfileRecorder(None))
+        
+        try:
+            return pickle.dumps((market, rounds, market._exporter is not None), pickle.HIGHEST_PROTOCOL)
+        finally:
+            market._signal_bankrupt = signal_bankrupt
+            market._profiler = profiler
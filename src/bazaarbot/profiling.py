@@ -0,0 +1,205 @@
+import logging
+import time
+from collections import deque
+
+
+class IProfilingSink(object):
+    
+    def record(self, market, profile):
+        raise NotImplementedError()
+    
+
+class RoundProfile(object):
+    """
+    Wall time of every phase of one market round, in seconds, and the round's counters.
+    """
+    
+    def __init__(self, market_name, round_num):
+        self._market_name = market_name
+        self._round_num = round_num
+        self._timings = {}
+        self._counters = {}
+    
+    def get_market_name(self):
+        return self._market_name
+    
+    def get_round_num(self):
+        return self._round_num
+    
+    def get_timings(self):
+        return self._timings
+    
+    def get_counters(self):
+        return self._counters
+    
+    def get_total_time(self):
+        return sum(self._timings.values())
+    
+    def __str__(self):
+        phases = ", ".join("%s=%.3fms" % (k, v * 1000.0) for k, v in self._timings.items())
+        counters = ", ".join("%s=%s" % (k, v) for k, v in self._counters.items())
+        return "%s round %d: %.3fms (%s) [%s]" % (self._market_name, self._round_num, self.get_total_time() * 1000.0,
+                                                  phases, counters)
+    
+
+class MarketProfiler(object):
+    """
+    Runs market rounds phase by phase, timing each phase and counting offers, matches, traded units and
+    bankruptcies. Keeps cumulative totals and hands every RoundProfile to an optional IProfilingSink.
+    
+    Attached through Market.enable_profiling; a market without a profiler runs its rounds untouched.
+    """
+    
+    PHASES = ("simulate_agents", "generate_offers", "record_offers", "resolve", "record_trades", "record_profit",
+              "handle_bankruptcies")
+    COUNTERS = ("offers_created", "offers_matched", "units_traded", "agents_bankrupted")
+    
+    def __init__(self, sink=None, clock=time.perf_counter):
+        self._sink = sink
+        self._clock = clock
+        self._rounds = 0
+        self._timings = dict((phase, 0.0) for phase in MarketProfiler.PHASES)
+        self._counters = dict((counter, 0) for counter in MarketProfiler.COUNTERS)
+        self._last = None
+    
+    def get_sink(self):
+        return self._sink
+    
+    def set_sink(self, sink):
+        self._sink = sink
+    
+    def get_rounds(self):
+        return self._rounds
+    
+    def get_timings(self):
+        return self._timings
+    
+    def get_counters(self):
+        return self._counters
+    
+    def get_last_round(self):
+        return self._last
+    
+    def reset(self):
+        self._rounds = 0
+        self._last = None
+        
+        for phase in self._timings:
+            self._timings[phase] = 0.0
+        
+        for counter in self._counters:
+            self._counters[counter] = 0
+    
+    def run_round(self, market):
+        from bazaarbot.market import Market
+        
+        clock = self._clock
+        profile = RoundProfile(market.get_name(), market.get_round_num())
+        timings = profile.get_timings()
+        counters = profile.get_counters()
+        
+        t0 = clock()
+        market.simulate_agents()
+        t1 = clock()
+        market.generate_offers()
+        t2 = clock()
+        
+        timings["simulate_agents"] = t1 - t0
+        timings["generate_offers"] = t2 - t1
+        continuous = market.get_continuous_book()
+        
+        if continuous is None:
+            counters["offers_created"] = market._trade_book.count_offers()
+        else:
+            counters["offers_created"] = sum(p[0] + p[2] for p in continuous.get_posted().values())
+        
+        if type(market).resolve_offers is Market.resolve_offers:
+            t2 = clock()
+            market.record_offers()
+            t3 = clock()
+            r = market.clear_offers()
+            t4 = clock()
+            market.record_trades(r)
+            t5 = clock()
+            market.record_profit()
+            t6 = clock()
+            
+            timings["record_offers"] = t3 - t2
+            timings["resolve"] = t4 - t3
+            timings["record_trades"] = t5 - t4
+            timings["record_profit"] = t6 - t5
+            
+            counters["offers_matched"] = sum(stats.get_offers_resolved() for stats in r.values())
+            counters["units_traded"] = sum(stats.get_units_traded() for stats in r.values())
+        else:
+            # subclasses that replace resolve_offers are timed as a single phase
+            t2 = clock()
+            market.resolve_offers()
+            timings["resolve"] = clock() - t2
+        
+        t6 = clock()
+        bankrupted = market.handle_bankruptcies()
+        timings["handle_bankruptcies"] = clock() - t6
+        counters["agents_bankrupted"] = bankrupted if bankrupted is not None else 0
+        
+        self.record(market, profile)
+        return profile
+    
+    def record(self, market, profile):
+        self._rounds += 1
+        self._last = profile
+        
+        for phase, seconds in profile.get_timings().items():
+            self._timings[phase] = self._timings.get(phase, 0.0) + seconds
+        
+        for counter, value in profile.get_counters().items():
+            self._counters[counter] = self._counters.get(counter, 0) + value
+        
+        if self._sink is not None:
+            self._sink.record(market, profile)
+    
+
+class ProfileRecorder(IProfilingSink):
+    """
+    Keeps the last `capacity` round profiles (all of them when capacity is None).
+    """
+    
+    def __init__(self, capacity=1000):
+        self._profiles = deque(maxlen=capacity)
+    
+    def record(self, market, profile):
+        self._profiles.append(profile)
+    
+    def get_profiles(self):
+        return list(self._profiles)
+    
+    def clear(self):
+        self._profiles.clear()
+    
+
+class SlowRoundLogger(IProfilingSink):
+    """
+    Logs the phase breakdown of every round that took longer than `threshold` seconds.
+    """
+    
+    def __init__(self, threshold, logger=None, level=logging.WARNING):
+        if logger is None:
+            logger = logging.getLogger("bazaarbot.profiling")
+        
+        self._threshold = threshold
+        self._logger = logger
+        self._level = level
+    
+    def record(self, market, profile):
+        if profile.get_total_time() > self._threshold:
+            self._logger.log(self._level, "slow round: %s", profile)
+    
+
+class MultiSink(IProfilingSink):
+    
+    def __init__(self, *sinks):
+        self._sinks = list(sinks)
+    
+    def record(self, market, profile):
+        for sink in self._sinks:
+            sink.record(market, profile)
@@ -0,0 +1,87 @@
+import weakref
+from bazaarbot.market import MarketSnapshot
+
+
+class SnapshotClock(object):
+    """
+    Epoch counter shared by a market and its agents for copy-on-write snapshots.
+    
+    Every snapshot starts a new epoch. Agents call touch() before they change; the first change of an agent in
+    an epoch hands its previous state (IAgent.get_snapshot) to the live snapshots taken since its last change,
+    all other changes only compare two numbers.
+    """
+    
+    def __init__(self):
+        self._epoch = 0
+        self._snapshots = []
+    
+    def get_epoch(self):
+        return self._epoch
+    
+    def start(self, snapshot):
+        self._epoch += 1
+        self._snapshots = [(epoch, ref) for epoch, ref in self._snapshots if ref() is not None]
+        self._snapshots.append((self._epoch, weakref.ref(snapshot)))
+        return self._epoch
+    
+    def release(self, snapshot):
+        self._snapshots = [(epoch, ref) for epoch, ref in self._snapshots if ref() is not snapshot and ref() is not None]
+    
+    def touch(self, agent):
+        since = agent._snapshot_epoch
+        
+        if since == self._epoch:
+            return
+        
+        agent._snapshot_epoch = self._epoch
+        state = None
+        
+        for epoch, ref in self._snapshots:
+            if epoch <= since:
+                continue
+            
+            snapshot = ref()
+            
+            if snapshot is not None:
+                if state is None:
+                    state = agent.get_snapshot()
+                snapshot.keep(agent, state)
+    
+    def __getstate__(self):
+        # snapshots stay with the process that took them
+        return {"_epoch": self._epoch, "_snapshots": []}
+    
+
+class SharedMarketSnapshot(MarketSnapshot):
+    """
+    MarketSnapshot that shares storage with the live market instead of copying it. The history is frozen at
+    the rows that existed when it was taken; an agent is copied when it first changes afterwards, or when
+    get_agents() is called while it is still unchanged.
+    """
+    
+    def __init__(self, history, agents, clock, kept=None):
+        MarketSnapshot.__init__(self, history, None)
+        self._live = agents
+        self._clock = clock
+        self._kept = dict(kept) if kept is not None else {}
+        
+        clock.start(self)
+    
+    def keep(self, agent, state):
+        if agent not in self._kept:
+            self._kept[agent] = state
+    
+    def get_agents(self):
+        if self._agents is None:
+            kept = self._kept
+            self._agents = [kept[agent] if agent in kept else agent.get_snapshot() for agent in self._live]
+            
+            # everything is copied now, the market no longer needs to report changes
+            self._clock.release(self)
+            self._live = None
+            self._kept = None
+        
+        return self._agents
+    
+    def get_agent_count(self):
+        return len(self._agents) if self._agents is not None else len(self._live)
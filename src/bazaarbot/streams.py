@@ -0,0 +1,266 @@
+import hashlib
+import random
+import struct
+
+_WORD = struct.Struct("<Q")
+_BLOCK = struct.Struct("<8Q")
+_RECIP_BPF = 2.0 ** -53
+
+
+def _encode(part):
+    if isinstance(part, bool) or not isinstance(part, (int, str, bytes)):
+        raise TypeError("stream keys are made of ints, strings and bytes, got " + str(type(part)))
+    
+    if isinstance(part, int):
+        data = str(part).encode("ascii")
+        tag = b"i"
+    elif isinstance(part, str):
+        data = part.encode("utf-8")
+        tag = b"s"
+    else:
+        data = part
+        tag = b"b"
+    
+    return tag + _WORD.pack(len(data)) + data
+    
+
+def _encode_key(key):
+    return b"".join(_encode(part) for part in key)
+    
+
+class CounterRandom(random.Random):
+    """
+    random.Random over a keyed hash in counter mode: the words of stream `index` are those of
+    blake2b(index + block number, key=key), eight per block. Starting a stream costs no seeding, only the
+    first block when something is drawn. All methods of random.Random work, they are built on random() and
+    getrandbits().
+    """
+    
+    def __init__(self, key, index=b"", hasher=None):
+        self._key = key
+        self._index = index
+        self._hasher = hasher
+        self._position = 0
+        self._words = None
+        self.gauss_next = None
+    
+    def _word(self):
+        position = self._position
+        offset = position & 7
+        
+        if offset == 0 or self._words is None:
+            if self._hasher is None:
+                self._hasher = hashlib.blake2b(key=self._key, digest_size=64)
+            
+            h = self._hasher.copy()
+            h.update(self._index + _WORD.pack(position >> 3))
+            self._words = _BLOCK.unpack(h.digest())
+        
+        self._position = position + 1
+        return self._words[offset]
+    
+    def random(self):
+        return (self._word() >> 11) * _RECIP_BPF
+    
+    def getrandbits(self, k):
+        if k < 0:
+            raise ValueError("number of bits must be non-negative")
+        
+        if k <= 64:
+            return self._word() >> (64 - k)
+        
+        words = (k + 63) // 64
+        result = 0
+        
+        for i in range(words):
+            result |= self._word() << (64 * i)
+        
+        return result >> (64 * words - k)
+    
+    def seed(self, a=None, version=2):
+        # the key and index fix the stream, seeding starts it over
+        self.restart(self._index)
+    
+    def restart(self, index):
+        """
+        Turns this generator into the start of stream `index` under the same key.
+        """
+        self._index = index
+        self._position = 0
+        self._words = None
+        self.gauss_next = None
+    
+    def getstate(self):
+        return self._key, self._index, self._position, self.gauss_next
+    
+    def setstate(self, state):
+        self._key, self._index, self._position, self.gauss_next = state
+        self._hasher = None
+        self._words = None
+    
+    def __reduce__(self):
+        return CounterRandom, (self._key, self._index), self.getstate()
+    
+
+class RandomStreams(object):
+    """
+    Independent random generators derived from one root seed.
+    
+    A stream is named by a key of ints and strings. Its numbers come from a hash keyed with the root seed, over
+    the encoded key and a counter (CounterRandom), so what it draws never depends on how much any other stream
+    was used and making one costs next to nothing. With a `factory` (random.Random, say) every stream is
+    instead a generator of that factory seeded with derive(key). Markets given RandomStreams
+    (Market.set_random_streams) draw from one stream per agent, one per commodity resolution and one for the
+    market itself, all of them restarted every round: results then stay the same however the agents of a round
+    are ordered or spread over threads and processes.
+    """
+    
+    def __init__(self, seed, factory=None):
+        self._seed = seed
+        self._root = _encode(seed)
+        self._factory = factory
+        self._key = hashlib.blake2b(self._root, digest_size=32, person=b"streams").digest()
+        self._hasher = None
+    
+    def get_seed(self):
+        return self._seed
+    
+    def derive(self, *key):
+        """
+        The 128 bit seed of the stream named `key`.
+        """
+        h = hashlib.blake2b(self._root, digest_size=16)
+        
+        for part in key:
+            h.update(_encode(part))
+        
+        return int.from_bytes(h.digest(), "little")
+    
+    def get(self, *key):
+        """
+        New generator for the stream named `key`; every call starts the stream over.
+        """
+        if self._factory is not None:
+            return self._factory(self.derive(*key))
+        
+        return self.stream(_encode_key(key))
+    
+    def stream(self, index):
+        """
+        The CounterRandom of the stream whose key encodes to `index`.
+        """
+        if self._hasher is None:
+            self._hasher = hashlib.blake2b(key=self._key, digest_size=64)
+        
+        return CounterRandom(self._key, index, self._hasher)
+    
+    def get_factory(self):
+        return self._factory
+    
+    def __getstate__(self):
+        # hash objects do not pickle, the hasher is made again on first use
+        state = self.__dict__.copy()
+        state["_hasher"] = None
+        return state
+    
+    def for_market(self, market_name):
+        return MarketStreams(self, market_name)
+    
+
+class MarketStreams(object):
+    """
+    The streams of one market. Keys are prefixed with the market name and the current round, which the market
+    advances at the end of every round.
+    """
+    
+    def __init__(self, streams, market_name, round_num=0):
+        self._streams = streams
+        self._market_name = market_name
+        self._round_num = round_num
+        self._prefix = None
+        self._agents = []
+    
+    def get_round_num(self):
+        return self._round_num
+    
+    def set_round_num(self, round_num):
+        self._round_num = round_num
+    
+    def get(self, *key):
+        streams = self._streams
+        
+        if streams.get_factory() is not None:
+            return streams.get(self._market_name, self._round_num, *key)
+        
+        return streams.stream(self.get_prefix() + _encode_key(key))
+    
+    def get_prefix(self):
+        """
+        The encoded market name and round, which start the keys of all streams of the round.
+        """
+        if self._prefix is None or self._prefix[0] != self._round_num:
+            self._prefix = (self._round_num, _encode_key((self._market_name, self._round_num)))
+        
+        return self._prefix[1]
+    
+    def agent(self, slot):
+        """
+        The AgentStream of agent slot `slot`; agents that take over a slot continue its stream.
+        """
+        while len(self._agents) <= slot:
+            self._agents.append(AgentStream(self, len(self._agents)))
+        
+        return self._agents[slot]
+    
+    def resolution(self, commodity):
+        return self.get("resolve", commodity.get_name())
+    
+
+class AgentStream(object):
+    """
+    Generator of one agent slot, stream ("agent", slot) of the current round. Created lazily, on the first draw
+    of a round, so agents that draw nothing cost nothing. Supports the methods of random.Random.
+    """
+    
+    def __init__(self, streams, slot):
+        self._streams = streams
+        self._slot = slot
+        self._suffix = _encode_key(("agent", slot))
+        self._round_num = None
+        self._random = None
+    
+    def current(self):
+        round_num = self._streams._round_num
+        
+        if self._round_num != round_num:
+            if isinstance(self._random, CounterRandom):
+                # last round's generator is started over on this round's stream instead of making a new one
+                self._random.restart(self._streams.get_prefix() + self._suffix)
+            else:
+                self._random = self._streams.get("agent", self._slot)
+            
+            self._round_num = round_num
+        
+        return self._random
+    
+    def random(self):
+        return self.current().random()
+    
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        
+        return getattr(self.current(), name)
+    
+    def __getstate__(self):
+        # a generator of an earlier round would be started over anyway; only a round in progress needs its state
+        state = self.__dict__.copy()
+        
+        if self._round_num != self._streams._round_num:
+            state["_round_num"] = None
+            state["_random"] = None
+        
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
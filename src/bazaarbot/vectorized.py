@@ -0,0 +1,836 @@
+from builtins import range
+from bazaarbot import MoneyItems
+from bazaarbot.agent import IAgent, CommodityPricingRange, AgentSnapshot
+from bazaarbot.agents import DefaultAgent, AgentSimulation
+from bazaarbot.inventory import Inventory
+from bazaarbot.market import Market, MarketSnapshot, Offer
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    
+
+def population_key(simulation):
+    """
+    The key `simulation` runs under in VectorizedMarket.simulate_agents, or None to run it agent by agent: also
+    for subclasses that override perform below the perform_population they inherit.
+    """
+    for klass in type(simulation).__mro__:
+        if "perform_population" in klass.__dict__:
+            if klass is AgentSimulation:
+                return None
+            
+            key = simulation.get_population_key()
+            return None if key is None else (type(simulation), key)
+        
+        if "perform" in klass.__dict__:
+            return None
+    
+    return None
+    
+
+def reuse_offers(offers, views, slots, units, prices):
+    """
+    Refills the pooled offers of `slots`, which VectorizedMarket hands out again every round instead of making
+    hundreds of thousands of new ones (and having the garbage collector walk them): like the trade book's
+    lists, resolvers and executors must not hold on to them after the round.
+    """
+    result = []
+    append = result.append
+    
+    for slot, offer_units, unit_price in zip(slots.tolist(), units.tolist(), prices.tolist()):
+        offer = offers[slot]
+        offer._agent = views[slot]
+        offer._units = offer_units
+        offer._unit_price = unit_price
+        offer._time_put = 0
+        append(offer)
+    
+    return result
+    
+
+class AgentPopulation(object):
+    """
+    Struct-of-arrays storage for a population of DefaultAgent compatible agents.
+    
+    Every per agent, per commodity value lives in a dense (agent x commodity) array so that a whole round of
+    offers can be computed in bulk. Rows are agent slots, columns are commodity slots.
+    """
+    
+    INITIAL_PRICES = (2.0, 6.0)
+    
+    def __init__(self, goods, capacity=16, observe_window=None):
+        if np is None:
+            raise ImportError("AgentPopulation requires numpy")
+        
+        if observe_window is None:
+            observe_window = DefaultAgent.OBSERVE_WINDOW
+        
+        self._observe_window = observe_window
+        self._size = 0
+        self._capacity = 0
+        self._columns = {}
+        self._goods = []
+        self._space = np.zeros(0)
+        
+        self._names = []
+        self._simulations = []
+        self._randoms = []
+        self._views = []
+        self._group_ids = {}
+        
+        self.group = np.zeros(0, dtype=np.int64)
+        self.money = np.zeros(0)
+        self.money_last = np.zeros(0)
+        self.money_spent = np.zeros(0)
+        self.max_size = np.zeros(0)
+        
+        self.amount = np.zeros((0, 0))
+        self.cost = np.zeros((0, 0))
+        self.held = np.zeros((0, 0), dtype=bool)
+        self.ideal = np.zeros((0, 0))
+        self.expecting = np.zeros((0, 0))
+        self.expecting_cost = np.zeros((0, 0))
+        self.has_expecting = np.zeros((0, 0), dtype=bool)
+        
+        self.observed_min = np.zeros((0, 0))
+        self.observed_max = np.zeros((0, 0))
+        self.observed_count = np.zeros((0, 0), dtype=np.int64)
+        self.has_history = np.zeros((0, 0), dtype=bool)
+        
+        self._reserve(capacity, len(goods))
+        
+        for good in goods:
+            self.column(good)
+    
+    def _reserve(self, rows, cols):
+        rows = max(rows, self._capacity)
+        cols = max(cols, self._space.shape[0])
+        
+        if rows == self._capacity and cols == self._space.shape[0]:
+            return
+        
+        def grow1(a):
+            result = np.zeros(rows, dtype=a.dtype)
+            result[:a.shape[0]] = a
+            return result
+        
+        def grow2(a):
+            result = np.zeros((rows, cols), dtype=a.dtype)
+            result[:a.shape[0], :a.shape[1]] = a
+            return result
+        
+        for name in ("group", "money", "money_last", "money_spent", "max_size"):
+            setattr(self, name, grow1(getattr(self, name)))
+        
+        for name in ("amount", "cost", "held", "ideal", "expecting", "expecting_cost", "has_expecting",
+                     "observed_min", "observed_max", "observed_count", "has_history"):
+            setattr(self, name, grow2(getattr(self, name)))
+        
+        space = np.zeros(cols)
+        space[:self._space.shape[0]] = self._space
+        self._space = space
+        self._capacity = rows
+    
+    def column(self, commodity):
+        if commodity in self._columns:
+            return self._columns[commodity]
+        
+        col = len(self._goods)
+        
+        if col >= self._space.shape[0]:
+            self._reserve(self._capacity, max(2 * col, 1))
+        
+        self._columns[commodity] = col
+        self._goods.append(commodity)
+        self._space[col] = commodity.get_space()
+        return col
+    
+    def get_goods(self):
+        return self._goods
+    
+    def get_size(self):
+        return self._size
+    
+    def get_view(self, slot):
+        return self._views[slot]
+    
+    def get_views(self):
+        return self._views
+    
+    def get_used_space(self):
+        return self.amount[:self._size].dot(self._space)
+    
+    def freeze(self):
+        """
+        Detached copy of the first get_size() slots, without simulations or views; enough to build snapshots.
+        """
+        n = self._size
+        frozen = AgentPopulation.__new__(AgentPopulation)
+        frozen._observe_window = self._observe_window
+        frozen._size = n
+        frozen._capacity = n
+        frozen._columns = dict(self._columns)
+        frozen._goods = list(self._goods)
+        frozen._space = self._space.copy()
+        frozen._names = self._names[:n]
+        frozen._simulations = [None] * n
+        frozen._randoms = [None] * n
+        frozen._views = [None] * n
+        frozen._group_ids = {}
+        frozen.group = np.full(n, -1, dtype=np.int64)
+        
+        for name in ("money", "money_last", "money_spent", "max_size", "amount", "cost", "held", "ideal",
+                     "expecting", "expecting_cost", "has_expecting", "observed_min", "observed_max",
+                     "observed_count", "has_history"):
+            setattr(frozen, name, getattr(self, name)[:n].copy())
+            
+        return frozen
+    
+    def append(self, agent):
+        slot = self._size
+        
+        if slot >= self._capacity:
+            self._reserve(max(2 * self._capacity, 16), 0)
+        
+        self._size += 1
+        self._names.append(None)
+        self._simulations.append(None)
+        self._randoms.append(None)
+        self._views.append(None)
+        self.load(slot, agent)
+        return self._views[slot]
+    
+    def load(self, slot, agent):
+        if not isinstance(agent, DefaultAgent):
+            raise TypeError("AgentPopulation can only hold DefaultAgent instances, got " + str(type(agent)))
+        
+        inventory = agent._inventory
+        
+        self._names[slot] = agent._agent_name
+        self._simulations[slot] = agent._agent_simulation
+        self._randoms[slot] = agent._random
+        key = population_key(agent._agent_simulation)
+        self.group[slot] = -1 if key is None else self._group_ids.setdefault(key, len(self._group_ids))
+        self.money[slot] = agent._money_available
+        self.money_last[slot] = agent._money_last_simulation
+        self.money_spent[slot] = agent._money_spent
+        self.max_size[slot] = inventory.get_max_size()
+        
+        for name in ("amount", "cost", "held", "ideal", "expecting", "expecting_cost", "has_expecting",
+                     "observed_min", "observed_max", "observed_count", "has_history"):
+            getattr(self, name)[slot] = 0
+            
+        for good, entry in inventory.get_stuff().items():
+            col = self.column(good)
+            self.amount[slot, col] = entry.get_amount()
+            self.cost[slot, col] = entry.get_original_price()
+            self.held[slot, col] = True
+            
+        for good, amount in inventory.get_ideal().items():
+            self.ideal[slot, self.column(good)] = amount
+            
+        for good, entry in inventory.get_expecting().items():
+            col = self.column(good)
+            self.expecting[slot, col] = entry.get_amount()
+            self.expecting_cost[slot, col] = entry.get_original_price()
+            self.has_expecting[slot, col] = True
+            
+        for good, cph in agent._commodity_pricing_histories.items():
+            col = self.column(good)
+            self.has_history[slot, col] = True
+            
+            for price in cph._observed[:self._observe_window]:
+                self.observe(slot, col, price)
+                
+        view = PopulationAgent(self, slot)
+        old = self._views[slot]
+        
+        if old is not None:
+            old._population = None
+        
+        self._views[slot] = view
+        return view
+    
+    def observe(self, slot, col, price):
+        count = self.observed_count[slot, col]
+        
+        if count >= self._observe_window:
+            return
+        
+        if count == 0:
+            self.observed_min[slot, col] = price
+            self.observed_max[slot, col] = price
+        else:
+            self.observed_min[slot, col] = min(self.observed_min[slot, col], price)
+            self.observed_max[slot, col] = max(self.observed_max[slot, col], price)
+        
+        self.observed_count[slot, col] = count + 1
+    
+    def start_history(self, slot, col):
+        if not self.has_history[slot, col]:
+            self.has_history[slot, col] = True
+            
+            for price in AgentPopulation.INITIAL_PRICES:
+                self.observe(slot, col, price)
+    
+    def change(self, slot, col, amount, unit_cost):
+        if not self.held[slot, col]:
+            return 0.0
+        
+        current = self.amount[slot, col]
+        price = self.cost[slot, col]
+        
+        if unit_cost > 0:
+            if current <= 0:
+                result_amount = amount
+                result_price = unit_cost
+            else:
+                result_amount = current + amount
+                result_price = (current * price + amount * unit_cost) / (current + amount)
+        else:
+            result_amount = current + amount
+            result_price = price
+        
+        self.amount[slot, col] = result_amount
+        self.cost[slot, col] = result_price
+        return float(result_price)
+    
+    def change_expecting(self, slot, col, delta, unit_cost):
+        if self.has_expecting[slot, col]:
+            current = self.expecting[slot, col]
+            price = self.expecting_cost[slot, col]
+            
+            if unit_cost > 0:
+                if current <= 0:
+                    result_amount = delta
+                    result_price = unit_cost
+                else:
+                    result_amount = current + delta
+                    result_price = (current * price + delta * unit_cost) / (current + delta)
+            else:
+                result_amount = current + delta
+                result_price = price
+        else:
+            result_amount = delta
+            result_price = unit_cost
+        
+        if result_amount < 0:
+            result_amount = 0.0
+            result_price = 0.0
+        
+        self.expecting[slot, col] = result_amount
+        self.expecting_cost[slot, col] = result_price
+        self.has_expecting[slot, col] = True
+        return float(result_price)
+    
+    def observe_slots(self, slots, col, price):
+        """
+        observe for every agent in `slots` (an index array) at once.
+        """
+        count = self.observed_count[slots, col]
+        open_slots = count < self._observe_window
+        slots = slots[open_slots]
+        count = count[open_slots]
+        first = count == 0
+        
+        self.observed_min[slots, col] = np.where(first, price, np.minimum(self.observed_min[slots, col], price))
+        self.observed_max[slots, col] = np.where(first, price, np.maximum(self.observed_max[slots, col], price))
+        self.observed_count[slots, col] = count + 1
+    
+    def start_histories(self, slots, col):
+        slots = slots[~self.has_history[slots, col]]
+        self.has_history[slots, col] = True
+        
+        for price in AgentPopulation.INITIAL_PRICES:
+            self.observe_slots(slots, col, price)
+    
+    def query_inventory(self, slots, commodity):
+        """
+        The bulk counterparts of the PopulationAgent methods, for AgentSimulation.perform_population: each
+        takes an index array of agent slots, and amounts and money values either as numbers or as arrays
+        matching the slots.
+        """
+        col = self.column(commodity)
+        return np.where(self.held[slots, col], self.amount[slots, col], 0.0)
+    
+    def add_inventory_item(self, slots, good, amount):
+        col = self.column(good)
+        amount = np.broadcast_to(np.asarray(amount, dtype=float), slots.shape)
+        
+        self.start_histories(slots, col)
+        
+        added = amount >= 0
+        slots = slots[added]
+        amount = amount[added]
+        spent = self.money_spent[slots]
+        
+        self.amount[slots, col] = amount
+        self.cost[slots, col] = np.where(spent >= 1, spent, 1.0) / amount
+        self.held[slots, col] = True
+    
+    def consume_inventory_item(self, slots, commodity, amount):
+        amount = np.broadcast_to(np.asarray(amount, dtype=float), slots.shape)
+        
+        if commodity.get_commodity_id() == MoneyItems.MONEY_AVAILABLE_ID:
+            self.money[slots] += amount
+            spent = amount < 0
+            self.money_spent[slots[spent]] += -amount[spent]
+        else:
+            col = self.column(commodity)
+            held = self.held[slots, col]
+            slots = slots[held]
+            amount = amount[held]
+            
+            self.amount[slots, col] += amount
+            spent = amount < 0
+            slots = slots[spent]
+            self.money_spent[slots] += -amount[spent] * self.cost[slots, col]
+    
+    def get_money_available(self, slots):
+        return self.money[slots]
+    
+    def set_money_available(self, slots, money):
+        self.money[slots] = money
+    
+    def to_inventory(self, slot):
+        inventory = Inventory()
+        inventory.set_max_size(float(self.max_size[slot]))
+        
+        for col in range(len(self._goods)):
+            good = self._goods[col]
+            
+            if self.held[slot, col]:
+                inventory.add(good, float(self.amount[slot, col]), float(self.cost[slot, col]))
+                
+            if self.ideal[slot, col] != 0:
+                inventory.set_ideal(good, float(self.ideal[slot, col]))
+                
+            if self.has_expecting[slot, col]:
+                inventory.set_expecting(good, float(self.expecting[slot, col]), float(self.expecting_cost[slot, col]))
+                
+        return inventory
+    
+    def compute_offers(self, goods, average_prices):
+        """
+        Computes the DefaultAgent offer for every (agent, good) pair at once.
+        
+        Returns (is_ask, quantity, unit_price) arrays of shape (agents, goods); a quantity of 0 means no offer.
+        """
+        n = self._size
+        cols = [self._columns[g] for g in goods]
+        
+        amount = self.amount[:n, cols]
+        ideal = self.ideal[:n, cols]
+        held = self.held[:n, cols]
+        average_prices = np.asarray(average_prices, dtype=float)
+        
+        surplus = np.where(amount > ideal, amount - ideal, 0.0)
+        is_ask = surplus >= 1
+        
+        total = amount + self.expecting[:n, cols]
+        shortage = np.where(held & (total < ideal), ideal - total, 0.0)
+        space = (self.max_size[:n] - self.get_used_space())[:, None]
+        limit = np.where((shortage > 0) & (space > 0), shortage, space)
+        
+        observed_min = self.observed_min[:n, cols]
+        working_max = self.observed_max[:n, cols] - observed_min
+        
+        with np.errstate(divide="ignore", invalid="ignore"):
+            position = np.clip((average_prices - observed_min) / working_max, 0.0, 1.0)
+        
+        favorability = np.where(self.has_history[:n, cols], position, 1.0)
+        
+        to_sell = np.round(favorability * surplus)
+        to_sell[to_sell < 1] = 1.0
+        to_buy = np.round(favorability * shortage)
+        to_buy[to_buy < 1] = 1.0
+        
+        unpriced = average_prices <= 0
+        to_sell[:, unpriced] = 0.0
+        to_buy[:, unpriced] = 0.0
+        
+        quantity = np.where(is_ask, np.where(to_sell > 1, to_sell, 1.0), np.where(to_buy > limit, to_buy, limit))
+        unit_price = self.expecting_cost[:n, cols] * DefaultAgent.ASK_PRICE_INFLATION
+        
+        return is_ask, quantity, unit_price
+    
+
+class PopulationAgent(IAgent):
+    """
+    Lightweight IAgent view of one slot of an AgentPopulation. Behaves exactly like the DefaultAgent it was
+    loaded from.
+    """
+    
+    def __init__(self, population, slot):
+        self._population = population
+        self._slot = slot
+    
+    def get_slot(self):
+        return self._slot
+    
+    def observe_trading_range(self, commodity, window):
+        p = self._population
+        col = p.column(commodity)
+        
+        if not p.has_history[self._slot, col]:
+            return None
+        
+        return CommodityPricingRange(commodity, float(p.observed_min[self._slot, col]),
+                                     float(p.observed_max[self._slot, col]))
+    
+    def simulate(self, market):
+        p = self._population
+        p.money_last[self._slot] = p.money[self._slot]
+        p._simulations[self._slot].perform(self, market)
+    
+    def determine_sale_quantity(self, observe_window, average_historical_price, commodity):
+        if average_historical_price <= 0:
+            return 0.0
+        
+        p = self._population
+        col = p.column(commodity)
+        trading_range = self.observe_trading_range(commodity, observe_window)
+        favorability = trading_range.position_in_range(average_historical_price) if trading_range is not None else 1.0
+        
+        amount_to_sell = round(favorability * max(float(p.amount[self._slot, col] - p.ideal[self._slot, col]), 0.0))
+        
+        if amount_to_sell < 1:
+            amount_to_sell = 1.0
+        
+        return amount_to_sell
+    
+    def determine_purchase_quantity(self, observe_window, average_historical_price, commodity):
+        if average_historical_price <= 0:
+            return 0.0
+        
+        trading_range = self.observe_trading_range(commodity, observe_window)
+        favorability = trading_range.position_in_range(average_historical_price) if trading_range is not None else 1.0
+        
+        amount_to_buy = round(favorability * self._shortage(self._population.column(commodity)))
+        
+        if amount_to_buy < 1:
+            amount_to_buy = 1.0
+        
+        return amount_to_buy
+    
+    def _shortage(self, col):
+        p = self._population
+        
+        if not p.held[self._slot, col]:
+            return 0.0
+        
+        amount = float(p.amount[self._slot, col] + p.expecting[self._slot, col])
+        ideal = float(p.ideal[self._slot, col])
+        return ideal - amount if amount < ideal else 0.0
+    
+    def _query_cost(self, col):
+        return float(self._population.expecting_cost[self._slot, col])
+    
+    def create_bid(self, market, commodity, limit):
+        ideal = self.determine_purchase_quantity(DefaultAgent.OBSERVE_WINDOW,
+                                                 market.get_average_historical_price(commodity, DefaultAgent.DEFAULT_LOOKBACK), commodity)
+        
+        quantity_to_buy = ideal if ideal > limit else limit
+        bid_price = self._query_cost(self._population.column(commodity)) * DefaultAgent.ASK_PRICE_INFLATION
+        
+        if quantity_to_buy > 0:
+            return Offer(self, commodity, quantity_to_buy, bid_price)
+        return None
+    
+    def create_ask(self, market, commodity, limit):
+        ideal = self.determine_sale_quantity(DefaultAgent.OBSERVE_WINDOW,
+                                             market.get_average_historical_price(commodity, DefaultAgent.DEFAULT_LOOKBACK), commodity)
+        
+        quantity_to_sell = ideal if ideal > limit else limit
+        ask_price = self._query_cost(self._population.column(commodity)) * DefaultAgent.ASK_PRICE_INFLATION
+        
+        if quantity_to_sell > 0:
+            return Offer(self, commodity, quantity_to_sell, ask_price)
+        return None
+    
+    def generate_offers(self, market, commodity):
+        p = self._population
+        col = p.column(commodity)
+        surplus = float(p.amount[self._slot, col] - p.ideal[self._slot, col])
+        
+        if surplus >= 1:
+            offer = self.create_ask(market, commodity, 1)
+            if offer is not None:
+                market.ask(offer)
+        else:
+            shortage = self._shortage(col)
+            space = float(p.max_size[self._slot] - p.amount[self._slot].dot(p._space))
+            
+            if shortage > 0 and space > 0:
+                offer = self.create_bid(market, commodity, shortage)
+            else:
+                offer = self.create_bid(market, commodity, space)
+            
+            if offer is not None:
+                market.bid(offer)
+    
+    def update_price_model(self, act, commodity, success, unit_price):
+        if success:
+            p = self._population
+            col = p.column(commodity)
+            
+            if p.has_history[self._slot, col]:
+                p.observe(self._slot, col, unit_price)
+    
+    def add_inventory_item(self, good, amount):
+        p = self._population
+        col = p.column(good)
+        spent = p.money_spent[self._slot]
+        
+        p.start_history(self._slot, col)
+        
+        if amount < 0:
+            return
+        
+        p.amount[self._slot, col] = amount
+        p.cost[self._slot, col] = (float(spent) if spent >= 1 else 1.0) / amount
+        p.held[self._slot, col] = True
+    
+    def query_inventory(self, commodity):
+        p = self._population
+        col = p.column(commodity)
+        return float(p.amount[self._slot, col]) if p.held[self._slot, col] else 0.0
+    
+    def produce_inventory(self, good, delta):
+        p = self._population
+        
+        if p.money_spent[self._slot] < 1:
+            p.money_spent[self._slot] = 1.0
+        
+        p.change(self._slot, p.column(good), delta, p.money_spent[self._slot] / delta)
+        p.money_spent[self._slot] = 0.0
+    
+    def consume_inventory_item(self, commodity, amount):
+        p = self._population
+        
+        if commodity.get_commodity_id() == MoneyItems.MONEY_AVAILABLE_ID:
+            p.money[self._slot] += amount
+            if amount < 0:
+                p.money_spent[self._slot] += -amount
+        else:
+            price = p.change(self._slot, p.column(commodity), amount, 0.0)
+            if amount < 0:
+                p.money_spent[self._slot] += (-amount) * price
+    
+    def change_inventory(self, commodity, amount, unit_cost):
+        p = self._population
+        
+        if commodity.get_commodity_id() == MoneyItems.MONEY_ID:
+            p.money[self._slot] += amount
+        else:
+            p.change(self._slot, p.column(commodity), amount, unit_cost)
+    
+    def change_expecting(self, commodity, delta, unit_cost):
+        p = self._population
+        return p.change_expecting(self._slot, p.column(commodity), delta, unit_cost)
+    
+    def get_snapshot(self):
+        return AgentSnapshot(self.get_agent_name(), self.get_money_available(),
+                             self._population.to_inventory(self._slot))
+    
+    def is_inventory_full(self):
+        p = self._population
+        used = p.amount[self._slot].dot(p._space)
+        return p.max_size[self._slot] - used == 0
+    
+    def get_last_simulate_profit(self):
+        p = self._population
+        return float(p.money[self._slot] - p.money_last[self._slot])
+    
+    def get_money_available(self):
+        return float(self._population.money[self._slot])
+    
+    def set_money_available(self, value):
+        self._population.money[self._slot] = value
+    
+    def get_agent_name(self):
+        return self._population._names[self._slot]
+    
+    def bind_random(self, rnd):
+        self._population._randoms[self._slot] = rnd
+        
+    def get_random(self):
+        return self._population._randoms[self._slot]
+    
+    def __str__(self):
+        return self.get_agent_name()
+    
+
+class PopulationSnapshot(MarketSnapshot):
+    """
+    Snapshot of a VectorizedMarket over a frozen copy of its population; AgentSnapshots are built on first use.
+    """
+    
+    def __init__(self, history, population):
+        MarketSnapshot.__init__(self, history, None)
+        self._population = population
+        
+    def get_agents(self):
+        if self._agents is None:
+            p = self._population
+            self._agents = [AgentSnapshot(p._names[slot], float(p.money[slot]), p.to_inventory(slot))
+                            for slot in range(p.get_size())]
+        return self._agents
+    
+    def get_agent_count(self):
+        return self._population.get_size()
+    
+
+class VectorizedMarket(Market):
+    """
+    Drop-in Market for populations of DefaultAgent instances.
+    
+    Agents passed in through MarketData or replace_agent are absorbed into an AgentPopulation and replaced by
+    PopulationAgent views; offers for all agents and all goods are then computed in bulk each round. For the
+    same seed the results are identical to Market driving the original DefaultAgent instances.
+    """
+    
+    def from_data(self, data, market_init):
+        self._population = AgentPopulation(data.goods, capacity=max(len(data.agents), 16))
+        self._offer_pool = {}
+        
+        Market.from_data(self, data, market_init)
+        
+        self._agents = [self._population.append(agent) for agent in self._agents]
+        self._class_array = np.array(self._agent_classes, dtype=np.int64)
+        self._index_agents()
+    
+    def get_population(self):
+        return self._population
+    
+    def __getstate__(self):
+        # the pooled offers are refilled every round, checkpoints and worker processes start without them
+        state = Market.__getstate__(self)
+        state["_offer_pool"] = {}
+        return state
+    
+    def get_snapshot(self, copy_on_write=False):
+        if not copy_on_write:
+            return Market.get_snapshot(self, False)
+        
+        # the population is rewritten in bulk every round, so it is copied column by column up front
+        return PopulationSnapshot(self._history.freeze(), self._population.freeze())
+    
+    def replace_agent(self, old_agent, new_agent):
+        slot = self._agent_slots.pop(old_agent, None)
+        
+        if slot is None:
+            raise ValueError(str(old_agent) + " is not an agent of market " + self._name)
+        
+        self._agents[slot] = self._population.load(slot, new_agent)
+        self._agent_slots[self._agents[slot]] = slot
+        self._assign_agent_class(slot, self._agents[slot].get_agent_name())
+        
+        if self._random_streams is not None:
+            self._agents[slot].bind_random(self._random_streams.agent(slot))
+        
+    def _watch_agent(self, agent):
+        # handle_bankruptcies scans the money column instead
+        pass
+    
+    def enable_lazy_offers(self, sparse=False):
+        """
+        Does nothing: the offers of all agents are computed in bulk every round, which already costs less than
+        reusing them agent by agent. Sparse offers change which offers are made and are refused.
+        """
+        if sparse:
+            raise ValueError("VectorizedMarket makes offers for every good, sparse offers are not supported")
+    
+    def enable_continuous(self, lifetime=1):
+        raise ValueError("VectorizedMarket posts the offers of all agents in bulk, it cannot trade continuously")
+    
+    def _assign_agent_class(self, i, class_name):
+        class_id = Market._assign_agent_class(self, i, class_name)
+        
+        if hasattr(self, "_class_array"):
+            self._class_array[i] = class_id
+            
+        return class_id
+    
+    def record_profit(self):
+        p = self._population
+        n = p.get_size()
+        totals = np.bincount(self._class_array[:n], weights=p.money[:n] - p.money_last[:n],
+                             minlength=len(self._class_names))
+        self._add_class_profits(totals.tolist())
+    
+    def simulate_agents(self):
+        p = self._population
+        n = p.get_size()
+        simulations = p._simulations
+        views = p._views
+        group = p.group[:n]
+        
+        p.money_last[:n] = p.money[:n]
+        
+        # agents only change themselves, and bulk simulations draw no random numbers, so the agents that run one
+        # by one still see the same generators in the same order
+        for slot in np.flatnonzero(group < 0).tolist():
+            simulations[slot].perform(views[slot], self)
+        
+        for gid in np.flatnonzero(np.bincount(group[group >= 0])).tolist():
+            slots = np.flatnonzero(group == gid)
+            simulations[slots[0]].perform_population(p, slots, self)
+    
+    def generate_offers(self):
+        p = self._population
+        views = p.get_views()
+        goods = self._good_types
+        
+        if p.get_size() == 0 or len(goods) == 0:
+            return
+        
+        averages = [self.get_average_historical_price(g, DefaultAgent.DEFAULT_LOOKBACK) for g in goods]
+        is_ask, quantity, unit_price = p.compute_offers(goods, averages)
+        has_offer = quantity > 0
+        
+        # the trade book is keyed in the order the serial market would first touch each good
+        first = np.where(has_offer.any(axis=0), has_offer.argmax(axis=0), p.get_size())
+        order = sorted(range(len(goods)), key=lambda i: (first[i], i))
+        
+        book = self._trade_book
+        
+        for i in order:
+            if first[i] == p.get_size():
+                continue
+            
+            good = goods[i]
+            ask_slots = np.flatnonzero(has_offer[:, i] & is_ask[:, i])
+            bid_slots = np.flatnonzero(has_offer[:, i] & ~is_ask[:, i])
+            
+            offers = self._pooled_offers(good, p.get_size())
+            
+            book.extend(good, reuse_offers(offers, views, ask_slots, quantity[ask_slots, i], unit_price[ask_slots, i]),
+                        reuse_offers(offers, views, bid_slots, quantity[bid_slots, i], unit_price[bid_slots, i]))
+    
+    def _pooled_offers(self, good, count):
+        offers = self._offer_pool.get(good)
+        
+        if offers is None:
+            offers = self._offer_pool[good] = []
+        
+        while len(offers) < count:
+            offers.append(Offer(None, good, 0.0, 0.0))
+        
+        return offers
+    
+    def handle_bankruptcies(self):
+        p = self._population
+        todel = [self._agents[slot] for slot in np.flatnonzero(p.money[:p.get_size()] <= 0).tolist()]
+        
+        if len(todel) == 0:
+            return 0
+        
+        if self._exporter is not None:
+            for agent in todel:
+                self._exporter.bankrupt(self, agent)
+        
+        self._signal_bankrupt.signal_bankrupt_batch(self, todel)
+        return len(todel)
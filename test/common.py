@@ -0,0 +1,65 @@
+import random
+from bazaarbot import Economy
+from bazaarbot.market import Market, MarketInitConfig, DefaultOfferResolver, DefaultOfferExecutor
+from simple import SimpleEconomy, FarmerAgentFactory, WoodcutterAgentFactory
+
+
+class SampleEconomy(SimpleEconomy):
+    """
+    SimpleEconomy with `extra` more farmers and woodcutters and a choice of market, resolver and executor.
+    Bankrupt agents are replaced by farmers and woodcutters in turn, so longer runs go through many
+    replacements.
+    """
+    
+    FARMER_FACTORY = FarmerAgentFactory
+    WOODCUTTER_FACTORY = WoodcutterAgentFactory
+    
+    def __init__(self, seed=1, extra=0, market_class=Market, resolver_class=DefaultOfferResolver, executor=None,
+                 history=None):
+        Economy.__init__(self)
+        
+        rng = random.Random(seed)
+        
+        self.rng = rng
+        self.bankruptcies = 0
+        self.farmer_factory = self.FARMER_FACTORY(rng)
+        self.woodcutter_factory = self.WOODCUTTER_FACTORY(rng)
+        self._extra = extra
+        
+        if executor is None:
+            executor = DefaultOfferExecutor()
+        
+        market = market_class("market", self.get_market_data(), self, resolver_class(rng), executor,
+                              MarketInitConfig(), rng, history)
+        self.add_market(market)
+    
+    def get_market_data(self):
+        data = SimpleEconomy.get_market_data(self)
+        
+        for _ in range(self._extra):
+            data.agents.append(self.farmer_factory.create())
+            data.agents.append(self.woodcutter_factory.create())
+        
+        return data
+    
+    def signal_bankrupt(self, market, agent):
+        self.bankruptcies += 1
+        market.replace_agent(agent, self.instatiate_agent("farmer" if self.bankruptcies % 2 else "woodcutter"))
+    
+
+def market_state(market):
+    """
+    Everything a run leaves behind in `market`: its history and the money and goods of every agent.
+    """
+    history = market.get_snapshot().get_history()
+    state = []
+    
+    for log in (history.get_prices(), history.get_asks(), history.get_bids(), history.get_trades(),
+                history.get_profit()):
+        state.append(sorted((str(key), list(values)) for key, values in log.get_subjects()))
+    
+    for agent in market.get_agents():
+        state.append((agent.get_agent_name(), agent.get_money_available(),
+                      [agent.query_inventory(good) for good in market.get_good_types()]))
+    
+    return state
@@ -0,0 +1,88 @@
+import random
+import unittest
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.agents import DefaultAgent
+from bazaarbot.auction import CallAuctionOfferResolver
+from bazaarbot.inventory import InventoryData
+from bazaarbot.market import DefaultOfferExecutor, Offer
+from common import SampleEconomy, market_state
+
+GOOD = SimpleCommodity("auctioned", 1.0)
+
+
+class CountingOfferExecutor(DefaultOfferExecutor):
+    
+    def __init__(self):
+        self.transfers = []
+    
+    def transfer_good(self, good, units, seller, buyer, clearing_price):
+        self.transfers.append((seller.get_agent_name(), buyer.get_agent_name(), units, clearing_price))
+        DefaultOfferExecutor.transfer_good(self, good, units, seller, buyer, clearing_price)
+    
+
+class CallAuctionTest(unittest.TestCase):
+    
+    def book(self):
+        """
+        Bids for 2 units each at 5, 4, 3 and 1 against asks at 1, 2, 3 and 6 for 3, 1, 2 and 5 units: 6 units
+        clear at 3, nothing else trades at that volume.
+        """
+        agents = {}
+        
+        def offer(name, units, price):
+            agents[name] = DefaultAgent(name, None, InventoryData(100, {}, {GOOD: 10.0}), 100.0)
+            return Offer(agents[name], GOOD, units, price)
+        
+        bids = [offer("b1", 2.0, 1.0), offer("b5", 2.0, 5.0), offer("b3", 2.0, 3.0), offer("b4", 2.0, 4.0)]
+        asks = [offer("a6", 5.0, 6.0), offer("a2", 1.0, 2.0), offer("a1", 3.0, 1.0), offer("a3", 2.0, 3.0)]
+        return agents, bids, asks
+    
+    def test_clears_hand_built_book(self):
+        agents, bids, asks = self.book()
+        result = CallAuctionOfferResolver(random.Random(1)).resolve_offer_set(DefaultOfferExecutor(), bids, asks)
+        
+        self.assertEqual(result.get_unit_price(), 3.0)
+        self.assertEqual(result.get_units_traded(), 6.0)
+        self.assertEqual(result.get_money_traded(), 18.0)
+        self.assertEqual([r.get_units_traded() for r in result.get_resolved_offers()], [2.0, 1.0, 1.0, 2.0])
+        
+        held = dict((name, agent.query_inventory(GOOD)) for name, agent in agents.items())
+        money = dict((name, agent.get_money_available()) for name, agent in agents.items())
+        
+        self.assertEqual(held, {"b5": 12.0, "b4": 12.0, "b3": 12.0, "b1": 10.0,
+                                "a1": 7.0, "a2": 9.0, "a3": 8.0, "a6": 10.0})
+        self.assertEqual(money, {"b5": 94.0, "b4": 94.0, "b3": 94.0, "b1": 100.0,
+                                 "a1": 109.0, "a2": 103.0, "a3": 106.0, "a6": 100.0})
+    
+    def test_clearing_price_without_crossing_offers(self):
+        agents, bids, asks = self.book()
+        result = CallAuctionOfferResolver(random.Random(1)).resolve_offer_set(DefaultOfferExecutor(), bids[:1],
+                                                                              asks[:1])
+        
+        self.assertEqual(result.get_units_traded(), 0)
+        self.assertEqual(agents["b1"].get_money_available(), 100.0)
+        self.assertEqual(agents["a6"].query_inventory(GOOD), 10.0)
+    
+    def test_executor_hooks_see_every_pair(self):
+        agents, bids, asks = self.book()
+        executor = CountingOfferExecutor()
+        CallAuctionOfferResolver(random.Random(1)).resolve_offer_set(executor, bids, asks)
+        
+        self.assertEqual(executor.transfers, [("a1", "b5", 2.0, 3.0), ("a1", "b4", 1.0, 3.0),
+                                              ("a2", "b4", 1.0, 3.0), ("a3", "b3", 2.0, 3.0)])
+        self.assertEqual(agents["b4"].get_money_available(), 94.0)
+        self.assertEqual(agents["a1"].query_inventory(GOOD), 7.0)
+    
+    def test_bulk_and_pairwise_settlement_agree(self):
+        bulk = SampleEconomy(3, 20, resolver_class=CallAuctionOfferResolver)
+        executor = CountingOfferExecutor()
+        pairwise = SampleEconomy(3, 20, resolver_class=CallAuctionOfferResolver, executor=executor)
+        bulk.simulate(60)
+        pairwise.simulate(60)
+        
+        self.assertEqual(market_state(pairwise.get_market("market")), market_state(bulk.get_market("market")))
+        self.assertGreater(len(executor.transfers), 0)
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from bazaarbot import ISignalBankrupt
+from bazaarbot.agents import DefaultAgent
+from bazaarbot.market import Market, MarketInitConfig, DefaultOfferResolver, DefaultOfferExecutor
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+
+
+class ScanningMarket(Market):
+    """
+    Market checking the money of every agent after every round, as the market did before the watch set.
+    """
+    
+    def handle_bankruptcies(self):
+        todel = [agent for agent in self.get_agents() if agent.get_money_available() <= 0]
+        
+        for agent in todel:
+            self._signal_bankrupt.signal_bankrupt(self, agent)
+        
+        return len(todel)
+    
+
+class BatchEconomy(SampleEconomy):
+    """
+    SampleEconomy replacing the bankrupt agents of a round with one replace_agents call.
+    """
+    
+    def signal_bankrupt_batch(self, market, agents):
+        classes = ["farmer" if (self.bankruptcies + i) % 2 else "woodcutter" for i in range(1, len(agents) + 1)]
+        farmers = self.farmer_factory.create_many(classes.count("farmer"))
+        woodcutters = self.woodcutter_factory.create_many(classes.count("woodcutter"))
+        self.bankruptcies += len(agents)
+        market.replace_agents(agents, [farmers.pop(0) if c == "farmer" else woodcutters.pop(0) for c in classes])
+    
+
+class UnwatchedAgent(DefaultAgent):
+    """
+    Agent that does not report its bankruptcy, so the market polls it.
+    """
+    
+    def bind_bankruptcy_watch(self, watch):
+        return False
+    
+
+class BankruptcyRecorder(ISignalBankrupt):
+    
+    def __init__(self):
+        self.signals = []
+    
+    def signal_bankrupt(self, market, agent):
+        self.signals.append((market.get_round_num(), market.get_agent_slot(agent)))
+    
+
+def recorded_market(market_class, unwatched):
+    source = SampleEconomy(17, 10)
+    data = source.get_market_data()
+    
+    if unwatched:
+        for agent in data.agents[::2]:
+            agent.__class__ = UnwatchedAgent
+    
+    recorder = BankruptcyRecorder()
+    market = market_class("market", data, recorder, DefaultOfferResolver(source.rng), DefaultOfferExecutor(),
+                          MarketInitConfig(), source.rng)
+    return market, recorder
+    
+
+class BankruptcyTest(unittest.TestCase):
+    
+    def test_watch_set_matches_scanning_all_agents(self):
+        expected = SampleEconomy(16, 12, market_class=ScanningMarket)
+        expected.simulate(150)
+        self.assertGreater(expected.bankruptcies, 10)
+        
+        for economy_class in (SampleEconomy, BatchEconomy):
+            for market_class in (Market, VectorizedMarket):
+                economy = economy_class(16, 12, market_class=market_class)
+                economy.simulate(150)
+                
+                self.assertEqual(market_state(economy.get_market("market")), market_state(expected.get_market("market")))
+                self.assertEqual(economy.bankruptcies, expected.bankruptcies)
+    
+    def test_agents_left_in_place_are_reported_every_round(self):
+        for unwatched in (False, True):
+            expected, recorder = recorded_market(ScanningMarket, unwatched)
+            expected.simulate(60)
+            signals = recorder.signals
+            self.assertGreater(len(set(slot for _, slot in signals)), 1)
+            self.assertGreater(len(signals), len(set(slot for _, slot in signals)))
+            
+            for market_class in (Market, VectorizedMarket):
+                market, recorder = recorded_market(market_class, unwatched)
+                market.simulate(60)
+                self.assertEqual(recorder.signals, signals)
+    
+    def test_agent_slots(self):
+        economy = SampleEconomy(18, 3)
+        market = economy.get_market("market")
+        agents = list(market.get_agents())
+        new_agents = [economy.instatiate_agent("farmer") for _ in range(2)]
+        
+        self.assertEqual([market.get_agent_slot(agent) for agent in agents], list(range(len(agents))))
+        
+        market.replace_agents([agents[4], agents[1]], new_agents)
+        self.assertEqual(market.get_agents()[4], new_agents[0])
+        self.assertEqual(market.get_agents()[1], new_agents[1])
+        self.assertEqual(market.get_agent_slot(new_agents[0]), 4)
+        self.assertIsNone(market.get_agent_slot(agents[4]))
+        self.assertRaises(ValueError, market.replace_agent, agents[4], economy.instatiate_agent("farmer"))
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+from bazaarbot.agents import DefaultAgent
+from bazaarbot.batch import IScenario, BatchRunner, parameter_grid, percentile, point_key, run_scenario
+from common import SampleEconomy
+from simple import GOOD_crops, GOOD_wood
+
+
+class SampleScenario(IScenario):
+    
+    def build(self, seed, params):
+        return SampleEconomy(seed, params.get("extra", 5))
+    
+
+class ProbeScenario(SampleScenario):
+    """
+    SampleScenario remembering the DefaultAgent parameters every economy was built with.
+    """
+    
+    def __init__(self):
+        self.seen = []
+    
+    def build(self, seed, params):
+        self.seen.append((DefaultAgent.ASK_PRICE_INFLATION, DefaultAgent.OBSERVE_WINDOW))
+        return SampleScenario.build(self, seed, params)
+    
+
+def summary_state(summary):
+    market = "market"
+    return (summary.get_seed(), summary.get_samples(), [summary.get_prices(market, g) for g in ("crops", "wood")],
+            summary.get_bankruptcies(market), summary.get_class_counts(market), summary.get_agent_count(market))
+    
+
+class BatchTest(unittest.TestCase):
+    
+    def test_helpers(self):
+        self.assertEqual(parameter_grid(B=[3], A=[1, 2]), [{"A": 1, "B": 3}, {"A": 2, "B": 3}])
+        self.assertEqual(point_key({"B": 3, "A": 1}), (("A", 1), ("B", 3)))
+        self.assertEqual(percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50), 3.0)
+        self.assertEqual(percentile([1.0, 2.0], 25), 1.25)
+        self.assertEqual(percentile([7.0], 95), 7.0)
+        self.assertEqual(percentile([], 50), 0.0)
+    
+    def test_summary_samples_a_plain_run(self):
+        summary = run_scenario(SampleScenario(), 3, {"extra": 8}, 50, sample_every=7)
+        economy = SampleEconomy(3, 8)
+        market = economy.get_market("market")
+        prices = [[], []]
+        
+        for step in (7, 7, 7, 7, 7, 7, 7, 1):
+            economy.simulate(step)
+            prices[0].append(market.get_average_historical_price(GOOD_crops, 1))
+            prices[1].append(market.get_average_historical_price(GOOD_wood, 1))
+        
+        self.assertEqual(summary.get_samples(), [7, 14, 21, 28, 35, 42, 49, 50])
+        self.assertEqual([summary.get_prices("market", "crops"), summary.get_prices("market", "wood")], prices)
+        self.assertEqual(sum(summary.get_bankruptcies("market")), economy.bankruptcies)
+        self.assertGreater(economy.bankruptcies, 0)
+        
+        counts = summary.get_class_counts("market")
+        self.assertEqual(sorted(counts), ["Farmer", "Woodcutter"])
+        self.assertEqual([a + b for a, b in zip(counts["Farmer"], counts["Woodcutter"])], [len(market.get_agents())] * 8)
+    
+    def test_agent_parameters_apply_to_the_run_only(self):
+        defaults = (DefaultAgent.ASK_PRICE_INFLATION, DefaultAgent.OBSERVE_WINDOW)
+        scenario = ProbeScenario()
+        plain = run_scenario(scenario, 4, {}, 30)
+        run_scenario(scenario, 4, {"ASK_PRICE_INFLATION": 1.5, "extra": 2}, 30)
+        
+        self.assertEqual(scenario.seen, [defaults, (1.5, defaults[1])])
+        self.assertEqual((DefaultAgent.ASK_PRICE_INFLATION, DefaultAgent.OBSERVE_WINDOW), defaults)
+        self.assertEqual(summary_state(run_scenario(scenario, 4, {}, 30)), summary_state(plain))
+    
+    def test_processes_match_serial_runs(self):
+        points = parameter_grid(extra=[2, 6], OBSERVE_WINDOW=[5, 10])
+        serial = BatchRunner(SampleScenario(), 40, sample_every=10).run(range(5), points)
+        pooled = BatchRunner(SampleScenario(), 40, processes=2, shard_size=2, sample_every=10).run(range(5), points)
+        
+        self.assertEqual(sorted(serial), sorted(point_key(p) for p in points))
+        self.assertEqual(sorted(pooled), sorted(serial))
+        
+        for key, statistics in serial.items():
+            self.assertEqual([summary_state(run) for run in pooled[key].get_runs()],
+                             [summary_state(run) for run in statistics.get_runs()])
+            self.assertEqual([run.get_seed() for run in statistics.get_runs()], list(range(5)))
+    
+    def test_point_statistics(self):
+        statistics = BatchRunner(SampleScenario(), 30, sample_every=10).run([1, 2, 3])[()]
+        runs = statistics.get_runs()
+        path = statistics.price_path("market", "wood", percentiles=(0, 100))
+        
+        self.assertEqual(statistics.get_samples(), [10, 20, 30])
+        self.assertEqual(path[0], [min(run.get_prices("market", "wood")[i] for run in runs) for i in range(3)])
+        self.assertEqual(path[100], [max(run.get_prices("market", "wood")[i] for run in runs) for i in range(3)])
+        
+        for i in range(3):
+            self.assertAlmostEqual(path["mean"][i], sum(run.get_prices("market", "wood")[i] for run in runs) / 3)
+        
+        bankrupt = sum(sum(run.get_bankruptcies("market")) for run in runs)
+        agent_rounds = sum(run.get_agent_count("market") * 30 for run in runs)
+        self.assertEqual(statistics.bankruptcy_rate("market"), float(bankrupt) / agent_rounds)
+        self.assertAlmostEqual(sum(statistics.bankruptcy_path("market")) * 3, bankrupt)
+        
+        for shares in zip(*statistics.class_mix("market").values()):
+            self.assertAlmostEqual(sum(shares), 1.0)
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from collections import Counter
+from bench.economy import BenchEconomy
+from bench.runner import Scenario, run_scenario, compare, MIXES
+
+
+class BenchEconomyTest(unittest.TestCase):
+    
+    def classes(self, economy):
+        return Counter(agent.get_agent_name() for agent in economy.get_market("bench").get_agents())
+    
+    def test_mix_is_normalised_over_the_goods_in_use(self):
+        self.assertEqual(self.classes(BenchEconomy(100, 2)), {"producer0": 50, "producer1": 50})
+        self.assertEqual(self.classes(BenchEconomy(90, 2, MIXES["skewed"])), {"producer0": 60, "producer1": 30})
+        self.assertEqual(self.classes(BenchEconomy(70, 3, MIXES["skewed"])),
+                         {"producer0": 40, "producer1": 20, "producer2": 10})
+    
+    def test_scenarios_are_reproducible(self):
+        scenario = Scenario(60, 3, "skewed", 20, 5, "Market", "default")
+        first = run_scenario(scenario)
+        second = run_scenario(scenario)
+        
+        for key in ("offers", "trades", "units_traded", "bankruptcies"):
+            self.assertEqual(first[key], second[key])
+        
+        self.assertGreater(first["trades"], 0)
+        self.assertEqual(first["name"], scenario.get_name())
+    
+    def test_compare_reports_regressions(self):
+        baseline = {"results": [{"name": "a", "rounds_per_second": 100.0}, {"name": "b", "rounds_per_second": 100.0}]}
+        results = [{"name": "a", "rounds_per_second": 89.0}, {"name": "b", "rounds_per_second": 91.0},
+                   {"name": "c", "rounds_per_second": 1.0}]
+        
+        self.assertEqual(compare(results, baseline, 0.1), ["a"])
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+from bazaarbot import ISignalBankrupt
+from bazaarbot.checkpoint import load_checkpoint
+from bazaarbot.market import Market, MarketInitConfig, DefaultOfferResolver, DefaultOfferExecutor
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+
+
+class BankruptcyRecorder(ISignalBankrupt):
+    
+    def __init__(self):
+        self.signals = []
+    
+    def signal_bankrupt(self, market, agent):
+        self.signals.append((market.get_round_num(), agent.get_agent_name()))
+    
+
+def recorded_market(market_class, seed):
+    """
+    Market that only records its bankruptcies, so it can be restored on its own and continue the same way.
+    """
+    source = SampleEconomy(seed, 10)
+    return market_class("market", source.get_market_data(), BankruptcyRecorder(), DefaultOfferResolver(source.rng),
+                        DefaultOfferExecutor(), MarketInitConfig(), source.rng)
+    
+
+class CheckpointTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "run.ckpt")
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+    
+    def test_economy_continues_the_same_after_restore(self):
+        for market_class in (Market, VectorizedMarket):
+            for use_mmap in (False, True):
+                economy = SampleEconomy(5, 10, market_class=market_class)
+                economy.simulate(40)
+                economy.save_checkpoint(self.path)
+                
+                restored = load_checkpoint(self.path, use_mmap=use_mmap)
+                self.assertEqual(market_state(restored.get_market("market")), market_state(economy.get_market("market")))
+                self.assertEqual(restored.get_round_num(), 40)
+                
+                economy.simulate(60)
+                restored.simulate(60)
+                self.assertEqual(market_state(restored.get_market("market")), market_state(economy.get_market("market")))
+                self.assertEqual(restored.bankruptcies, economy.bankruptcies)
+                self.assertEqual(restored.get_market("market").get_round_num(), 100)
+    
+    def test_market_continues_the_same_after_restore(self):
+        for market_class in (Market, VectorizedMarket):
+            for use_mmap in (False, True):
+                market = recorded_market(market_class, 6)
+                market.simulate(30)
+                market.save_checkpoint(self.path)
+                
+                with open(self.path, "rb") as f:
+                    saved = f.read()
+                
+                isb = BankruptcyRecorder()
+                restored = load_checkpoint(self.path, isb, use_mmap=use_mmap)
+                market.simulate(50)
+                restored.simulate(50)
+                
+                self.assertEqual(market_state(restored), market_state(market))
+                self.assertGreater(len(isb.signals), 0)
+                self.assertTrue(all(round_num >= 30 for round_num, _ in isb.signals))
+                
+                with open(self.path, "rb") as f:
+                    self.assertEqual(f.read(), saved)
+    
+    def test_rejects_other_files(self):
+        with open(self.path, "wb") as f:
+            f.write(b"not a checkpoint at all")
+        
+        self.assertRaises(ValueError, load_checkpoint, self.path)
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+from bazaarbot.history import History
+from bazaarbot.market import Market
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy
+
+
+def naive_class_profits(agents):
+    """
+    Average last-round profit of every agent class, grouped by sorting the agents by class name.
+    """
+    profits = {}
+    
+    for agent in sorted(agents, key=lambda x: x.get_agent_name()):
+        profits.setdefault(agent.get_agent_name(), []).append(agent.get_last_simulate_profit())
+    
+    return dict((name, Market.list_avg(values)) for name, values in profits.items())
+    
+
+def checking(market_class):
+    """
+    `market_class` comparing every recorded class profit to naive_class_profits.
+    """
+    
+    class CheckingMarket(market_class):
+        
+        def record_profit(self):
+            expected = naive_class_profits(self.get_agents())
+            market_class.record_profit(self)
+            profit = self.history.get_profit()
+            self.checked.append((expected, dict((name, profit.average(name, 1)) for name in expected)))
+    
+    return CheckingMarket
+    
+
+class ClassIndexTest(unittest.TestCase):
+    
+    def test_class_profits_match_naive_grouping(self):
+        for market_class in (Market, VectorizedMarket):
+            # the market only logs the profit of classes registered with its history
+            history = History()
+            history.get_profit().register("Farmer")
+            history.get_profit().register("Woodcutter")
+            
+            economy = SampleEconomy(2, 15, market_class=checking(market_class), history=history)
+            market = economy.get_market("market")
+            market.history = history
+            market.checked = []
+            
+            for _ in range(120):
+                economy.simulate(1)
+                
+                names = [agent.get_agent_name() for agent in market.get_agents()]
+                self.assertEqual(sorted(market.get_agent_class_names()), sorted(set(names)))
+                
+                for name in set(names):
+                    self.assertEqual(market.get_agent_class_count(name), names.count(name))
+                
+                best = max(history.get_profit().average(name, 10) for name in set(names))
+                self.assertEqual(history.get_profit().average(market.get_most_profitable_agent(), 10), best)
+            
+            self.assertGreater(economy.bankruptcies, 0)
+            self.assertEqual(len(market.checked), 120)
+            
+            for expected, recorded in market.checked:
+                self.assertEqual(sorted(recorded), sorted(expected))
+                
+                for name in expected:
+                    if market_class is Market:
+                        self.assertEqual(recorded[name], expected[name])
+                    else:
+                        self.assertAlmostEqual(recorded[name], expected[name])
+    
+    def test_class_leaving_the_market(self):
+        economy = SampleEconomy(3)
+        market = economy.get_market("market")
+        
+        for agent in list(market.get_agents()):
+            if agent.get_agent_name() == "Woodcutter":
+                market.replace_agent(agent, economy.instatiate_agent("farmer"))
+        
+        self.assertEqual(market.get_agent_class_count("Woodcutter"), 0)
+        self.assertEqual(market.get_agent_class_count("Farmer"), len(market.get_agents()))
+        self.assertEqual(market.get_agent_class_names(), ["Farmer"])
+        
+        economy.simulate(5)
+        self.assertEqual(market.get_agent_class_names(), ["Farmer"])
+        self.assertEqual(market.get_most_profitable_agent(), "Farmer")
+    
+
+if __name__ == "__main__":
+    unittest.main()
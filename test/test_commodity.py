@@ -0,0 +1,37 @@
+import pickle
+import unittest
+from bazaarbot._base import SimpleCommodity, COMMODITIES
+
+
+class CommodityTest(unittest.TestCase):
+    
+    def test_same_name_is_same_commodity(self):
+        a = SimpleCommodity("interned", 1.0)
+        b = SimpleCommodity("interned", 2.0)
+        
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual({a: 1}[b], 1)
+        self.assertNotEqual(a, SimpleCommodity("interned too", 1.0))
+    
+    def test_ids_are_stable_and_named(self):
+        good = SimpleCommodity("registry", 1.0)
+        cid = good.get_commodity_id()
+        
+        self.assertEqual(COMMODITIES.get_id("registry"), cid)
+        self.assertEqual(COMMODITIES.get_name(cid), "registry")
+        self.assertEqual(SimpleCommodity("registry", 1.0).get_commodity_id(), cid)
+    
+    def test_pickle_drops_the_id(self):
+        good = SimpleCommodity("pickled", 1.5)
+        good.get_commodity_id()
+        
+        self.assertNotIn("_commodity_id", good.__getstate__())
+        
+        copy = pickle.loads(pickle.dumps(good))
+        self.assertEqual(copy, good)
+        self.assertEqual(copy.get_space(), 1.5)
+    
+
+if __name__ == "__main__":
+    unittest.main()
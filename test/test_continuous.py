@@ -0,0 +1,166 @@
+import unittest
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.agents import DefaultAgent
+from bazaarbot.continuous import ContinuousTradebook
+from bazaarbot.inventory import InventoryData
+from bazaarbot.market import DefaultOfferExecutor, Offer
+from common import SampleEconomy
+from simple import GOOD_crops
+
+GOOD = SimpleCommodity("continuous", 1.0)
+
+
+class TrackingOfferExecutor(DefaultOfferExecutor):
+    
+    def __init__(self):
+        self.trades = []
+        self.rejected = []
+    
+    def execute(self, buyer, seller):
+        self.trades.append((buyer.get_agent(), seller.get_agent(), buyer.get_units(), seller.get_unit_price()))
+        return DefaultOfferExecutor.execute(self, buyer, seller)
+    
+    def reject_bid(self, buyer, unit_price):
+        self.rejected.append(buyer)
+        DefaultOfferExecutor.reject_bid(self, buyer, unit_price)
+    
+    def reject_ask(self, seller, unit_price):
+        self.rejected.append(seller)
+        DefaultOfferExecutor.reject_ask(self, seller, unit_price)
+    
+
+def agent(name):
+    return DefaultAgent(name, None, InventoryData(100, {}, {GOOD: 10.0}), 100.0)
+    
+
+class ContinuousTradebookTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.book = ContinuousTradebook()
+        self.executor = TrackingOfferExecutor()
+        self.seller = agent("seller")
+        self.buyer = agent("buyer")
+    
+    def place(self, owner, units, price, is_ask, expires=None):
+        return self.book.place(self.executor, Offer(owner, GOOD, units, price), is_ask, expires)
+    
+    def test_price_time_priority(self):
+        late = self.place(self.seller, 1.0, 2.0, True)
+        early_dear = self.place(agent("dear"), 1.0, 3.0, True)
+        cheap = self.place(agent("cheap"), 1.0, 2.0, True)
+        
+        self.assertEqual([o.get_order_id() for o in self.book.get_book(GOOD).get_orders(True)],
+                         [late, cheap, early_dear])
+        
+        self.place(self.buyer, 2.5, 3.0, False)
+        
+        self.assertEqual([(units, price) for _, _, units, price in self.executor.trades],
+                         [(1.0, 2.0), (1.0, 2.0), (0.5, 3.0)])
+        self.assertIsNone(self.book.get_order(late))
+        self.assertIsNone(self.book.get_order(cheap))
+        self.assertEqual(self.book.get_order(early_dear).get_offer().get_units(), 0.5)
+        self.assertEqual(self.buyer.query_inventory(GOOD), 12.5)
+        self.assertEqual(self.seller.query_inventory(GOOD), 9.0)
+    
+    def test_orders_that_do_not_cross_rest(self):
+        ask = self.place(self.seller, 1.0, 5.0, True)
+        bid = self.place(self.buyer, 1.0, 4.0, False)
+        
+        self.assertEqual(self.executor.trades, [])
+        self.assertEqual(self.book.get_book(GOOD).best_ask().get_order_id(), ask)
+        self.assertEqual(self.book.get_book(GOOD).best_bid().get_order_id(), bid)
+        self.assertEqual(self.book.get_order_count(), 2)
+    
+    def test_cancel(self):
+        order = self.place(self.seller, 1.0, 5.0, True)
+        
+        self.assertTrue(self.book.cancel(order))
+        self.assertFalse(self.book.cancel(order))
+        self.assertIsNone(self.book.get_order(order))
+        self.assertEqual(self.book.get_agent_orders(self.seller), [])
+        
+        self.place(self.buyer, 1.0, 9.0, False)
+        self.assertEqual(self.executor.trades, [])
+    
+    def test_expiry(self):
+        first = self.place(self.seller, 1.0, 5.0, True, 1)
+        second = self.place(self.seller, 1.0, 6.0, True, 2)
+        forever = self.place(self.buyer, 1.0, 1.0, False)
+        
+        self.book.close_round(self.executor, 0)
+        self.assertEqual(self.book.get_order_count(), 3)
+        
+        self.book.close_round(self.executor, 1)
+        self.assertIsNone(self.book.get_order(first))
+        self.assertIsNotNone(self.book.get_order(second))
+        self.assertEqual([o.get_unit_price() for o in self.executor.rejected], [5.0])
+        
+        self.book.close_round(self.executor, 5)
+        self.assertIsNone(self.book.get_order(second))
+        self.assertIsNotNone(self.book.get_order(forever))
+    
+    def test_cancel_agent(self):
+        self.place(self.seller, 1.0, 5.0, True)
+        self.place(self.seller, 1.0, 1.0, False)
+        other = self.place(self.buyer, 1.0, 2.0, False)
+        
+        self.assertEqual(len(self.book.get_agent_orders(self.seller)), 2)
+        self.assertEqual(self.book.cancel_agent(self.executor, self.seller), 2)
+        self.assertEqual(self.book.get_agent_orders(self.seller), [])
+        self.assertEqual(len(self.executor.rejected), 2)
+        self.assertEqual([o.get_order_id() for o in self.book.get_agent_orders(self.buyer)], [other])
+    
+
+class ContinuousMarketTest(unittest.TestCase):
+    
+    def test_replaced_agents_stop_trading(self):
+        executor = TrackingOfferExecutor()
+        economy = SampleEconomy(3, 20, executor=executor)
+        market = economy.get_market("market")
+        book = market.enable_continuous(lifetime=None)
+        economy.simulate(5)
+        
+        leaving = [a for a in market.get_agents() if len(book.get_agent_orders(a)) > 0][:5]
+        orders = sum(len(book.get_agent_orders(a)) for a in leaving)
+        rejected = len(executor.rejected)
+        market.replace_agents(leaving, [economy.instatiate_agent("farmer") for _ in leaving])
+        
+        self.assertGreater(orders, 0)
+        self.assertEqual(len(executor.rejected) - rejected, orders)
+        
+        for old_agent in leaving:
+            self.assertEqual(book.get_agent_orders(old_agent), [])
+        
+        del executor.trades[:]
+        economy.simulate(20)
+        
+        for buyer, seller, _, _ in executor.trades:
+            self.assertIsNotNone(market.get_agent_slot(buyer))
+            self.assertIsNotNone(market.get_agent_slot(seller))
+        
+        for good in market.get_good_types():
+            for order in book.get_book(good).get_orders(True) + book.get_book(good).get_orders(False):
+                self.assertIsNotNone(market.get_agent_slot(order.get_offer().get_agent()))
+    
+    def test_place_order_between_rounds(self):
+        economy = SampleEconomy(1)
+        market = economy.get_market("market")
+        market.enable_continuous(lifetime=None)
+        economy.simulate(2)
+        
+        seller = market.get_agents()[0]
+        order = market.place_order(Offer(seller, GOOD_crops, 1, 1e6), True, market.get_round_num() + 1)
+        book = market.get_continuous_book()
+        
+        economy.simulate(1)
+        self.assertIsNotNone(book.get_order(order))
+        economy.simulate(1)
+        self.assertIsNone(book.get_order(order))
+        
+        order = market.place_order(Offer(seller, GOOD_crops, 1, 1e6), True)
+        self.assertTrue(market.cancel_order(order))
+        self.assertFalse(market.cancel_order(order))
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import random
+import unittest
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.agents import DefaultAgent
+from bazaarbot.contract import ContractScheduler, ContractOfferExecutor
+from bazaarbot.inventory import InventoryData
+from common import SampleEconomy, market_state
+
+GOOD = SimpleCommodity("shipped", 1.0)
+
+
+def agent(name):
+    return DefaultAgent(name, None, InventoryData(100, {}, {GOOD: 10.0}), 100.0)
+    
+
+class ContractSchedulerTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.provider = agent("provider")
+        self.receiver = agent("receiver")
+    
+    def expecting(self):
+        return self.receiver.get_snapshot().get_inventory().query_expecting(GOOD)
+    
+    def test_goods_arrive_when_due(self):
+        scheduler = ContractScheduler(2)
+        contract = scheduler.new_contract(self.provider, self.receiver, GOOD, 3.0, 2.0)
+        
+        self.assertEqual(contract.get_due(), 2)
+        self.assertEqual(self.provider.query_inventory(GOOD), 7.0)
+        self.assertEqual(self.receiver.query_inventory(GOOD), 10.0)
+        self.assertEqual(self.expecting(), 3.0)
+        self.assertEqual(scheduler.get_due(2), [contract])
+        
+        self.assertEqual(scheduler.settle(1), 0)
+        self.assertTrue(contract.is_open())
+        
+        self.assertEqual(scheduler.settle(2), 1)
+        self.assertFalse(contract.is_open())
+        self.assertEqual(self.receiver.query_inventory(GOOD), 13.0)
+        self.assertEqual(self.expecting(), 0.0)
+        self.assertEqual(scheduler.get_pending(), 0)
+    
+    def test_lost_shipments_are_abandoned(self):
+        scheduler = ContractScheduler(1, risk=1.0, rnd=random.Random(1))
+        contract = scheduler.new_contract(self.provider, self.receiver, GOOD, 3.0, 2.0)
+        scheduler.settle(1)
+        
+        self.assertFalse(contract.is_open())
+        self.assertEqual(self.provider.query_inventory(GOOD), 7.0)
+        self.assertEqual(self.receiver.query_inventory(GOOD), 10.0)
+        self.assertEqual(self.expecting(), 0.0)
+    
+    def test_immediate_delivery(self):
+        scheduler = ContractScheduler(0)
+        
+        self.assertIsNone(scheduler.new_contract(self.provider, self.receiver, GOOD, 3.0, 2.0))
+        self.assertEqual(self.receiver.query_inventory(GOOD), 13.0)
+        self.assertEqual(scheduler.get_pending(), 0)
+    
+    def test_receivers_that_left_are_skipped(self):
+        scheduler = ContractScheduler(1)
+        contract = scheduler.new_contract(self.provider, self.receiver, GOOD, 3.0, 2.0)
+        scheduler.settle(1, set([self.provider]))
+        
+        self.assertFalse(contract.is_open())
+        self.assertEqual(self.receiver.query_inventory(GOOD), 10.0)
+        self.assertEqual(scheduler.get_pending(), 0)
+    
+    def test_pending_scheduler_cannot_jump(self):
+        scheduler = ContractScheduler(2)
+        scheduler.new_contract(self.provider, self.receiver, GOOD, 3.0, 2.0)
+        
+        self.assertRaises(ValueError, scheduler.set_round_num, 5)
+        scheduler.set_round_num(0)
+        scheduler.settle(2)
+        scheduler.set_round_num(5)
+        self.assertEqual(scheduler.get_round_num(), 5)
+    
+
+class ContractMarketTest(unittest.TestCase):
+    
+    def test_attaching_settles_contracts_due_in_between(self):
+        economy = SampleEconomy(1)
+        market = economy.get_market("market")
+        economy.simulate(5)
+        
+        provider = market.get_agents()[0]
+        receiver = market.get_agents()[1]
+        good = market.get_good_types()[0]
+        held = receiver.query_inventory(good)
+        scheduler = ContractScheduler(2)
+        scheduler.new_contract(provider, receiver, good, 1.0, 1.0)
+        market.set_contract_scheduler(scheduler)
+        
+        self.assertEqual(scheduler.get_round_num(), 5)
+        self.assertEqual(scheduler.get_pending(), 0)
+        self.assertEqual(receiver.query_inventory(good), held + 1.0)
+        self.assertEqual(receiver.get_snapshot().get_inventory().query_expecting(good), 0.0)
+    
+    def test_attaching_a_scheduler_ahead_with_contracts(self):
+        economy = SampleEconomy(1)
+        market = economy.get_market("market")
+        scheduler = ContractScheduler(2)
+        scheduler.settle(4)
+        scheduler.new_contract(market.get_agents()[0], market.get_agents()[1], market.get_good_types()[0], 1.0, 1.0)
+        
+        self.assertRaises(ValueError, market.set_contract_scheduler, scheduler)
+        self.assertIsNone(market.get_contract_scheduler())
+    
+    def test_deliveries_in_a_running_market(self):
+        plain = SampleEconomy(3, 10)
+        plain.simulate(80)
+        
+        for delay in (0, 3):
+            scheduler = ContractScheduler(delay)
+            economy = SampleEconomy(3, 10, executor=ContractOfferExecutor(scheduler))
+            market = economy.get_market("market")
+            market.set_contract_scheduler(scheduler)
+            economy.simulate(80)
+            
+            self.assertEqual(scheduler.get_round_num(), 80)
+            
+            if delay == 0:
+                self.assertEqual(market_state(market), market_state(plain.get_market("market")))
+            else:
+                pending = sum(len(scheduler.get_due(r)) for r in range(81, 84))
+                self.assertEqual(scheduler.get_pending(), pending)
+                self.assertNotEqual(market_state(market), market_state(plain.get_market("market")))
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from common import SampleEconomy, market_state
+
+
+class AsyncSteppingTest(unittest.TestCase):
+    
+    def test_simulate_async_matches_simulate(self):
+        reference = SampleEconomy(3, 10)
+        reference.simulate(60)
+        expected = market_state(reference.get_market("market"))
+        
+        with ThreadPoolExecutor(1) as executor:
+            for chunk_size, offload in ((1, None), (7, executor), (1000, executor)):
+                economy = SampleEconomy(3, 10)
+                rounds = asyncio.run(economy.simulate_async(60, chunk_size, offload))
+                
+                self.assertEqual(rounds, 60)
+                self.assertEqual(market_state(economy.get_market("market")), expected)
+    
+    def test_event_loop_keeps_running_between_steps(self):
+        ticks = [0]
+        
+        async def ticker():
+            while True:
+                ticks[0] += 1
+                await asyncio.sleep(0)
+        
+        async def run():
+            task = asyncio.ensure_future(ticker())
+            await SampleEconomy(3, 10).simulate_async(5, 4)
+            task.cancel()
+        
+        asyncio.run(run())
+        self.assertGreater(ticks[0], 5)
+    
+    def test_wait_round_resolves_for_rounds_run_in_a_thread(self):
+        async def run():
+            economy = SampleEconomy(1)
+            market = economy.get_market("market")
+            next_round = market.wait_round()
+            third_round = economy.wait_round(3)
+            
+            await asyncio.get_running_loop().run_in_executor(None, economy.simulate, 3)
+            return await next_round, await third_round, await economy.wait_round(2)
+        
+        self.assertEqual(asyncio.run(run()), (1, 3, 3))
+    
+    def test_wait_round_needs_a_running_loop(self):
+        self.assertRaises(RuntimeError, SampleEconomy(1).wait_round)
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import collections
+import shutil
+import tempfile
+import threading
+import unittest
+from bazaarbot.export import (FIELDS, TRADE, REJECTED, BANKRUPTCY, ROUND, RecordBuffer, IChunkWriter,
+                              ChunkedExportSink, CsvChunkWriter, NpyChunkWriter, read_chunks, np)
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+
+
+class BlockedWriter(IChunkWriter):
+    """
+    Writer holding every batch until `release` is set; `started` is set once it holds the first one.
+    """
+    
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.records = 0
+    
+    def write(self, kind, records):
+        self.started.set()
+        self.release.wait()
+        self.records += len(records)
+    
+
+class ExportTest(unittest.TestCase):
+    
+    def test_records_add_up(self):
+        for kwargs in ({}, {"market_class": VectorizedMarket}):
+            plain = SampleEconomy(11, 10, **kwargs)
+            plain.simulate(50)
+            
+            buf = RecordBuffer()
+            economy = SampleEconomy(11, 10, **kwargs)
+            economy.enable_export(buf)
+            economy.simulate(50)
+            
+            market = economy.get_market("market")
+            self.assertEqual(market_state(market), market_state(plain.get_market("market")))
+            
+            records = collections.defaultdict(list)
+            
+            for kind, record in buf.get_records():
+                self.assertEqual(len(record), len(FIELDS[kind]))
+                records[kind].append(record)
+            
+            self.assertEqual(len(records[BANKRUPTCY]), economy.bankruptcies)
+            self.assertGreater(len(records[TRADE]), 0)
+            self.assertGreater(len(records[REJECTED]), 0)
+            
+            # one aggregate per good and round, agreeing with the market history and the single trades
+            history = market.get_snapshot().get_history()
+            goods = dict((good.get_name(), good) for good in market.get_good_types())
+            traded = collections.defaultdict(float)
+            
+            for record in records[TRADE]:
+                traded[(record[1], record[2])] += record[5]
+            
+            self.assertEqual(sorted((r[1], r[2]) for r in records[ROUND]),
+                             sorted((n, name) for n in range(50) for name in goods))
+            
+            for record in records[ROUND]:
+                # the history starts with one entry for the starting trade
+                round_num, good = record[1], goods[record[2]]
+                self.assertEqual(record[5], list(dict(history.get_asks().get_subjects())[good])[round_num + 1])
+                self.assertEqual(record[6], list(dict(history.get_bids().get_subjects())[good])[round_num + 1])
+                self.assertEqual(record[8], list(dict(history.get_trades().get_subjects())[good])[round_num + 1])
+                self.assertAlmostEqual(traded[(round_num, record[2])], record[8])
+    
+    def test_chunk_files_read_back(self):
+        writers = [CsvChunkWriter] + ([NpyChunkWriter] if np is not None else [])
+        buf = RecordBuffer()
+        economy = SampleEconomy(12, 10)
+        economy.enable_export(buf)
+        economy.simulate(30)
+        
+        for writer in writers:
+            directory = tempfile.mkdtemp()
+            
+            try:
+                economy = SampleEconomy(12, 10)
+                
+                with ChunkedExportSink(writer(directory), batch_size=50, max_pending=2) as sink:
+                    economy.enable_export(sink)
+                    economy.simulate(30)
+                
+                for kind in FIELDS:
+                    self.assertEqual(list(read_chunks(directory, kind)), [r for k, r in buf.get_records() if k == kind])
+            finally:
+                shutil.rmtree(directory)
+    
+    def test_chunks_continue_numbering(self):
+        directory = tempfile.mkdtemp()
+        records = [("market", i, "agent", float(i)) for i in range(6)]
+        
+        try:
+            # a second writer on the same directory appends after the first one's chunks
+            for start in (0, 3):
+                writer = CsvChunkWriter(directory)
+                
+                for record in records[start:start + 3]:
+                    writer.write(BANKRUPTCY, [record])
+            
+            self.assertEqual(list(read_chunks(directory, BANKRUPTCY)), records)
+            
+            # chunks are ordered by their number, not by their name
+            writer = CsvChunkWriter(directory)
+            writer._chunks[BANKRUPTCY] = 999999
+            writer.write(BANKRUPTCY, [("market", 6, "agent", 6.0)])
+            writer.write(BANKRUPTCY, [("market", 7, "agent", 7.0)])
+            self.assertEqual([r[1] for r in read_chunks(directory, BANKRUPTCY)], list(range(8)))
+            self.assertEqual(CsvChunkWriter(directory)._chunks[BANKRUPTCY], 1000001)
+            
+            if np is not None:
+                NpyChunkWriter(directory).write(BANKRUPTCY, [("market", 8, "agent", 8.0)])
+                self.assertRaises(ValueError, list, read_chunks(directory, BANKRUPTCY))
+                self.assertEqual(list(read_chunks(directory, BANKRUPTCY, ".npy")), [("market", 8, "agent", 8.0)])
+                self.assertEqual(len(list(read_chunks(directory, BANKRUPTCY, ".csv"))), 8)
+        finally:
+            shutil.rmtree(directory)
+    
+    def test_full_queue_drops_or_blocks(self):
+        writer = BlockedWriter()
+        sink = ChunkedExportSink(writer, batch_size=1, max_pending=2, block=False)
+        
+        sink.emit(BANKRUPTCY, ("market", 0, "agent", 0.0))
+        writer.started.wait()
+        
+        for i in range(1, 10):
+            sink.emit(BANKRUPTCY, ("market", i, "agent", 0.0))
+        
+        # the writer holds one batch, two more wait in the queue
+        self.assertEqual(sink.get_dropped(), 7)
+        writer.release.set()
+        sink.close()
+        self.assertEqual(writer.records, 3)
+        
+        writer = BlockedWriter()
+        writer.release.set()
+        
+        with ChunkedExportSink(writer, batch_size=3, max_pending=1) as sink:
+            for i in range(10):
+                sink.emit(BANKRUPTCY, ("market", i, "agent", 0.0))
+        
+        self.assertEqual(sink.get_dropped(), 0)
+        self.assertEqual(writer.records, 10)
+    
+
+if __name__ == "__main__":
+    unittest.main()
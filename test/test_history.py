@@ -0,0 +1,166 @@
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.history import EcoNoun, History, HistoryLog, MappedHistoryLog, RingBuffer, RingHistoryLog
+from common import SampleEconomy, market_state
+
+GOOD = SimpleCommodity("history", 1.0)
+
+
+class RingHistoryLogTest(unittest.TestCase):
+    
+    def test_averages_match_list_log(self):
+        rng = random.Random(5)
+        ring = RingHistoryLog(EcoNoun.PRICE, retention=64)
+        plain = HistoryLog(EcoNoun.PRICE)
+        ring.register(GOOD)
+        plain.register(GOOD)
+        
+        self.assertEqual(ring.average(GOOD, 10), plain.average(GOOD, 10))
+        self.assertEqual(ring.average("missing", 10), plain.average("missing", 10))
+        
+        for i in range(5000):
+            value = rng.uniform(0.0, 1000.0)
+            ring.add(GOOD, value)
+            plain.add(GOOD, value)
+            
+            for r in (1, 10, 15, 64):
+                self.assertAlmostEqual(ring.average(GOOD, r), plain.average(GOOD, r), 7)
+        
+        self.assertEqual(ring.get_subjects()[0][1], plain.get_subjects()[0][1][-64:])
+    
+    def test_requested_windows_are_tracked_from_the_start(self):
+        ring = RingHistoryLog(EcoNoun.PRICE, retention=32)
+        ring.register(GOOD)
+        
+        for i in range(40):
+            ring.add(GOOD, float(i))
+            ring.average(GOOD, 10)
+            ring.average(GOOD, 15)
+        
+        self.assertEqual(sorted(ring._log[GOOD]._sums), [10, 15])
+        self.assertEqual(ring.average(GOOD, 10), sum(range(30, 40)) / 10.0)
+    
+    def test_ring_buffer_keeps_the_last_values(self):
+        buf = RingBuffer(4)
+        
+        for i in range(10):
+            buf.append(float(i))
+        
+        self.assertEqual(len(buf), 4)
+        self.assertEqual(buf.values(), [6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(buf.last(), 9.0)
+        self.assertEqual(buf.sum(2), 17.0)
+        self.assertEqual(buf.sum(100), 30.0)
+        self.assertRaises(ValueError, RingBuffer, 0)
+    
+    def test_shared_rings_copy_on_append(self):
+        buf = RingBuffer(4)
+        buf.append(1.0)
+        copy = buf.share()
+        buf.append(2.0)
+        copy.append(3.0)
+        
+        self.assertEqual(buf.values(), [1.0, 2.0])
+        self.assertEqual(copy.values(), [1.0, 3.0])
+    
+    def test_bounded_history_in_a_market(self):
+        plain = SampleEconomy(3, 10)
+        bounded = SampleEconomy(3, 10, history=History(retention=32))
+        plain.simulate(120)
+        bounded.simulate(120)
+        
+        expected = market_state(plain.get_market("market"))
+        state = market_state(bounded.get_market("market"))
+        
+        self.assertEqual(state[5:], expected[5:])
+        
+        for log, expected_log in zip(state[:5], expected[:5]):
+            self.assertEqual(log, [(key, values[-32:]) for key, values in expected_log])
+    
+
+class MappedHistoryLogTest(unittest.TestCase):
+    
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+    
+    def create(self):
+        log = MappedHistoryLog(EcoNoun.PRICE, self._directory)
+        log.register(GOOD)
+        return log
+    
+    def test_matches_list_log_and_reopens(self):
+        log = self.create()
+        plain = HistoryLog(EcoNoun.PRICE)
+        plain.register(GOOD)
+        
+        for i in range(10000):
+            log.add(GOOD, i * 0.37 % 5.0)
+            plain.add(GOOD, i * 0.37 % 5.0)
+        
+        for r in (1, 10, 15, 10000, 20000):
+            self.assertEqual(log.average(GOOD, r), plain.average(GOOD, r))
+        
+        log.flush()
+        log.close()
+        
+        reopened = MappedHistoryLog(EcoNoun.PRICE, self._directory)
+        self.assertEqual(reopened.average("history", 15), plain.average(GOOD, 15))
+        self.assertEqual(list(dict(reopened.get_subjects())["history"]), plain.get_subjects()[0][1])
+        reopened.close()
+    
+    def test_state_loads_while_the_file_is_unchanged(self):
+        log = self.create()
+        
+        for i in range(5):
+            log.add(GOOD, float(i))
+        
+        state = pickle.dumps(log)
+        log.close()
+        
+        loaded = pickle.loads(state)
+        self.assertEqual(list(dict(loaded.get_subjects())[GOOD]), [0.0, 1.0, 2.0, 3.0, 4.0])
+        loaded.close()
+    
+    def test_older_state_is_refused_and_the_file_kept(self):
+        log = self.create()
+        log.add(GOOD, 1.0)
+        state = pickle.dumps(log)
+        log.add(GOOD, 2.0)
+        log.add(GOOD, 3.0)
+        
+        self.assertRaises(ValueError, pickle.loads, state)
+        self.assertEqual(list(dict(log.get_subjects())[GOOD]), [1.0, 2.0, 3.0])
+        log.close()
+        
+        reopened = MappedHistoryLog(EcoNoun.PRICE, self._directory)
+        self.assertEqual(len(dict(reopened.get_subjects())["history"]), 3)
+        self.assertTrue(os.path.isdir(reopened.get_directory()))
+        reopened.close()
+    
+    def test_mapped_history_in_a_market(self):
+        plain = SampleEconomy(4, 10)
+        history = History(directory=self._directory)
+        mapped = SampleEconomy(4, 10, history=history)
+        plain.simulate(150)
+        mapped.simulate(150)
+        
+        self.assertEqual(market_state(mapped.get_market("market")), market_state(plain.get_market("market")))
+        history.close()
+        
+        reopened = History(directory=self._directory)
+        expected = dict((key.get_name(), list(values)) for key, values in
+                        plain.get_market("market").get_snapshot().get_history().get_prices().get_subjects())
+        self.assertEqual(dict((key, list(values)) for key, values in reopened.get_prices().get_subjects()), expected)
+        reopened.close()
+    
+
+if __name__ == "__main__":
+    unittest.main()
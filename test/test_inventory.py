@@ -0,0 +1,97 @@
+import math
+import pickle
+import random
+import unittest
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.inventory import Inventory, InventoryData, CommoditySlots
+
+GOODS = [SimpleCommodity("inv%d" % i, 0.1 + 0.7 * i) for i in range(6)]
+
+
+def fresh_used_space(inventory):
+    # correctly rounded; the compensated running total has to come out the same
+    return math.fsum(entry.get_amount() * good.get_space() for good, entry in inventory.get_stuff().items())
+    
+
+class InventoryTest(unittest.TestCase):
+    
+    def create(self, slots=None):
+        inventory = Inventory(slots=CommoditySlots(GOODS) if slots is None else slots)
+        inventory.from_data(InventoryData(50, {GOODS[0]: 3.0, GOODS[1]: 2.0}, {GOODS[0]: 1.0, GOODS[2]: 4.5}))
+        return inventory
+    
+    def test_used_space_matches_contents_after_many_changes(self):
+        rng = random.Random(3)
+        inventory = self.create()
+        
+        for i in range(100000):
+            good = rng.choice(GOODS)
+            
+            if rng.random() < 0.3:
+                inventory.add(good, rng.uniform(0.0, 9.0), rng.uniform(0.0, 3.0))
+            else:
+                inventory.change(good, rng.uniform(-1.3, 1.3), rng.choice([0.0, rng.uniform(0.1, 3.0)]))
+            
+            if i % 997 == 0:
+                self.assertEqual(inventory.get_used_space(), fresh_used_space(inventory))
+        
+        self.assertEqual(inventory.get_used_space(), fresh_used_space(inventory))
+        self.assertEqual(inventory.get_empty_space(), inventory.get_max_size() - fresh_used_space(inventory))
+        
+        # a restored inventory carries on with the same running total, not a fresh sum of its own
+        restored = pickle.loads(pickle.dumps(inventory))
+        
+        for inv in (inventory, restored):
+            inv.change(GOODS[4], 0.7, 0.0)
+        
+        self.assertEqual((restored._used_space, restored._used_error), (inventory._used_space, inventory._used_error))
+    
+    def test_empty_inventory_is_exactly_empty(self):
+        inventory = self.create()
+        
+        for _ in range(1000):
+            inventory.change(GOODS[2], 0.1, 0.0)
+            inventory.change(GOODS[3], 0.3, 0.0)
+        
+        for good in GOODS:
+            inventory.add(good, 0.0, 0.0)
+        
+        self.assertEqual(inventory.get_used_space(), 0.0)
+        self.assertEqual(inventory.get_empty_space(), 50)
+    
+    def test_queries(self):
+        inventory = self.create()
+        inventory.change(GOODS[2], 2.0, 1.5)
+        inventory.change_expecting(GOODS[0], 1.0, 2.0)
+        
+        self.assertEqual(inventory.query_amount(GOODS[2]), 6.5)
+        self.assertEqual(inventory.query_amount(GOODS[5]), 0.0)
+        self.assertEqual(inventory.query_expecting(GOODS[0]), 1.0)
+        self.assertEqual(inventory.surplus(GOODS[2]), 6.5)
+        self.assertEqual(inventory.shortage(GOODS[0]), 1.0)
+        self.assertEqual(sorted(g.get_name() for g in inventory.get_stuff()), ["inv0", "inv2"])
+        self.assertEqual(sorted(g.get_name() for g in inventory.get_ideal()), ["inv0", "inv1"])
+    
+    def test_copy_rebind_and_pickle_keep_contents(self):
+        inventory = self.create()
+        inventory.change(GOODS[2], 2.0, 1.5)
+        inventory.change_expecting(GOODS[1], 1.0, 2.0)
+        
+        def contents(inv):
+            return (sorted((g.get_name(), e.get_amount(), e.get_original_price()) for g, e in inv.get_stuff().items()),
+                    sorted((g.get_name(), a) for g, a in inv.get_ideal().items()),
+                    sorted((g.get_name(), e.get_amount()) for g, e in inv.get_expecting().items()),
+                    inv.get_used_space(), inv.get_max_size())
+        
+        copy = Inventory(inventory)
+        copy.change(GOODS[2], 1.0, 0.0)
+        self.assertNotEqual(contents(copy), contents(inventory))
+        
+        rebound = Inventory(inventory)
+        rebound.rebind(CommoditySlots(list(reversed(GOODS))))
+        self.assertEqual(contents(rebound), contents(inventory))
+        self.assertEqual(contents(pickle.loads(pickle.dumps(inventory))), contents(inventory))
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from bazaarbot.agents import DefaultAgent
+from bazaarbot.inventory import Inventory
+from bazaarbot.market import Market, Offer
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+
+
+class LazyMarket(Market):
+    
+    def from_data(self, data, market_init):
+        Market.from_data(self, data, market_init)
+        self.enable_lazy_offers()
+    
+
+class PlainAgent(DefaultAgent):
+    """
+    Agent overriding the offer methods with the IAgent signature, counting the offers it makes.
+    """
+    
+    def create_bid(self, market, commodity, limit):
+        self.offers = getattr(self, "offers", 0) + 1
+        return DefaultAgent.create_bid(self, market, commodity, limit)
+    
+    def create_ask(self, market, commodity, limit):
+        self.offers = getattr(self, "offers", 0) + 1
+        return DefaultAgent.create_ask(self, market, commodity, limit)
+    
+
+class ThriftyAgent(DefaultAgent):
+    """
+    Agent never bidding more than the money it has, which lazy offers do not keep track of.
+    """
+    
+    def create_bid(self, market, commodity, limit):
+        offer = DefaultAgent.create_bid(self, market, commodity, limit)
+        money = max(self.get_money_available(), 0.0)
+        
+        if offer is None or offer.get_units() * offer.get_unit_price() <= money:
+            return offer
+        return Offer(self, commodity, offer.get_units(), money / offer.get_units())
+    
+
+class CountingInventory(Inventory):
+    """
+    Inventory counting the offers worked out for its agent, each of which asks for the cost of its good once.
+    """
+    
+    def query_cost(self, good):
+        self.offers = getattr(self, "offers", 0) + 1
+        return Inventory.query_cost(self, good)
+    
+
+class PlainAgentEconomy(SampleEconomy):
+    
+    AGENT_CLASS = PlainAgent
+    
+    def instatiate_agent(self, class_name):
+        return self.prepare(SampleEconomy.instatiate_agent(self, class_name))
+    
+    def get_market_data(self):
+        data = SampleEconomy.get_market_data(self)
+        
+        for agent in data.agents:
+            self.prepare(agent)
+        
+        return data
+    
+    def prepare(self, agent):
+        agent.__class__ = self.AGENT_CLASS
+        return agent
+    
+
+class ThriftyAgentEconomy(PlainAgentEconomy):
+    
+    AGENT_CLASS = ThriftyAgent
+    
+
+class CountingEconomy(PlainAgentEconomy):
+    
+    AGENT_CLASS = DefaultAgent
+    
+    def prepare(self, agent):
+        agent._inventory.__class__ = CountingInventory
+        return agent
+    
+
+class LazyOffersTest(unittest.TestCase):
+    
+    def test_lazy_offers_match_eager_offers(self):
+        for seed, extra in ((1, 0), (3, 20)):
+            eager = SampleEconomy(seed, extra)
+            lazy = SampleEconomy(seed, extra, LazyMarket)
+            eager.simulate(150)
+            lazy.simulate(150)
+            
+            self.assertEqual(market_state(lazy.get_market("market")), market_state(eager.get_market("market")))
+            self.assertEqual(lazy.bankruptcies, eager.bankruptcies)
+    
+    def test_agents_overriding_offer_methods(self):
+        for market_class in (Market, LazyMarket):
+            economy = PlainAgentEconomy(3, 10, market_class)
+            economy.simulate(30)
+            reference = SampleEconomy(3, 10, market_class)
+            reference.simulate(30)
+            
+            market = economy.get_market("market")
+            self.assertEqual(market_state(market), market_state(reference.get_market("market")))
+            self.assertTrue(any(getattr(agent, "offers", 0) > 0 for agent in market.get_agents()))
+    
+    def test_agents_reading_more_than_lazy_offers_track(self):
+        lazy = ThriftyAgentEconomy(3, 10, LazyMarket)
+        lazy.simulate(60)
+        eager = ThriftyAgentEconomy(3, 10)
+        eager.simulate(60)
+        
+        self.assertEqual(market_state(lazy.get_market("market")), market_state(eager.get_market("market")))
+        self.assertTrue(all(agent._offer_cache is None for agent in lazy.get_market("market").get_agents()))
+    
+    def test_unchanged_agents_reuse_their_offers(self):
+        economy = CountingEconomy(1, 0, LazyMarket)
+        economy.simulate(40)
+        market = economy.get_market("market")
+        made = sum(getattr(agent._inventory, "offers", 0) for agent in market.get_agents())
+        
+        self.assertGreater(made, 0)
+        
+        self.assertLess(made, 40 * len(market.get_agents()) * len(market.get_good_types()))
+    
+    def test_vectorized_market(self):
+        economy = SampleEconomy(3, 10, VectorizedMarket)
+        market = economy.get_market("market")
+        market.enable_lazy_offers()
+        economy.simulate(30)
+        
+        reference = SampleEconomy(3, 10)
+        reference.simulate(30)
+        
+        self.assertEqual(market_state(market), market_state(reference.get_market("market")))
+        self.assertRaises(ValueError, market.enable_lazy_offers, True)
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from bazaarbot import Economy
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+
+
+def build(**kwargs):
+    """
+    Economy over the markets of three independent SampleEconomies, each replacing its own bankrupt agents.
+    """
+    economy = Economy()
+    sources = [SampleEconomy(7 + i, 5 + 5 * i, **kwargs) for i in range(3)]
+    
+    for source in sources:
+        economy.add_market(source.get_market("market"))
+    
+    return economy, sources
+    
+
+def economy_state(economy, sources):
+    return [market_state(market) for market in economy.get_markets()], [s.bankruptcies for s in sources]
+    
+
+class ParallelEconomyTest(unittest.TestCase):
+    
+    def test_matches_serial_simulate(self):
+        for kwargs in ({}, {"market_class": VectorizedMarket}):
+            serial, serial_sources = build(**kwargs)
+            serial.simulate(80)
+            expected = economy_state(serial, serial_sources)
+            
+            for block_rounds in (None, 1, 25):
+                economy, sources = build(**kwargs)
+                markets = list(economy.get_markets())
+                economy.set_parallel(2, block_rounds)
+                economy.simulate(80)
+                
+                self.assertEqual(economy_state(economy, sources), expected)
+                self.assertTrue(all(a is b for a, b in zip(economy.get_markets(), markets)))
+                self.assertEqual(economy.get_round_num(), 80)
+        
+        self.assertGreater(sum(expected[1]), 0)
+    
+
+if __name__ == "__main__":
+    unittest.main()
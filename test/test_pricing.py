@@ -0,0 +1,45 @@
+import random
+import unittest
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.agent import CommodityPricingHistory
+
+GOOD = SimpleCommodity("priced", 1.0)
+
+
+class CommodityPricingHistoryTest(unittest.TestCase):
+    
+    def test_matches_scanning_the_observations(self):
+        rng = random.Random(2)
+        observed = [rng.uniform(0.0, 10.0) for _ in range(200)]
+        history = CommodityPricingHistory(GOOD, *observed[:3], capacity=50)
+        
+        for price in observed[3:]:
+            history.add_transaction(price)
+        
+        for window in (0, 1, 2, 10, 49, 50, 51, 500):
+            kept = observed[:min(window, 50)]
+            
+            self.assertEqual(history.min(window), min(kept) if kept else 0.0)
+            self.assertEqual(history.max(window), max(kept) if kept else 0.0)
+            self.assertEqual(history.observe(window).get_min(), history.min(window))
+            self.assertEqual(history.observe(window).get_max(), history.max(window))
+    
+    def test_defaults(self):
+        history = CommodityPricingHistory(GOOD)
+        
+        self.assertEqual(history.get_capacity(), CommodityPricingHistory.DEFAULT_CAPACITY)
+        self.assertEqual((history.min(10), history.max(10)), (2.0, 6.0))
+        self.assertEqual(history.get_commodity(), GOOD)
+        self.assertEqual(history.observe(10).position_in_range(4.0), 0.5)
+    
+    def test_observations_past_capacity_are_dropped(self):
+        history = CommodityPricingHistory(GOOD, 5.0, capacity=2)
+        history.add_transaction(1.0)
+        history.add_transaction(0.5)
+        
+        self.assertEqual(history.min(10), 1.0)
+        self.assertEqual(history.max(10), 5.0)
+    
+
+if __name__ == "__main__":
+    unittest.main()
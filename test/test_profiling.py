@@ -0,0 +1,96 @@
+import unittest
+from bazaarbot import Economy
+from bazaarbot.profiling import MarketProfiler, ProfileRecorder, SlowRoundLogger, MultiSink
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+
+
+class TickClock(object):
+    """
+    Clock advancing by one second on every reading.
+    """
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+    
+
+class ListLogger(object):
+    
+    def __init__(self):
+        self.messages = []
+    
+    def log(self, level, message, *args):
+        self.messages.append(message % args)
+    
+
+class ProfilingTest(unittest.TestCase):
+    
+    def test_profiled_rounds_match_plain_rounds(self):
+        for market_class in (VectorizedMarket, None):
+            kwargs = {} if market_class is None else {"market_class": market_class}
+            plain = SampleEconomy(4, 10, **kwargs)
+            plain.simulate(60)
+            
+            recorder = ProfileRecorder(None)
+            profiled = SampleEconomy(4, 10, **kwargs)
+            profiled.enable_profiling(recorder)
+            profiled.simulate(60)
+            
+            market = profiled.get_market("market")
+            self.assertEqual(market_state(market), market_state(plain.get_market("market")))
+            self.assertEqual(profiled.bankruptcies, plain.bankruptcies)
+            
+            profiler = market.get_profiler()
+            profiles = recorder.get_profiles()
+            self.assertEqual(profiler.get_rounds(), 60)
+            self.assertEqual([p.get_round_num() for p in profiles], list(range(60)))
+            self.assertEqual(sorted(profiles[-1].get_timings()), sorted(MarketProfiler.PHASES))
+            
+            for counter in MarketProfiler.COUNTERS:
+                self.assertEqual(profiler.get_counters()[counter], sum(p.get_counters()[counter] for p in profiles))
+            
+            self.assertEqual(profiler.get_counters()["agents_bankrupted"], profiled.bankruptcies)
+            self.assertGreater(profiler.get_counters()["units_traded"], 0)
+            self.assertLessEqual(profiler.get_counters()["offers_matched"], profiler.get_counters()["offers_created"])
+    
+    def test_economy_profiles_markets_added_later(self):
+        economy = Economy()
+        economy.enable_profiling()
+        source = SampleEconomy(5)
+        economy.add_market(source.get_market("market"))
+        economy.simulate(3)
+        
+        self.assertEqual(list(economy.get_profilers()), ["market"])
+        self.assertEqual(economy.get_profilers()["market"].get_rounds(), 3)
+        
+        economy.disable_profiling()
+        self.assertEqual(economy.get_profilers(), {})
+    
+    def test_sinks_see_the_clock(self):
+        logger = ListLogger()
+        recorder = ProfileRecorder(2)
+        profiler = MarketProfiler(MultiSink(recorder, SlowRoundLogger(6.5, logger)), TickClock())
+        economy = SampleEconomy(6)
+        market = economy.get_market("market")
+        
+        for _ in range(3):
+            profiler.run_round(market)
+        
+        self.assertEqual(profiler.get_rounds(), 3)
+        self.assertEqual([p.get_round_num() for p in recorder.get_profiles()], [0, 0])
+        self.assertEqual(profiler.get_last_round().get_total_time(), 7.0)
+        self.assertEqual(profiler.get_timings()["simulate_agents"], 3.0)
+        self.assertEqual(len(logger.messages), 3)
+        self.assertTrue(logger.messages[0].startswith("slow round: market round 0: 7000.000ms"))
+        
+        profiler.reset()
+        self.assertEqual(profiler.get_rounds(), 0)
+        self.assertEqual(profiler.get_timings()["resolve"], 0.0)
+    
+
+if __name__ == "__main__":
+    unittest.main()
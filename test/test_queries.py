@@ -0,0 +1,109 @@
+import unittest
+from bazaarbot.history import History
+from bazaarbot.market import QueryCache, OfferExecutionStatistics, OfferResolutionStatistics
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+from simple import GOOD_crops, GOOD_wood
+
+
+def queries(market):
+    return (market.get_average_historical_price(GOOD_crops, 10), market.get_average_historical_price(GOOD_wood, 3),
+            market.get_hottest_good(), market.get_hottest_good(1.0, 5), market.get_cheapest_good(10, None),
+            market.get_cheapest_good(10, [GOOD_crops]), market.get_dearest_good(5, None),
+            market.get_most_profitable_agent())
+    
+
+class QueryCacheTest(unittest.TestCase):
+    
+    def test_cached_queries_match_uncached_ones(self):
+        for market_class in (None, VectorizedMarket):
+            kwargs = {} if market_class is None else {"market_class": market_class}
+            uncached = SampleEconomy(19, 10, **kwargs)
+            uncached.get_market("market").get_query_cache().set_max_size(0)
+            economy = SampleEconomy(19, 10, **kwargs)
+            market = economy.get_market("market")
+            
+            for _ in range(100):
+                uncached.simulate(1)
+                economy.simulate(1)
+                self.assertEqual(queries(market), queries(uncached.get_market("market")))
+            
+            if market_class is None:
+                # the agents all ask for the same averages while they make their offers
+                self.assertGreater(market.get_query_cache().get_hits(), 100 * len(market.get_agents()))
+            
+            self.assertEqual(market_state(market), market_state(uncached.get_market("market")))
+            self.assertEqual(economy.bankruptcies, uncached.bankruptcies)
+            self.assertEqual(uncached.get_market("market").get_query_cache().get_size(), 0)
+    
+    def test_record_trades_clears_the_cache(self):
+        economy = SampleEconomy(20)
+        market = economy.get_market("market")
+        economy.simulate(3)
+        before = market.get_average_historical_price(GOOD_wood, 1)
+        
+        market.record_trades({GOOD_wood: OfferResolutionStatistics([OfferExecutionStatistics(4.0, 4.0 * (before + 3.0))])})
+        self.assertEqual(market.get_average_historical_price(GOOD_wood, 1), before + 3.0)
+        
+        market.record_trades({GOOD_wood: OfferResolutionStatistics([])})
+        self.assertEqual(market.get_average_historical_price(GOOD_wood, 2), before + 3.0)
+    
+    def test_profit_and_replacements_clear_the_cache(self):
+        history = History()
+        history.get_profit().register("Farmer")
+        history.get_profit().register("Woodcutter")
+        economy = SampleEconomy(21, 2, history=history)
+        market = economy.get_market("market")
+        economy.simulate(2)
+        
+        best = market.get_most_profitable_agent()
+        other = "Farmer" if best == "Woodcutter" else "Woodcutter"
+        
+        for agent in list(market.get_agents()):
+            if agent.get_agent_name() == best:
+                market.replace_agent(agent, economy.instatiate_agent(other.lower()))
+        
+        self.assertEqual(market.get_most_profitable_agent(), other)
+        self.assertEqual(market.get_agent_class_names(), [other])
+        self.assertGreater(market.get_query_cache().get_size(), 0)
+        
+        market.record_profit()
+        self.assertEqual(market.get_query_cache().get_size(), 0)
+    
+    def test_invalidate_queries(self):
+        history = History()
+        economy = SampleEconomy(22, history=history)
+        market = economy.get_market("market")
+        economy.simulate(2)
+        before = market.get_average_historical_price(GOOD_crops, 1)
+        
+        # changing the history behind the market's back needs an explicit invalidation
+        history.get_prices().add(GOOD_crops, before + 5.0)
+        self.assertEqual(market.get_average_historical_price(GOOD_crops, 1), before)
+        market.invalidate_queries()
+        self.assertEqual(market.get_average_historical_price(GOOD_crops, 1), before + 5.0)
+    
+    def test_least_recently_used_results_are_dropped(self):
+        cache = QueryCache(2)
+        calls = []
+        
+        def query(x):
+            calls.append(x)
+            return x * 2
+        
+        self.assertEqual([cache.lookup(k, query, k) for k in (1, 2, 1, 3, 1, 2)], [2, 4, 2, 6, 2, 4])
+        self.assertEqual(calls, [1, 2, 3, 2])
+        self.assertEqual((cache.get_hits(), cache.get_misses(), cache.get_size()), (2, 4, 2))
+        
+        cache.set_max_size(1)
+        self.assertEqual(cache.get_size(), 1)
+        cache.lookup(2, query, 2)
+        self.assertEqual(calls, [1, 2, 3, 2])
+        
+        cache.clear()
+        cache.reset_counters()
+        self.assertEqual((cache.get_hits(), cache.get_misses(), cache.get_size()), (0, 0, 0))
+    
+
+if __name__ == "__main__":
+    unittest.main()
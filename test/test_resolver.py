@@ -0,0 +1,68 @@
+import random
+import unittest
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.market import IOfferExecutor, OfferExecutionStatistics, Offer, DefaultOfferResolver, \
+    OrderBookOfferResolver
+from common import SampleEconomy, market_state
+
+GOOD = SimpleCommodity("resolved", 1.0)
+
+
+class RecordingExecutor(IOfferExecutor):
+    
+    def __init__(self):
+        self.events = []
+    
+    def execute(self, bid, ask):
+        units = min(bid.get_units(), ask.get_units())
+        self.events.append(("trade", bid.get_agent(), ask.get_agent(), units, ask.get_unit_price()))
+        return OfferExecutionStatistics(units, units * ask.get_unit_price())
+    
+    def reject_bid(self, offer, unit_price):
+        self.events.append(("bid", offer.get_agent(), offer.get_units(), unit_price))
+    
+    def reject_ask(self, offer, unit_price):
+        self.events.append(("ask", offer.get_agent(), offer.get_units(), unit_price))
+    
+
+def random_book(rng, bids, asks):
+    def offer(i):
+        return Offer(i, GOOD, float(rng.randint(0, 6)), rng.choice([0.0, 0.5, 1.0, 2.0, 3.5]))
+    
+    return [offer(i) for i in range(bids)], [offer(1000 + i) for i in range(asks)]
+    
+
+class OrderBookOfferResolverTest(unittest.TestCase):
+    
+    def test_same_trades_as_default_resolver(self):
+        rng = random.Random(4)
+        
+        for case in range(200):
+            bids, asks = random_book(rng, rng.randint(0, 30), rng.randint(0, 30))
+            seed = rng.random()
+            results = []
+            
+            for resolver_class in (DefaultOfferResolver, OrderBookOfferResolver):
+                executor = RecordingExecutor()
+                resolver = resolver_class(random.Random(seed))
+                r = resolver.resolve_offer_set(executor, [Offer(o.get_agent(), GOOD, o.get_units(), o.get_unit_price())
+                                                          for o in bids],
+                                               [Offer(o.get_agent(), GOOD, o.get_units(), o.get_unit_price())
+                                                for o in asks])
+                results.append((executor.events, r.get_offers_resolved(), r.get_units_traded(),
+                                r.get_money_traded()))
+            
+            self.assertEqual(results[1], results[0])
+    
+    def test_same_runs_as_default_resolver(self):
+        default = SampleEconomy(4, 30)
+        order_book = SampleEconomy(4, 30, resolver_class=OrderBookOfferResolver)
+        default.simulate(150)
+        order_book.simulate(150)
+        
+        self.assertEqual(market_state(order_book.get_market("market")), market_state(default.get_market("market")))
+        self.assertGreater(default.bankruptcies, 0)
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from bazaarbot.history import History
+from bazaarbot.market import Market
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy
+
+
+def snapshot_state(snapshot):
+    history = snapshot.get_history()
+    state = []
+    
+    for log in (history.get_prices(), history.get_asks(), history.get_bids(), history.get_trades(),
+                history.get_profit()):
+        state.append(sorted((str(key), list(values)) for key, values in log.get_subjects()))
+    
+    for agent in snapshot.get_agents():
+        stuff = agent.get_inventory().get_stuff()
+        state.append((agent.get_class_name(), agent.get_money(),
+                      sorted((good.get_name(), entry.get_amount()) for good, entry in stuff.items())))
+    
+    return state
+    
+
+class SnapshotTest(unittest.TestCase):
+    
+    def test_shared_snapshots_match_eager_snapshots(self):
+        for market_class in (Market, VectorizedMarket):
+            for retention in (None, 32):
+                history = History(retention=retention) if retention is not None else None
+                economy = SampleEconomy(9, 10, market_class=market_class, history=history)
+                market = economy.get_market("market")
+                taken = []
+                
+                for rounds in (10, 20, 1, 0, 30):
+                    economy.simulate(rounds)
+                    taken.append((snapshot_state(market.get_snapshot()), market.get_snapshot(True)))
+                
+                # read one of them early, the others only after the market moved on
+                self.assertEqual(snapshot_state(taken[1][1]), taken[1][0])
+                
+                economy.simulate(60)
+                self.assertGreater(economy.bankruptcies, 0)
+                
+                for expected, shared in taken:
+                    self.assertEqual(snapshot_state(shared), expected)
+    
+    def test_snapshot_sizes(self):
+        economy = SampleEconomy(10, 5)
+        market = economy.get_market("market")
+        economy.simulate(5)
+        shared = market.get_snapshot(True)
+        count = len(market.get_agents())
+        
+        economy.simulate(5)
+        self.assertEqual(shared.get_agent_count(), count)
+        self.assertEqual(len(shared.get_agents()), count)
+        self.assertEqual(shared.get_agent_count(), count)
+    
+
+if __name__ == "__main__":
+    unittest.main()
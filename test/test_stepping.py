@@ -0,0 +1,113 @@
+import unittest
+from bazaarbot import Economy
+from bazaarbot.market import OrderBookOfferResolver, RoundProgress
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+
+
+class TickClock(object):
+    """
+    Clock advancing by one second on every reading.
+    """
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+    
+
+def build_economy():
+    economy = Economy()
+    sources = [SampleEconomy(20 + i, 4 + 3 * i) for i in range(2)]
+    
+    for source in sources:
+        economy.add_market(source.get_market("market"))
+    
+    return economy, sources
+    
+
+class SteppingTest(unittest.TestCase):
+    
+    def test_step_round_matches_simulate(self):
+        for kwargs in ({}, {"resolver_class": OrderBookOfferResolver}, {"market_class": VectorizedMarket}):
+            plain = SampleEconomy(13, 10, **kwargs)
+            plain.simulate(40)
+            expected = market_state(plain.get_market("market"))
+            
+            for chunk_size in (None, 1, 7):
+                economy = SampleEconomy(13, 10, **kwargs)
+                market = economy.get_market("market")
+                phases = []
+                
+                for _ in range(40):
+                    progress = market.step_round(chunk_size)
+                    
+                    while progress is not None:
+                        phases.append(progress.get_phase())
+                        progress = market.step_round(chunk_size)
+                
+                self.assertEqual(market_state(market), expected)
+                self.assertEqual(economy.bankruptcies, plain.bankruptcies)
+                self.assertEqual(market.get_round_num(), 40)
+                
+                # the phase after each step, so simulate_agents only shows up when it is split into chunks
+                self.assertEqual(set(phases) - set(RoundProgress.PHASES), set())
+                self.assertEqual("simulate_agents" in phases, chunk_size is not None and "market_class" not in kwargs)
+                self.assertTrue(set(RoundProgress.PHASES[1:]) <= set(phases))
+    
+    def test_simulate_for_resumes_where_it_stopped(self):
+        plain = SampleEconomy(14, 10)
+        plain.simulate(30)
+        
+        economy = SampleEconomy(14, 10)
+        market = economy.get_market("market")
+        rounds = 0
+        slices = 0
+        
+        while rounds < 30:
+            report = market.simulate_for(5.0, 4, 30 - rounds, TickClock())
+            rounds += report.get_rounds()
+            slices += 1
+            
+            # the clock is read once at the start and once after every step
+            self.assertLessEqual(report.get_steps(), 5)
+            self.assertIs(report.get_progress(), market.get_round_progress())
+        
+        self.assertGreater(slices, 30)
+        self.assertEqual(market.get_round_num(), 30)
+        self.assertEqual(market_state(market), market_state(plain.get_market("market")))
+    
+    def test_simulate_finishes_a_started_round(self):
+        plain = SampleEconomy(15, 10)
+        plain.simulate(10)
+        
+        economy = SampleEconomy(15, 10)
+        market = economy.get_market("market")
+        market.step_round(3)
+        market.step_round(3)
+        self.assertEqual(market.get_round_progress().get_round_num(), 0)
+        
+        market.simulate(10)
+        self.assertIsNone(market.get_round_progress())
+        self.assertEqual(market_state(market), market_state(plain.get_market("market")))
+    
+    def test_economy_simulate_for_matches_simulate(self):
+        plain, plain_sources = build_economy()
+        plain.simulate(25)
+        
+        economy, sources = build_economy()
+        reports = []
+        
+        while economy.get_round_num() < 25:
+            reports.append(economy.simulate_for(20.0, 5, 25 - economy.get_round_num(), TickClock()))
+        
+        self.assertEqual(sum(report.get_rounds() for report in reports), 25)
+        self.assertEqual([market_state(m) for m in economy.get_markets()],
+                         [market_state(m) for m in plain.get_markets()])
+        self.assertEqual([s.bankruptcies for s in sources], [s.bankruptcies for s in plain_sources])
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+import pickle
+import random
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from bazaarbot import Economy
+from bazaarbot.agents import DefaultAgent
+from bazaarbot.inventory import InventoryData
+from bazaarbot.market import Market, OrderBookOfferResolver
+from bazaarbot.streams import RandomStreams, CounterRandom
+from bazaarbot.vectorized import VectorizedMarket
+from common import SampleEconomy, market_state
+from simple import (GOOD_crops, GOOD_wood, FarmerAgentSimulator, WoodcutterAgentSimulator, FarmerAgentFactory,
+                    WoodcutterAgentFactory)
+
+
+class LuckyFarmerSimulator(FarmerAgentSimulator):
+    
+    def perform(self, agent, market):
+        if self.get_random(agent).random() < 0.7:
+            FarmerAgentSimulator.perform(self, agent, market)
+        else:
+            self.is_idle(agent, market)
+    
+
+class LuckyWoodcutterSimulator(WoodcutterAgentSimulator):
+    
+    def perform(self, agent, market):
+        if self.get_random(agent).random() < 0.8:
+            WoodcutterAgentSimulator.perform(self, agent, market)
+    
+
+class LuckyFarmerFactory(FarmerAgentFactory):
+    
+    def create(self):
+        inv = InventoryData(20, {GOOD_crops: 0.0, GOOD_wood: 3.0}, {GOOD_crops: 1.0, GOOD_wood: 0.0})
+        return DefaultAgent("Farmer", LuckyFarmerSimulator(self._rng), inv, 100.0)
+    
+
+class LuckyWoodcutterFactory(WoodcutterAgentFactory):
+    
+    def create(self):
+        inv = InventoryData(20, {GOOD_crops: 3.0, GOOD_wood: 0.0}, {GOOD_crops: 0.0, GOOD_wood: 1.0})
+        return DefaultAgent("Woodcutter", LuckyWoodcutterSimulator(self._rng), inv, 100.0)
+    
+
+class LuckyEconomy(SampleEconomy):
+    """
+    SampleEconomy whose agents draw a random number every round to decide whether they work.
+    """
+    
+    FARMER_FACTORY = LuckyFarmerFactory
+    WOODCUTTER_FACTORY = LuckyWoodcutterFactory
+    
+
+class ReversedMarket(Market):
+    
+    def simulate_agents(self):
+        for agent in reversed(self.get_agents()):
+            agent.simulate(self)
+    
+
+class ThreadedMarket(Market):
+    
+    POOL = ThreadPoolExecutor(4)
+    
+    def simulate_agents(self):
+        list(ThreadedMarket.POOL.map(lambda agent: agent.simulate(self), self.get_agents()))
+    
+
+def run(seed=1, rounds=80, **kwargs):
+    economy = LuckyEconomy(seed, 15, **kwargs)
+    economy.set_random_streams(RandomStreams(42))
+    economy.simulate(rounds)
+    return market_state(economy.get_market("market")), economy.bankruptcies
+    
+
+class RandomStreamsTest(unittest.TestCase):
+    
+    def test_streams_are_independent(self):
+        streams = RandomStreams(7)
+        first = streams.get("market", 3, "agent", 1)
+        expected = [first.random() for _ in range(5)]
+        
+        other = streams.get("market", 3, "agent", 2)
+        other.random()
+        again = streams.get("market", 3, "agent", 1)
+        fresh = RandomStreams(7).get("market", 3, "agent", 1)
+        
+        self.assertEqual([again.random() for _ in range(5)], expected)
+        self.assertEqual([fresh.random() for _ in range(5)], expected)
+        self.assertNotEqual(streams.derive("market", 3, "agent", 1), streams.derive("market", 3, "agent", 2))
+        self.assertNotEqual(streams.derive("market", 3), streams.derive("market", "3"))
+        self.assertNotEqual(streams.derive(1), RandomStreams(8).derive(1))
+        self.assertRaises(TypeError, streams.derive, 1.5)
+        self.assertRaises(TypeError, streams.derive, True)
+    
+    def test_counter_random(self):
+        streams = RandomStreams(11)
+        rnd = streams.get("x", 1)
+        self.assertIsInstance(rnd, CounterRandom)
+        
+        draws = [rnd.random() for _ in range(20000)]
+        self.assertTrue(all(0.0 <= x < 1.0 for x in draws))
+        self.assertAlmostEqual(sum(draws) / len(draws), 0.5, delta=0.01)
+        self.assertNotEqual(draws[:8], [streams.get("x", 2).random() for _ in range(8)])
+        
+        for bits in (0, 1, 13, 64, 65, 200):
+            self.assertTrue(all(0 <= rnd.getrandbits(bits) < 2 ** bits for _ in range(50)))
+        
+        self.assertTrue(1 <= rnd.randint(1, 6) <= 6)
+        self.assertIn(rnd.choice("abc"), "abc")
+        items = list(range(30))
+        rnd.shuffle(items)
+        self.assertEqual(sorted(items), list(range(30)))
+        rnd.gauss(0.0, 1.0)
+        
+        # state survives pickling in the middle of a block and at its edge
+        for skip in (5, 3):
+            for _ in range(skip):
+                rnd.random()
+            
+            copy = pickle.loads(pickle.dumps(rnd))
+            self.assertEqual([copy.random() for _ in range(20)], [rnd.random() for _ in range(20)])
+        
+        rnd.seed()
+        self.assertEqual(rnd.random(), draws[0])
+    
+    def test_agent_streams_are_named_streams(self):
+        streams = RandomStreams(12)
+        market_streams = streams.for_market("market")
+        agent = market_streams.agent(4)
+        
+        for round_num in (0, 1, 5):
+            market_streams.set_round_num(round_num)
+            expected = streams.get("market", round_num, "agent", 4)
+            self.assertEqual([agent.random() for _ in range(10)], [expected.random() for _ in range(10)])
+            self.assertEqual(market_streams.get("resolve", "wood").random(),
+                             streams.get("market", round_num, "resolve", "wood").random())
+        
+        mersenne = RandomStreams(12, random.Random)
+        self.assertEqual(mersenne.get("market", 1).random(), random.Random(mersenne.derive("market", 1)).random())
+        self.assertEqual(type(mersenne.for_market("market").agent(0).current()), random.Random)
+    
+    def test_order_of_agents_does_not_matter(self):
+        expected = run()
+        self.assertGreater(expected[1], 0)
+        
+        # the seed of the economy only feeds the generators the streams replace
+        self.assertEqual(run(seed=2), expected)
+        self.assertEqual(run(market_class=ReversedMarket), expected)
+        self.assertEqual(run(market_class=ThreadedMarket), expected)
+        self.assertEqual(run(market_class=VectorizedMarket), expected)
+        self.assertEqual(run(resolver_class=OrderBookOfferResolver), expected)
+    
+    def test_streams_replace_the_generators_of_the_market(self):
+        plain = LuckyEconomy(1, 15)
+        plain.simulate(80)
+        self.assertNotEqual(market_state(plain.get_market("market")), run()[0])
+    
+    def test_parallel_economy_matches_serial(self):
+        def build():
+            economy = Economy()
+            sources = [LuckyEconomy(30 + i, 6 + 4 * i) for i in range(2)]
+            
+            for source in sources:
+                economy.add_market(source.get_market("market"))
+            
+            economy.set_random_streams(RandomStreams(43))
+            return economy, sources
+        
+        serial, serial_sources = build()
+        serial.simulate(60)
+        
+        economy, sources = build()
+        economy.set_parallel(2, 7)
+        economy.simulate(60)
+        
+        self.assertEqual([market_state(m) for m in economy.get_markets()],
+                         [market_state(m) for m in serial.get_markets()])
+        self.assertEqual([s.bankruptcies for s in sources], [s.bankruptcies for s in serial_sources])
+    
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+from bazaarbot import Tradebook
+from bazaarbot._base import SimpleCommodity
+from bazaarbot.agent import AgentSnapshot, CommodityPricingRange
+from bazaarbot.inventory import Inventory
+from bazaarbot.market import Market, Offer, OfferExecutionStatistics, OfferResolutionStatistics
+from common import SampleEconomy, market_state
+
+GOODS = [SimpleCommodity("book%d" % i, 1.0) for i in range(3)]
+
+
+def book_contents(book):
+    return (sorted((good.get_name(), list(offers)) for good, offers in book.get_asks().items()),
+            sorted((good.get_name(), list(offers)) for good, offers in book.get_bids().items()))
+    
+
+class BufferingMarket(Market):
+    """
+    Market collecting the offers of a round and posting all asks, then all bids, one at a time.
+    """
+    
+    def generate_offers(self):
+        self.pending = ([], [])
+        Market.generate_offers(self)
+        asks, bids = self.pending
+        self.pending = None
+        self.post(asks, bids)
+    
+    def post(self, asks, bids):
+        for offer in asks:
+            self.ask(offer)
+        
+        for offer in bids:
+            self.bid(offer)
+    
+    def ask(self, offer):
+        if getattr(self, "pending", None) is not None:
+            self.pending[0].append(offer)
+        else:
+            Market.ask(self, offer)
+    
+    def bid(self, offer):
+        if getattr(self, "pending", None) is not None:
+            self.pending[1].append(offer)
+        else:
+            Market.bid(self, offer)
+    
+
+class BatchingMarket(BufferingMarket):
+    """
+    BufferingMarket posting the offers with one submit_offers call.
+    """
+    
+    def post(self, asks, bids):
+        self.submit_offers(asks, bids)
+    
+
+class TradebookTest(unittest.TestCase):
+    
+    def test_submit_matches_single_offers(self):
+        asks = [Offer("a%d" % i, GOODS[i * 7 % 3], i, 1.0) for i in range(12)]
+        bids = [Offer("b%d" % i, GOODS[i // 4], i, 2.0) for i in range(12)]
+        
+        single = Tradebook()
+        
+        for offer in asks:
+            single.ask(offer)
+        
+        for offer in bids:
+            single.bid(offer)
+        
+        batch = Tradebook()
+        batch.submit(asks[:5], bids[:3])
+        batch.submit(asks[5:], bids[3:])
+        
+        self.assertEqual(book_contents(batch), book_contents(single))
+        self.assertEqual(batch.count_offers(), 24)
+    
+    def test_reset_recycles_offer_lists(self):
+        book = Tradebook()
+        book.submit([Offer("a", GOODS[0], 1, 1.0)], [Offer("b", GOODS[1], 1, 1.0)])
+        lists = [book.get_asks()[GOODS[0]], book.get_bids()[GOODS[1]]]
+        
+        book.reset()
+        self.assertEqual(book.count_offers(), 0)
+        self.assertEqual(book.get_asks(), {})
+        
+        asks = [Offer("c", GOODS[2], 2, 1.0)]
+        book.extend(GOODS[2], asks, [])
+        self.assertTrue(any(book.get_asks()[GOODS[2]] is l for l in lists))
+        self.assertEqual(book.get_asks()[GOODS[2]], asks)
+        self.assertEqual(book.get_bids()[GOODS[2]], [])
+    
+    def test_batched_market_matches_single_offers(self):
+        single = SampleEconomy(8, 10, market_class=BufferingMarket)
+        single.simulate(80)
+        
+        batched = SampleEconomy(8, 10, market_class=BatchingMarket)
+        batched.simulate(80)
+        
+        self.assertEqual(market_state(batched.get_market("market")), market_state(single.get_market("market")))
+        self.assertEqual(batched.bankruptcies, single.bankruptcies)
+    
+    def test_per_round_objects_have_no_dict(self):
+        inventory = Inventory()
+        inventory.add(GOODS[0], 1.0, 1.0)
+        
+        for obj in (Offer("a", GOODS[0], 1, 1.0), OfferExecutionStatistics(1, 1.0),
+                    OfferResolutionStatistics([]), CommodityPricingRange(GOODS[0], 1.0, 2.0),
+                    AgentSnapshot("farmer", 1.0, inventory), inventory.get_stuff()[GOODS[0]]):
+            self.assertFalse(hasattr(obj, "__dict__"), type(obj).__name__)
+    
+
+if __name__ == "__main__":
+    unittest.main()
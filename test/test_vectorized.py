@@ -0,0 +1,162 @@
+import unittest
+from bazaarbot.agents import DefaultAgent
+from bazaarbot.inventory import InventoryData
+from bazaarbot.market import OrderBookOfferResolver
+from bazaarbot.vectorized import VectorizedMarket, PopulationAgent, population_key
+from bench.economy import BenchEconomy
+from common import SampleEconomy, market_state
+from simple import (GOOD_crops, GOOD_wood, FarmerAgentSimulator, WoodcutterAgentSimulator, FarmerAgentFactory,
+                    WoodcutterAgentFactory)
+
+
+class BulkFarmerSimulator(FarmerAgentSimulator):
+    
+    def perform_population(self, population, slots, market):
+        slots = slots[population.query_inventory(slots, GOOD_crops) < 10]
+        has_wood = population.query_inventory(slots, GOOD_wood) >= 1
+        
+        self.consume_population(population, slots[has_wood], GOOD_wood, 1)
+        self.produce_population(population, slots[has_wood], GOOD_crops, 6)
+        self.is_idle_population(population, slots[~has_wood], market)
+    
+    def get_population_key(self):
+        return "farmer"
+    
+
+class BulkWoodcutterSimulator(WoodcutterAgentSimulator):
+    
+    def perform_population(self, population, slots, market):
+        slots = slots[population.query_inventory(slots, GOOD_wood) < 4]
+        has_food = population.query_inventory(slots, GOOD_crops) >= 1
+        
+        self.consume_population(population, slots[has_food], GOOD_crops, 1)
+        self.produce_population(population, slots[has_food], GOOD_wood, 4)
+        self.is_idle_population(population, slots[~has_food], market)
+    
+    def get_population_key(self):
+        return "woodcutter"
+    
+
+class SlowFarmerSimulator(BulkFarmerSimulator):
+    
+    def perform(self, agent, market):
+        FarmerAgentSimulator.perform(self, agent, market)
+    
+
+class BulkFarmerFactory(FarmerAgentFactory):
+    
+    SIMULATOR = BulkFarmerSimulator
+    
+    def create(self):
+        inv = InventoryData(20, {GOOD_crops: 0.0, GOOD_wood: 3.0}, {GOOD_crops: 1.0, GOOD_wood: 0.0})
+        return DefaultAgent("Farmer", self.SIMULATOR(self._rng), inv, 100.0)
+    
+
+class SlowFarmerFactory(BulkFarmerFactory):
+    
+    SIMULATOR = SlowFarmerSimulator
+    
+
+class BulkWoodcutterFactory(WoodcutterAgentFactory):
+    
+    def create(self):
+        inv = InventoryData(20, {GOOD_crops: 3.0, GOOD_wood: 0.0}, {GOOD_crops: 0.0, GOOD_wood: 1.0})
+        return DefaultAgent("Woodcutter", BulkWoodcutterSimulator(self._rng), inv, 100.0)
+    
+
+class BulkEconomy(SampleEconomy):
+    """
+    SampleEconomy whose farmers and woodcutters can be simulated in bulk.
+    """
+    
+    FARMER_FACTORY = BulkFarmerFactory
+    WOODCUTTER_FACTORY = BulkWoodcutterFactory
+    
+
+class MixedEconomy(BulkEconomy):
+    """
+    BulkEconomy whose farmers run agent by agent.
+    """
+    
+    FARMER_FACTORY = SlowFarmerFactory
+
+
+class VectorizedMarketTest(unittest.TestCase):
+    
+    def test_matches_market(self):
+        for seed, extra, rounds in ((1, 0, 100), (2, 5, 150), (3, 20, 200)):
+            serial = SampleEconomy(seed, extra)
+            vectorized = SampleEconomy(seed, extra, VectorizedMarket)
+            serial.simulate(rounds)
+            vectorized.simulate(rounds)
+            
+            self.assertEqual(market_state(vectorized.get_market("market")), market_state(serial.get_market("market")))
+            self.assertEqual(vectorized.bankruptcies, serial.bankruptcies)
+        
+        self.assertGreater(serial.bankruptcies, 0)
+    
+    def test_matches_market_with_order_book(self):
+        serial = SampleEconomy(4, 20, resolver_class=OrderBookOfferResolver)
+        vectorized = SampleEconomy(4, 20, VectorizedMarket, OrderBookOfferResolver)
+        serial.simulate(100)
+        vectorized.simulate(100)
+        
+        self.assertEqual(market_state(vectorized.get_market("market")), market_state(serial.get_market("market")))
+    
+    def test_agents_live_in_the_population(self):
+        economy = SampleEconomy(3, 20, VectorizedMarket)
+        economy.simulate(100)
+        market = economy.get_market("market")
+        population = market.get_population()
+        
+        self.assertEqual(population.get_size(), len(market.get_agents()))
+        
+        for slot, agent in enumerate(market.get_agents()):
+            self.assertIsInstance(agent, PopulationAgent)
+            self.assertEqual(agent.get_slot(), slot)
+            self.assertEqual(market.get_agent_slot(agent), slot)
+        
+        agent = market.get_agents()[0]
+        self.assertEqual([agent.query_inventory(g) for g in market.get_good_types()],
+                         [population.to_inventory(0).query_amount(g) for g in market.get_good_types()])
+    
+    def test_bulk_simulations_match_market(self):
+        for economy_class in (BulkEconomy, MixedEconomy):
+            serial = economy_class(5, 20)
+            vectorized = economy_class(5, 20, VectorizedMarket)
+            serial.simulate(150)
+            vectorized.simulate(150)
+            
+            self.assertEqual(market_state(vectorized.get_market("market")), market_state(serial.get_market("market")))
+            self.assertEqual(vectorized.bankruptcies, serial.bankruptcies)
+            self.assertGreater(serial.bankruptcies, 0)
+        
+        groups = vectorized.get_market("market").get_population().group
+        self.assertEqual(sorted(set(groups.tolist())), [-1, 0])
+    
+    def test_population_keys(self):
+        rng = SampleEconomy().rng
+        
+        self.assertIsNone(population_key(FarmerAgentSimulator(rng)))
+        self.assertIsNone(population_key(SlowFarmerSimulator(rng)))
+        self.assertEqual(population_key(BulkFarmerSimulator(rng)), (BulkFarmerSimulator, "farmer"))
+        self.assertNotEqual(population_key(BulkFarmerSimulator(rng)), population_key(BulkWoodcutterSimulator(rng)))
+    
+    def test_bench_economy_matches_market(self):
+        serial = BenchEconomy(300, 4, seed=3)
+        vectorized = BenchEconomy(300, 4, seed=3, market_class=VectorizedMarket)
+        serial.simulate(60)
+        vectorized.simulate(60)
+        
+        self.assertEqual(market_state(vectorized.get_market("bench")), market_state(serial.get_market("bench")))
+        self.assertEqual(vectorized.bankruptcies, serial.bankruptcies)
+    
+    def test_replace_unknown_agent(self):
+        economy = SampleEconomy(1, 0, VectorizedMarket)
+        
+        self.assertRaises(ValueError, economy.get_market("market").replace_agent, economy.instatiate_agent("farmer"),
+                          economy.instatiate_agent("farmer"))
+    
+
+if __name__ == "__main__":
+    unittest.main()